@@ -1,13 +1,69 @@
-import spacy
-from typing import List, Dict, Any
-import random
-import uuid
+from collections import OrderedDict
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+import numpy as np
+import os
+import threading
+from metrics import span, timed
 
-# Load English tokenizer
-try:
-    nlp = spacy.load("en_core_web_sm")
-except:
-    nlp = None
+# English pipeline used by analyze_mistake. spaCy is only imported, and the
+# model loaded, on first use (or by AIService.warm_up) -- see main.py.
+SPACY_MODEL = os.environ.get("SPACY_MODEL", "en_core_web_sm")
+# Pipeline components the mistake heuristics read from a Doc; the rest are
+# skipped when analysing. Empty means tokenization only.
+SPACY_COMPONENTS = [c for c in os.environ.get("SPACY_COMPONENTS", "").split(",") if c]
+# Distinct (question, wrong, correct) analyses kept in memory
+MISTAKE_CACHE_SIZE = int(os.environ.get("MISTAKE_CACHE_SIZE", "4096"))
+NLP_BATCH_SIZE = int(os.environ.get("NLP_BATCH_SIZE", "64"))
+
+FALLBACK_ANALYSIS = "Analysis: Check if you fell for a common misconception."
+
+
+def _load_nlp(model_name: str):
+    try:
+        import spacy
+        return spacy.load(model_name)
+    except Exception:
+        return None
+
+# Question generators: draw the operands for a whole batch with NumPy and
+# return parallel lists of text/correct/trap plus the concept's feedback.
+def _order_of_operations_batch(rng: np.random.Generator, n: int) -> Dict[str, Any]:
+    a, b, c = rng.integers(2, 6, size=(3, n))
+    return {
+        "text": [f"What is {x} + {y} x {z}?" for x, y, z in zip(a.tolist(), b.tolist(), c.tolist())],
+        "correct": [str(v) for v in (a + b * c).tolist()],
+        "trap": [str(v) for v in ((a + b) * c).tolist()], # The trap answer
+        "feedback": "Remember PEMDAS! Multiplication happens before Addition."
+    }
+
+def _fractions_batch(rng: np.random.Generator, n: int) -> Dict[str, Any]:
+    d = rng.choice([2, 4, 8], size=n).tolist()
+    return {
+        "text": [f"What is 1/{v} + 1/{v}?" for v in d],
+        "correct": [f"2/{v}" if v != 2 else "1" for v in d],
+        "trap": [f"2/{v + v}" for v in d], # e.g. 1/4 + 1/4 = 2/8
+        "feedback": "When adding fractions with the same denominator, you only add the numerators."
+    }
+
+def _array_indexing_batch(rng: np.random.Generator, n: int) -> Dict[str, Any]:
+    vals = rng.integers(10, 100, size=(n, 3)).tolist()
+    return {
+        "text": [f"Given list L = {v}, what is L[1]?" for v in vals],
+        "correct": [str(v[1]) for v in vals],
+        "trap": [str(v[0]) for v in vals], # 1-based indexing expectation
+        "feedback": "Most programming languages (like Python, JS) use 0-based indexing. L[1] is the second element."
+    }
+
+def _batch_uuid4(rng: np.random.Generator, n: int) -> List[str]:
+    """
+    `n` version-4 UUID strings from `rng` (reproducible, unlike uuid4()).
+    """
+    raw = rng.integers(0, 256, size=(n, 16), dtype=np.uint8)
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40 # version 4
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80 # RFC 4122 variant
+    h = raw.tobytes().hex()
+    return [f"{h[i:i + 8]}-{h[i + 8:i + 12]}-{h[i + 12:i + 16]}-{h[i + 16:i + 20]}-{h[i + 20:i + 32]}"
+            for i in range(0, 32 * n, 32)]
 
 # Knowledge Base of Concepts & Misconceptions
 KNOWLEDGE_BASE = {
@@ -17,30 +73,14 @@ KNOWLEDGE_BASE = {
             "misconception": "Processing left-to-right regardless of operators",
             "trap_pattern": "Linearity Bias",
             "template": "What is {a} + {b} x {c}?",
-            "generator": lambda: (
-                a := random.randint(2, 5), b := random.randint(2, 5), c := random.randint(2, 5),
-                {
-                    "text": f"What is {a} + {b} x {c}?",
-                    "correct": str(a + (b * c)),
-                    "trap": str((a + b) * c), # The trap answer
-                    "feedback": "Remember PEMDAS! Multiplication happens before Addition."
-                }
-            )
+            "batch_generator": _order_of_operations_batch
         },
         {
             "concept": "Fractions",
             "misconception": "Adding numerators and denominators directly",
             "trap_pattern": "Simplification Fallacy",
             "template": "What is 1/{d} + 1/{d}?",
-            "generator": lambda: (
-                d := random.choice([2, 4, 8]),
-                {
-                    "text": f"What is 1/{d} + 1/{d}?",
-                    "correct": f"2/{d}" if d != 2 else "1",
-                    "trap": f"2/{d+d}", # e.g. 1/4 + 1/4 = 2/8
-                    "feedback": "When adding fractions with the same denominator, you only add the numerators."
-                }
-            )
+            "batch_generator": _fractions_batch
         }
     ],
     "cs": [
@@ -49,91 +89,164 @@ KNOWLEDGE_BASE = {
             "misconception": "1-based indexing",
             "trap_pattern": "Off-by-one Error",
             "template": "Given list L = [{v1}, {v2}, {v3}], what is L[1]?",
-            "generator": lambda: (
-                vals := [random.randint(10, 99) for _ in range(3)],
-                {
-                    "text": f"Given list L = {vals}, what is L[1]?",
-                    "correct": str(vals[1]),
-                    "trap": str(vals[0]), # 1-based indexing expectation
-                    "feedback": "Most programming languages (like Python, JS) use 0-based indexing. L[1] is the second element."
-                }
-            )
+            "batch_generator": _array_indexing_batch
         }
     ]
 }
 
 class AIService:
-    def __init__(self):
-        self.nlp = nlp
+    def __init__(self, model_name: str = SPACY_MODEL):
+        self.model_name = model_name
+        self._nlp = None
+        self._nlp_loaded = False
+        self._nlp_lock = threading.Lock()
+        self._analyses: "OrderedDict[Tuple[str, str, str], str]" = OrderedDict()
+        self._analyses_lock = threading.Lock()
 
+    @property
+    def nlp(self):
+        """
+        The spaCy pipeline, loaded on first access (None if unavailable).
+        """
+        if not self._nlp_loaded:
+            with self._nlp_lock:
+                if not self._nlp_loaded:
+                    with span("ai.load_model"):
+                        self._nlp = _load_nlp(self.model_name)
+                    self._nlp_loaded = True
+        return self._nlp
+
+    def warm_up(self) -> bool:
+        """
+        Loads the model now rather than on the first request. Returns
+        whether it is available.
+        """
+        return self.nlp is not None
+
+    @timed("ai.generate_question")
     def generate_question(self, topic: str) -> Dict[str, Any]:
         """
         Generates a fully formed deceptive question based on the topic.
         """
+        return self.generate_batch(topic, 1)[0]
+
+    @timed("ai.generate_batch")
+    def generate_batch(self, topic: str, count: int, seed: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Generates `count` questions on `topic` (math if unknown) in one
+        call. The same `seed` always yields the same quiz (ids included).
+        """
         if topic not in KNOWLEDGE_BASE:
             topic = "math" # Default
+        concepts = KNOWLEDGE_BASE[topic]
+        rng = np.random.default_rng(seed)
         
-        concept_data = random.choice(KNOWLEDGE_BASE[topic])
-        
-        # Run the generator lambda to get specific values
-        # Note: generator returns a tuple, but the lambda logic inside KNOWLEDGE_BASE handles the logic
-        # We need to refine the usage of lambda in the dictionary
-        
-        generator_func = concept_data["generator"]
-        # The lambda implies internal logic, we invoke it
-        # Actually, the lambda defined above returns a tuple of (vars, dict) or just a dict?
-        # Let's check the lambda definitions above.
-        # Python 3.8+ walrus operator (:=) makes it return the last expression in the tuple, which is the dict?
-        # Wait, a lambda returning a tuple (a, b) returns a tuple.
-        # The dictionary is the last element.
+        # Pick a concept per question, then generate each concept's share at once
+        picks = rng.integers(0, len(concepts), size=count)
+        # Filler option offset (like randint(1,5)) and option order per question
+        filler_offsets = rng.integers(1, 6, size=count).tolist()
+        orders = rng.permuted(np.tile(np.arange(3), (count, 1)), axis=1).tolist()
+        # Question id + 3 option ids, drawn from the seeded generator
+        ids = _batch_uuid4(rng, 4 * count)
         
-        result_tuple = generator_func()
-        gen_data = result_tuple[-1] # Get the dict
-        
-        # Construct Options
-        options = [
-            {"id": str(uuid.uuid4()), "text": gen_data["correct"], "isCorrect": True, "isTrap": False},
-            {"id": str(uuid.uuid4()), "text": gen_data["trap"], "isCorrect": False, "isTrap": True, "feedback": gen_data["feedback"]},
-        ]
-        
-        # Add filler options
-        correct_val = gen_data["correct"]
-        try:
-            val = float(correct_val)
-            options.append({"id": str(uuid.uuid4()), "text": str(val + random.randint(1,5)), "isCorrect": False, "isTrap": False})
-        except:
-             options.append({"id": str(uuid.uuid4()), "text": "None of the above", "isCorrect": False, "isTrap": False})
-             
-        random.shuffle(options)
-        
-        return {
-            "id": str(uuid.uuid4()),
-            "text": gen_data["text"],
-            "topic": topic,
-            "explanation": f"Concept: {concept_data['concept']}. {gen_data['feedback']}",
-            "options": options
-        }
+        questions: List[Optional[Dict[str, Any]]] = [None] * count
+        for concept_index, concept_data in enumerate(concepts):
+            positions = np.flatnonzero(picks == concept_index).tolist()
+            if not positions:
+                continue
+            gen = concept_data["batch_generator"](rng, len(positions))
+            explanation = f"Concept: {concept_data['concept']}. {gen['feedback']}"
+            
+            for k, pos in enumerate(positions):
+                correct_val = gen["correct"][k]
+                try:
+                    filler = str(float(correct_val) + filler_offsets[pos])
+                except ValueError:
+                    filler = "None of the above"
+                
+                base = pos * 4
+                options = [
+                    {"id": ids[base + 1], "text": correct_val, "isCorrect": True, "isTrap": False},
+                    {"id": ids[base + 2], "text": gen["trap"][k], "isCorrect": False, "isTrap": True, "feedback": gen["feedback"]},
+                    {"id": ids[base + 3], "text": filler, "isCorrect": False, "isTrap": False},
+                ]
+                questions[pos] = {
+                    "id": ids[base],
+                    "text": gen["text"][k],
+                    "topic": topic,
+                    "explanation": explanation,
+                    "options": [options[i] for i in orders[pos]]
+                }
+        return questions
 
     def analyze_mistake(self, question_text: str, wrong_answer: str, correct_answer: str) -> str:
         """
         Analyzes why a student might have chosen the wrong answer.
         """
-        if not self.nlp:
-            return "Analysis: Check if you fell for a common misconception."
+        return self.analyze_mistakes([(question_text, wrong_answer, correct_answer)])[0]
 
-        doc_q = self.nlp(question_text)
-        
-        # Simple heuristic analysis
-        if len(wrong_answer) > 0 and len(correct_answer) > 0:
-            try:
-                # Numeric analysis
-                w = float(wrong_answer)
-                c = float(correct_answer)
-                if w == c * 10 or w == c / 10:
-                    return "Analyzed: Use of correct digits but wrong magnitude (Order of Magnitude Trap)."
-            except:
-                pass
-        
-        return "Analyzed: This looks like a fundamental misunderstanding of the concept."
+    @timed("ai.analyze_mistakes")
+    def analyze_mistakes(self, triples: Iterable[Tuple[str, str, str]]) -> List[str]:
+        """
+        Batch form of `analyze_mistake` for (question, wrong, correct)
+        triples, in order. Each distinct question text goes through the
+        pipeline once (via `nlp.pipe`, when SPACY_COMPONENTS enables any),
+        and results are memoized.
+        """
+        triples = list(triples)
+        keys = [_mistake_key(*t) for t in triples]
+        nlp = self.nlp
+        if not nlp:
+            return [FALLBACK_ANALYSIS] * len(keys)
+
+        results: Dict[Tuple[str, str, str], str] = {}
+        with self._analyses_lock:
+            for key in keys:
+                if key in self._analyses:
+                    self._analyses.move_to_end(key)
+                    results[key] = self._analyses[key]
+        # The key is only for the memo: the pipeline sees the question as
+        # written (first spelling wins for texts that share a key)
+        missing: Dict[Tuple[str, str, str], str] = {}
+        for key, (question_text, _, _) in zip(keys, triples):
+            if key not in results:
+                missing.setdefault(key, question_text)
+
+        if missing:
+            texts = list(dict.fromkeys(missing.values()))
+            docs: Dict[str, Any] = dict.fromkeys(texts)
+            # With no components enabled the Doc is bare tokens, which the
+            # heuristics don't read, so the pass is skipped
+            if SPACY_COMPONENTS:
+                skip = [name for name in nlp.pipe_names if name not in SPACY_COMPONENTS]
+                with span("ai.nlp_pipe"):
+                    docs = dict(zip(texts, nlp.pipe(texts, batch_size=NLP_BATCH_SIZE, disable=skip)))
+            with self._analyses_lock:
+                for key, question_text in missing.items():
+                    results[key] = self._analyses[key] = _explain_mistake(docs[question_text], key[1], key[2])
+                while len(self._analyses) > MISTAKE_CACHE_SIZE:
+                    self._analyses.popitem(last=False)
+
+        return [results[key] for key in keys]
+
+
+def _mistake_key(question_text: str, wrong_answer: str, correct_answer: str) -> Tuple[str, str, str]:
+    # Whitespace and case don't change the analysis
+    return " ".join(question_text.split()).lower(), wrong_answer.strip(), correct_answer.strip()
+
+
+def _explain_mistake(doc_q, wrong_answer: str, correct_answer: str) -> str:
+    # Simple heuristic analysis
+    if len(wrong_answer) > 0 and len(correct_answer) > 0:
+        try:
+            # Numeric analysis
+            w = float(wrong_answer)
+            c = float(correct_answer)
+            if w == c * 10 or w == c / 10:
+                return "Analyzed: Use of correct digits but wrong magnitude (Order of Magnitude Trap)."
+        except:
+            pass
+
+    return "Analyzed: This looks like a fundamental misunderstanding of the concept."
 
 ai_service = AIService()
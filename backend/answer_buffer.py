@@ -0,0 +1,293 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import AsyncSessionLocal, User, StudentResponse
+from answer_stats import record_answer_stats
+from metrics import span
+
+logger = logging.getLogger(__name__)
+
+# Flush buffered answers every N ms, or as soon as M are waiting
+ANSWER_FLUSH_INTERVAL_MS = int(os.environ.get("ANSWER_FLUSH_INTERVAL_MS", "50"))
+ANSWER_FLUSH_MAX_BATCH = int(os.environ.get("ANSWER_FLUSH_MAX_BATCH", "500"))
+# Answers waiting beyond this are refused (the API answers 503) rather than
+# letting the buffer grow without bound while the database is unreachable
+ANSWER_BUFFER_MAX_PENDING = int(os.environ.get("ANSWER_BUFFER_MAX_PENDING", "20000"))
+# Consecutive failed flushes (database errors other than constraint
+# violations) before the pending answers are dead-lettered. Retries back off
+# exponentially from the flush interval up to ANSWER_RETRY_MAX_DELAY_MS.
+ANSWER_FLUSH_MAX_RETRIES = int(os.environ.get("ANSWER_FLUSH_MAX_RETRIES", "10"))
+ANSWER_RETRY_MAX_DELAY_MS = int(os.environ.get("ANSWER_RETRY_MAX_DELAY_MS", "5000"))
+# Answers that could not be written are appended here, one JSON object per line
+ANSWER_DEAD_LETTER_FILE = os.environ.get("ANSWER_DEAD_LETTER_FILE", "unsaved_answers.ndjson")
+
+users_table = User.__table__
+
+# XP increments are applied in SQL, so several API processes can share users
+_apply_xp = (
+    update(users_table)
+    .where(users_table.c.id == bindparam("user_id"))
+    .values(
+        xp=users_table.c.xp + bindparam("delta"),
+        # Simple Level Formula: Level = (XP / 100) + 1
+        level=(users_table.c.xp + bindparam("delta")) // 100 + 1
+    )
+)
+
+
+def level_for_xp(xp: int) -> int:
+    # Simple Level Formula: Level = (XP / 100) + 1
+    return int((xp / 100) + 1)
+
+
+class AnswerBufferFull(Exception):
+    """
+    Raised by `AnswerBuffer.record` when `max_pending` answers are
+    already waiting to be written.
+    """
+
+
+class PendingAnswer(NamedTuple):
+    row: Dict[str, Any] # student_responses row
+    correct: bool
+    xp_gain: int
+
+
+class AnswerBuffer:
+    """
+    Write-behind buffer for /submit-answer.
+
+    An answer is acknowledged as soon as its XP/level is computed; the
+    `student_responses` rows are inserted in batches, XP increments are
+    coalesced into one UPDATE per user per flush, and the answer statistics
+    tables are updated in the same transaction. Flushes run every
+    `flush_interval_ms` or once `max_batch` answers are waiting, and
+    `stop()` drains whatever is left.
+
+    A batch rejected by a constraint (e.g. an answer to a question that is
+    not in the database) is split in halves until the offending answers are
+    isolated; those are dead-lettered and the rest is written. Other errors
+    are retried with backoff up to `max_retries` times before the pending
+    answers are dead-lettered too. Dead-lettered answers are appended to
+    `dead_letter_file` and counted in `dead_lettered`.
+    """
+    def __init__(self, flush_interval_ms: int = ANSWER_FLUSH_INTERVAL_MS,
+                 max_batch: int = ANSWER_FLUSH_MAX_BATCH,
+                 session_factory=AsyncSessionLocal,
+                 max_pending: int = ANSWER_BUFFER_MAX_PENDING,
+                 max_retries: int = ANSWER_FLUSH_MAX_RETRIES,
+                 retry_max_delay_ms: int = ANSWER_RETRY_MAX_DELAY_MS,
+                 dead_letter_file: Optional[str] = ANSWER_DEAD_LETTER_FILE):
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch = max_batch
+        self.session_factory = session_factory
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.retry_max_delay = retry_max_delay_ms / 1000
+        self.dead_letter_file = dead_letter_file
+        self.flushed_responses = 0
+        self.dead_lettered = 0
+
+        self._pending: List[PendingAnswer] = []
+        self._new_users: Set[str] = set()
+        # Acknowledged XP of users with unflushed answers (the DB lags behind)
+        self._known_xp: Dict[str, int] = {}
+        self._failed_flushes = 0 # Consecutive
+
+        # Created in start(), on the loop that serves requests
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._batch_full: Optional[asyncio.Event] = None
+        self._stop_requested: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    async def record(self, db: AsyncSession, user_id: str, response_row: Dict[str, Any],
+                     xp_gain: int, is_correct: bool) -> Tuple[int, int]:
+        """
+        Buffers one answer and returns the user's new (xp, level).
+        Raises AnswerBufferFull instead if `max_pending` answers are waiting.
+        """
+        if len(self._pending) >= self.max_pending:
+            raise AnswerBufferFull(f"{len(self._pending)} answers are waiting to be saved")
+        if user_id not in self._known_xp:
+            xp = (await db.execute(select(User.xp).where(User.id == user_id))).scalar()
+            # Another request may have registered the user while we awaited
+            if user_id not in self._known_xp:
+                if xp is None:
+                    self._new_users.add(user_id)
+                self._known_xp[user_id] = xp or 0
+
+        xp = self._known_xp[user_id] + xp_gain
+        self._known_xp[user_id] = xp
+        self._pending.append(PendingAnswer(response_row, is_correct, xp_gain))
+
+        if len(self._pending) >= self.max_batch and self._batch_full:
+            self._batch_full.set()
+        return xp, level_for_xp(xp)
+
+    def current_xp(self, user_id: str) -> Optional[int]:
+        """
+        XP including answers not yet flushed, or None if none are pending.
+        """
+        return self._known_xp.get(user_id)
+
+    async def flush(self, final: bool = False) -> bool:
+        """
+        Writes the pending answers. Returns False if a database error left
+        some of them pending; with `final`, those are dead-lettered instead.
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return True
+            batch, self._pending = self._pending, []
+
+            with span("answers.flush"):
+                written, rejected, unwritten, error = await self._write_isolating(batch)
+
+            self.flushed_responses += len(written)
+            if rejected:
+                self._dead_letter(rejected)
+            if unwritten:
+                self._failed_flushes += 1
+                if final or self._failed_flushes > self.max_retries:
+                    logger.error("Giving up on %d buffered answers after %d failed flushes: %s",
+                                 len(unwritten), self._failed_flushes, error)
+                    self._dead_letter([(answer, error) for answer in unwritten])
+                    self._failed_flushes = 0
+                else:
+                    logger.warning("Flushing %d buffered answers failed (attempt %d of %d); will retry: %s",
+                                   len(unwritten), self._failed_flushes, self.max_retries, error)
+                    self._pending = unwritten + self._pending
+            else:
+                self._failed_flushes = 0
+
+            # Users with nothing left pending are now current in the DB
+            pending_users = {answer.row["user_id"] for answer in self._pending}
+            for answer in batch:
+                user_id = answer.row["user_id"]
+                if user_id not in pending_users:
+                    self._known_xp.pop(user_id, None)
+                    self._new_users.discard(user_id)
+            return not self._pending
+
+    async def _write_isolating(self, batch: List[PendingAnswer]):
+        """
+        Writes `batch`, bisecting chunks that violate a constraint down to
+        single answers. Returns (written, rejected, unwritten, error):
+        rejected pairs each bad answer with its IntegrityError, and
+        unwritten is what was left when any other error stopped the flush.
+        """
+        written: List[PendingAnswer] = []
+        rejected: List[Tuple[PendingAnswer, Exception]] = []
+        chunks = [batch]
+        while chunks:
+            chunk = chunks.pop()
+            try:
+                async with self.session_factory() as db:
+                    await self._write(db, chunk)
+            except IntegrityError as e:
+                if len(chunk) == 1:
+                    rejected.append((chunk[0], e))
+                else:
+                    middle = len(chunk) // 2
+                    chunks += [chunk[middle:], chunk[:middle]]
+                continue
+            except Exception as e:
+                unwritten = chunk + [answer for rest in reversed(chunks) for answer in rest]
+                return written, rejected, unwritten, e
+            written += chunk
+        return written, rejected, [], None
+
+    async def _write(self, db: AsyncSession, answers: List[PendingAnswer]):
+        user_ids = {answer.row["user_id"] for answer in answers}
+        new_users = user_ids & self._new_users
+        if new_users:
+            existing = set((await db.execute(select(User.id).where(User.id.in_(new_users)))).scalars())
+            missing = new_users - existing
+            if missing:
+                await db.execute(insert(users_table), [
+                    {"id": user_id, "name": "Student", "xp": 0, "level": 1} for user_id in missing
+                ])
+        await db.execute(insert(StudentResponse.__table__), [answer.row for answer in answers])
+        await record_answer_stats(db, [
+            (a.row["user_id"], a.row["question_id"], a.correct, bool(a.row["trap_detected"])) for a in answers
+        ])
+        deltas: Dict[str, int] = {}
+        for answer in answers:
+            if answer.xp_gain:
+                deltas[answer.row["user_id"]] = deltas.get(answer.row["user_id"], 0) + answer.xp_gain
+        if deltas:
+            await db.execute(_apply_xp, [{"user_id": user_id, "delta": delta} for user_id, delta in deltas.items()])
+        await db.commit()
+
+    def _dead_letter(self, failed: List[Tuple[PendingAnswer, Exception]]):
+        self.dead_lettered += len(failed)
+        logger.error("Dead-lettering %d answers that could not be saved (first error: %s)", len(failed), failed[0][1])
+        if not self.dead_letter_file:
+            return
+        failed_at = datetime.utcnow().isoformat()
+        try:
+            with open(self.dead_letter_file, "a", encoding="utf-8") as out:
+                for answer, error in failed:
+                    out.write(json.dumps({
+                        **answer.row, "is_correct": answer.correct, "xp_gain": answer.xp_gain,
+                        "error": str(error).splitlines()[0], "failed_at": failed_at
+                    }) + "\n")
+        except OSError:
+            logger.exception("Could not write dead-lettered answers to %s", self.dead_letter_file)
+
+    def _retry_delay(self) -> float:
+        if not self._failed_flushes:
+            return self.flush_interval
+        return min(self.flush_interval * 2 ** self._failed_flushes, self.retry_max_delay)
+
+    async def _run(self):
+        while not self._stopping:
+            # After a failed flush, wait out the backoff even if the batch fills
+            wake = self._stop_requested if self._failed_flushes else self._batch_full
+            try:
+                await asyncio.wait_for(wake.wait(), self._retry_delay())
+            except asyncio.TimeoutError:
+                pass
+            self._batch_full.clear()
+            if not self._stopping:
+                await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._flush_lock = asyncio.Lock()
+            self._batch_full = asyncio.Event()
+            self._stop_requested = asyncio.Event()
+            self._stopping = False
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> int:
+        """
+        Stops the periodic flusher and drains the buffer. Returns the number
+        of answers dead-lettered over the buffer's lifetime (0 if every
+        acknowledged answer was saved).
+        """
+        if self._task is None:
+            return self.dead_lettered
+        self._stopping = True
+        self._stop_requested.set()
+        self._batch_full.set()
+        # Not cancelled while flushing: a flush in progress must finish its batch
+        await self._task
+        self._task = None
+        await self.flush(final=True)
+        if self.dead_lettered:
+            logger.error("%d acknowledged answers could not be saved; see %s",
+                         self.dead_lettered, self.dead_letter_file or "the log above")
+        return self.dead_lettered
+
+answer_buffer = AnswerBuffer()
@@ -0,0 +1,112 @@
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Question, QuestionStats, UserStats, UserTopicStats
+
+user_stats_table = UserStats.__table__
+user_topic_stats_table = UserTopicStats.__table__
+question_stats_table = QuestionStats.__table__
+
+_UPSERT = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+USER_COUNTERS = ("answered", "correct", "traps_fallen", "traps_avoided")
+TOPIC_COUNTERS = ("answered", "correct", "traps_fallen")
+QUESTION_COUNTERS = ("answered", "correct", "trap_hits")
+
+
+def has_trap(options: Optional[Sequence[Dict[str, Any]]]) -> bool:
+    return any(opt.get("isTrap") for opt in options or ())
+
+
+def increment(dialect: str, table, keys: Sequence[str]):
+    """
+    INSERT ... ON CONFLICT DO UPDATE adding the row's counters to the
+    stored ones. Run it executemany-style with one dict per key.
+    """
+    stmt = _UPSERT[dialect](table)
+    counters = [c.name for c in table.c if c.name not in keys]
+    return stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={name: table.c[name] + stmt.excluded[name] for name in counters}
+    )
+
+
+def aggregate(answers: Iterable[Tuple[str, str, bool, bool]],
+              questions: Dict[str, Tuple[Optional[str], bool]]):
+    """
+    Folds (user_id, question_id, is_correct, fell_for_trap) answers into
+    per-user, per-user-topic and per-question counter rows. `questions` maps
+    question id to (topic, has_trap); answers to questions missing from it
+    (e.g. generated on the fly) only count towards the user totals.
+    """
+    users: Dict[str, Counter] = {}
+    topics: Dict[Tuple[str, str], Counter] = {}
+    per_question: Dict[str, Counter] = {}
+
+    for user_id, question_id, correct, trapped in answers:
+        topic, trap_question = questions.get(question_id, (None, False))
+        u = users.setdefault(user_id, Counter())
+        u["answered"] += 1
+        u["correct"] += correct
+        u["traps_fallen"] += trapped
+        u["traps_avoided"] += correct and trap_question
+        if question_id not in questions:
+            continue
+        if topic:
+            t = topics.setdefault((user_id, topic), Counter())
+            t["answered"] += 1
+            t["correct"] += correct
+            t["traps_fallen"] += trapped
+        q = per_question.setdefault(question_id, Counter())
+        q["answered"] += 1
+        q["correct"] += correct
+        q["trap_hits"] += trapped
+
+    return (
+        [dict({c: int(counts[c]) for c in USER_COUNTERS}, user_id=k) for k, counts in users.items()],
+        [dict({c: int(counts[c]) for c in TOPIC_COUNTERS}, user_id=k[0], topic=k[1]) for k, counts in topics.items()],
+        [dict({c: int(counts[c]) for c in QUESTION_COUNTERS}, question_id=k) for k, counts in per_question.items()],
+    )
+
+
+async def record_answer_stats(db: AsyncSession, answers: List[Tuple[str, str, bool, bool]]):
+    """
+    Adds a batch of answers to the statistics tables. Runs inside the
+    caller's transaction so counters commit together with the responses.
+    """
+    if not answers:
+        return
+    question_ids = {a[1] for a in answers}
+    rows = await db.execute(select(Question.id, Question.topic, Question.options).where(Question.id.in_(question_ids)))
+    questions = {qid: (topic, has_trap(options)) for qid, topic, options in rows}
+
+    dialect = db.bind.dialect.name
+    users, topics, per_question = aggregate(answers, questions)
+    await db.execute(increment(dialect, user_stats_table, ["user_id"]), users)
+    if topics:
+        await db.execute(increment(dialect, user_topic_stats_table, ["user_id", "topic"]), topics)
+    if per_question:
+        await db.execute(increment(dialect, question_stats_table, ["question_id"]), per_question)
+
+
+async def get_user_stats(db: AsyncSession, user_id: str) -> Dict[str, Any]:
+    row = (await db.execute(select(user_stats_table).where(user_stats_table.c.user_id == user_id))).mappings().first()
+    stats = {c: row[c] if row else 0 for c in USER_COUNTERS}
+    topic_rows = await db.execute(
+        select(user_topic_stats_table).where(user_topic_stats_table.c.user_id == user_id)
+    )
+    stats["topics"] = {r["topic"]: {c: r[c] for c in TOPIC_COUNTERS} for r in topic_rows.mappings()}
+    return stats
+
+
+async def get_question_stats(db: AsyncSession, question_id: str) -> Optional[Dict[str, Any]]:
+    row = (await db.execute(
+        select(question_stats_table).where(question_stats_table.c.question_id == question_id)
+    )).mappings().first()
+    if not row:
+        return None
+    stats = {c: row[c] for c in QUESTION_COUNTERS}
+    stats["trap_hit_rate"] = row["trap_hits"] / row["answered"] if row["answered"] else 0.0
+    return stats
@@ -0,0 +1,108 @@
+"""
+Benchmark: /submit-answer write path, synchronous commits vs write-behind.
+
+Simulates classroom bursts (every student answers at the same moment,
+round after round) against a temporary SQLite database, and reports the
+acknowledgement latency of each path. Afterwards it checks durability:
+once the buffer is drained, every response row and every XP point must be
+in the database.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_answer_buffer
+"""
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+
+from sqlalchemy import func, select  # noqa: E402
+
+from answer_buffer import AnswerBuffer, level_for_xp  # noqa: E402
+from models import AsyncSessionLocal, StudentResponse, User, async_engine, init_db  # noqa: E402
+
+STUDENTS = 40
+ROUNDS = 25
+
+
+def response_row(user_id):
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "question_id": "q1",
+        "selected_option": "o1",
+        "trap_detected": False,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
+async def submit_direct(user_id):
+    # The endpoint as it was: one transaction per answer
+    async with AsyncSessionLocal() as db:
+        user = (await db.execute(select(User).where(User.id == user_id))).scalars().first()
+        if not user:
+            user = User(id=user_id, name="Student", xp=0, level=1)
+            db.add(user)
+        db.add(StudentResponse(**response_row(user_id)))
+        user.xp += 10
+        user.level = level_for_xp(user.xp)
+        await db.commit()
+
+
+async def submit_buffered(buffer, user_id):
+    async with AsyncSessionLocal() as db:
+        await buffer.record(db, user_id, response_row(user_id), 10, True)
+
+
+async def timed(coro, latencies):
+    start = time.perf_counter()
+    await coro
+    latencies.append(time.perf_counter() - start)
+
+
+async def burst(label, submit, prefix):
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        await asyncio.gather(*(timed(submit(f"{prefix}-{n}"), latencies) for n in range(STUDENTS)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{label:<16}{len(latencies):>9}{statistics.median(latencies) * 1000:>10.2f}{p99 * 1000:>10.2f}"
+          f"{len(latencies) / elapsed:>12.0f}")
+
+
+async def check_durability(prefix):
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(
+            select(func.count()).select_from(StudentResponse).where(StudentResponse.user_id.like(f"{prefix}-%"))
+        )).scalar()
+        xp = (await db.execute(select(func.sum(User.xp)).where(User.id.like(f"{prefix}-%")))).scalar()
+    expected = STUDENTS * ROUNDS
+    status = "ok" if rows == expected and xp == expected * 10 else "MISSING DATA"
+    print(f"{prefix:<16}rows {rows}/{expected}, xp {xp}/{expected * 10}: {status}")
+
+
+async def main():
+    init_db()
+    print(f"{'path':<16}{'answers':>9}{'p50 ms':>10}{'p99 ms':>10}{'answers/s':>12}")
+    await burst("direct commit", submit_direct, "direct")
+
+    buffer = AnswerBuffer()
+    buffer.start()
+    await burst("write-behind", lambda user_id: submit_buffered(buffer, user_id), "buffered")
+    await buffer.stop()
+
+    await check_durability("direct")
+    await check_durability("buffered")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
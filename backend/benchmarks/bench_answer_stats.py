@@ -0,0 +1,75 @@
+"""
+Benchmark: trap analytics aggregated on demand vs read from the
+materialized statistics tables.
+
+Seeds a temporary SQLite database like bench_query_indexes (a million
+student responses by default), runs the migrations (hot-path indexes plus
+the statistics backfill), then times each dashboard query both ways.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_answer_stats [--responses 1000000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import Integer, func, select, text
+
+from benchmarks.bench_query_indexes import seed, time_query
+from migrations import run_migrations
+from models import Base, Question, QuestionStats, StudentResponse, UserStats, UserTopicStats, make_engine
+
+trapped = func.sum(StudentResponse.trap_detected.cast(Integer))
+
+
+def cases(question_ids):
+    return [
+        ("user totals",
+         select(func.count(), trapped).where(StudentResponse.user_id == "user-42"),
+         select(UserStats).where(UserStats.user_id == "user-42")),
+        ("user per topic",
+         select(Question.topic, func.count(), trapped)
+         .join(Question, Question.id == StudentResponse.question_id)
+         .where(StudentResponse.user_id == "user-42").group_by(Question.topic),
+         select(UserTopicStats).where(UserTopicStats.user_id == "user-42")),
+        ("question trap-hit rate",
+         select(func.count(), trapped).where(StudentResponse.question_id == question_ids[5]),
+         select(QuestionStats).where(QuestionStats.question_id == question_ids[5])),
+        ("top 10 trap questions",
+         select(StudentResponse.question_id, trapped.label("hits"))
+         .group_by(StudentResponse.question_id).order_by(text("hits DESC")).limit(10),
+         select(QuestionStats).order_by(QuestionStats.trap_hits.desc()).limit(10)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--responses", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            question_ids, _ = seed(conn, args.responses)
+
+        start = time.perf_counter()
+        run_migrations(engine, Base.metadata)
+        print(f"Seeded {args.responses} responses; migrations incl. backfill took "
+              f"{time.perf_counter() - start:.1f}s\n")
+
+        with engine.connect() as conn:
+            conn.execute(text("ANALYZE"))
+            results = [(label, time_query(conn, live), time_query(conn, stored))
+                       for label, live, stored in cases(question_ids)]
+        engine.dispose()
+
+    print(f"{'query':<26}{'on demand ms':>14}{'stats table ms':>16}{'speedup':>10}")
+    for label, live, stored in results:
+        print(f"{label:<26}{live * 1000:>14.2f}{stored * 1000:>16.3f}{live / stored:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+End-to-end API load test, in process and offline.
+
+Seeds a temporary SQLite database with users, questions and student
+responses, starts the app (lifespan included: ingestion workers, answer
+buffer, leaderboard) and drives it through an in-process ASGI client with
+concurrent requests. Each scenario reports p50/p95/p99 latency and
+throughput; results can be saved as a JSON baseline and later runs
+compared against it:
+
+    python -m benchmarks.bench_api --output baseline.json
+    python -m benchmarks.bench_api --baseline baseline.json   # exits 1 on regression
+
+Run from the backend directory. `--scale 0.1` gives a quick smoke run.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+# Everything the app writes (database, uploaded_books/) goes to a temp dir
+CWD = os.getcwd()
+TMP = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP.name, 'bench.db')}"
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+os.chdir(TMP.name)
+
+import httpx  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from benchmarks.synthetic_pdf import make_pdf, textbook_pages  # noqa: E402
+from models import Base, Question, StudentResponse, User, engine  # noqa: E402
+
+TOPICS = ("math", "cs", "physics", "chemistry", "biology")
+SEED_CHUNK = 50_000
+
+# Default volumes and load, multiplied by --scale
+USERS = 20_000
+QUESTIONS = 10_000
+RESPONSES = 500_000
+REQUESTS = 2_000
+UPLOADS = 20
+CONCURRENCY = 32
+
+
+def seed(users: int, questions: int, responses: int):
+    rng = random.Random(7)
+    Base.metadata.create_all(bind=engine)
+    user_ids = [f"user-{n}" for n in range(users)]
+    question_ids = [str(uuid.uuid4()) for _ in range(questions)]
+    start = datetime(2026, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__), [
+            {"id": user_id, "name": f"Student {n}", "xp": rng.randrange(0, 5000, 10), "level": 1}
+            for n, user_id in enumerate(user_ids)
+        ])
+        rows = []
+        for n, qid in enumerate(question_ids):
+            a, b = rng.randrange(2, 20), rng.randrange(2, 20)
+            rows.append({
+                "id": qid, "topic": TOPICS[n % len(TOPICS)], "text": f"What is {a} x {b}?", "explanation": "",
+                "options": [
+                    {"id": "a", "text": str(a * b), "isCorrect": True, "isTrap": False, "feedback": None},
+                    {"id": "b", "text": str(a + b), "isCorrect": False, "isTrap": True, "feedback": "Not a sum."},
+                    {"id": "c", "text": str(a * b + 1), "isCorrect": False, "isTrap": False, "feedback": None},
+                ],
+                "correct_option": str(a * b), "wrong_options": [str(a + b), str(a * b + 1)], "trap_type": "Manual",
+            })
+        conn.execute(insert(Question.__table__), rows)
+        for offset in range(0, responses, SEED_CHUNK):
+            conn.execute(insert(StudentResponse.__table__), [
+                {"id": str(uuid.uuid4()), "user_id": rng.choice(user_ids), "question_id": rng.choice(question_ids),
+                 "selected_option": rng.choice("abc"), "trap_detected": rng.random() < 0.3,
+                 "timestamp": (start + timedelta(minutes=rng.randrange(400_000))).isoformat()}
+                for _ in range(min(SEED_CHUNK, responses - offset))
+            ])
+    return user_ids, question_ids
+
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+async def run_scenario(client, make_request, count, concurrency, on_response=None):
+    """
+    Issues `count` requests, `concurrency` at a time. `make_request(i)`
+    returns (method, url, kwargs).
+    """
+    latencies, errors = [], 0
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        nonlocal errors
+        method, url, kwargs = make_request(i)
+        async with gate:
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            errors += 1
+        elif on_response:
+            on_response(response)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(count)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": count,
+        "errors": errors,
+        "throughput_rps": round(count / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+    }
+
+
+async def wait_for_jobs(client, job_ids, timeout=600):
+    """
+    Polls until every job is done or failed; returns (failed, unfinished).
+    """
+    deadline = time.perf_counter() + timeout
+    pending, failed = set(job_ids), 0
+    while pending and time.perf_counter() < deadline:
+        for job_id in list(pending):
+            status = (await client.get(f"/ingestion-jobs/{job_id}")).json()["status"]
+            if status in ("done", "failed"):
+                pending.discard(job_id)
+                failed += status == "failed"
+        await asyncio.sleep(0.1)
+    return failed, len(pending)
+
+
+async def drive(args, user_ids, question_ids):
+    import main
+
+    rng = random.Random(11)
+    requests = max(1, int(REQUESTS * args.scale))
+    uploads = max(1, int(UPLOADS * args.scale))
+    pdfs = [make_pdf(textbook_pages(chapters=6, pages_per_chapter=3, seed=n)) for n in range(uploads)]
+
+    scenarios = {
+        "GET /questions": lambda i: ("GET", "/questions", {"params": {"topic": rng.choice(TOPICS), "limit": 20}}),
+        "POST /submit-answer": lambda i: ("POST", "/submit-answer", {"json": {
+            "user_id": rng.choice(user_ids), "question_id": rng.choice(question_ids), "selected_option_id": "a",
+            "is_correct": rng.random() < 0.6, "is_trap": rng.random() < 0.3,
+        }}),
+        "GET /user-stats": lambda i: ("GET", f"/user-stats/{rng.choice(user_ids)}", {}),
+        "GET /leaderboard": lambda i: ("GET", "/leaderboard", {"params": {"limit": 10}}),
+        "GET /generate-question": lambda i: ("GET", f"/generate-question/{rng.choice(['math', 'cs'])}", {}),
+    }
+
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            # The leaderboard loads in the background at startup
+            while (await client.get("/leaderboard")).status_code == 503:
+                await asyncio.sleep(0.05)
+
+            for name, make_request in scenarios.items():
+                results[name] = await run_scenario(client, make_request, requests, args.concurrency)
+                print_row(name, results[name])
+
+            # Distinct synthetic books, so none is deduplicated; parsing runs
+            # in the ingestion workers and is timed until the last job is done
+            job_ids = []
+            upload = lambda i: ("POST", "/upload-textbook", {
+                "files": {"file": (f"book-{i}.pdf", pdfs[i], "application/pdf")},
+                "data": {"subject": "Science", "grade": "8", "board": "CBSE"},
+            })
+            start = time.perf_counter()
+            results["POST /upload-textbook"] = await run_scenario(
+                client, upload, uploads, min(args.concurrency, 4),
+                on_response=lambda response: job_ids.append(response.json()["job_id"])
+            )
+            print_row("POST /upload-textbook", results["POST /upload-textbook"])
+            failed, unfinished = await wait_for_jobs(client, job_ids)
+            parse_seconds = time.perf_counter() - start
+            results["textbook ingestion"] = {
+                "books": len(job_ids), "failed": failed, "unfinished": unfinished,
+                "seconds": round(parse_seconds, 3), "books_per_s": round(len(job_ids) / parse_seconds, 2),
+            }
+            print(f"{'textbook ingestion':<24}{len(job_ids)} books uploaded and parsed in {parse_seconds:.2f}s"
+                  f" ({failed} failed, {unfinished} unfinished)")
+    return results
+
+
+def print_row(name, r):
+    print(f"{name:<24}{r['requests']:>9}{r['errors']:>8}{r['throughput_rps']:>10.0f}"
+          f"{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}")
+
+
+def compare(results, baseline, tolerance):
+    """
+    Scenarios whose p95 grew, or throughput dropped, by more than
+    `tolerance` relative to the baseline.
+    """
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get("results", {}).get(name)
+        if not before or "p95_ms" not in current:
+            continue
+        if current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms")
+        if current["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {before['throughput_rps']:.0f} -> {current['throughput_rps']:.0f} req/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplies seeded volumes and request counts")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--output", help="Write results as JSON here")
+    parser.add_argument("--baseline", help="Compare against a JSON file written by --output")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown (default 0.25)")
+    args = parser.parse_args()
+
+    counts = [max(1, int(n * args.scale)) for n in (USERS, QUESTIONS, RESPONSES)]
+    start = time.perf_counter()
+    user_ids, question_ids = seed(*counts)
+    print(f"Seeded {counts[0]} users, {counts[1]} questions, {counts[2]} responses "
+          f"in {time.perf_counter() - start:.1f}s\n")
+    print(f"{'scenario':<24}{'requests':>9}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+
+    results = asyncio.run(drive(args, user_ids, question_ids))
+    report = {
+        "created_at": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": args.scale,
+        "concurrency": args.concurrency,
+        "seeded": dict(zip(("users", "questions", "responses"), counts)),
+        "results": results,
+    }
+    if args.output:
+        with open(os.path.join(CWD, args.output), "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(os.path.join(CWD, args.baseline)) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
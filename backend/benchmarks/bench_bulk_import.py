@@ -0,0 +1,74 @@
+"""
+Benchmark: loading a question bank through POST /questions one question at a
+time vs POST /questions/bulk.
+
+The single path repeats what create_question does per request (validate,
+analyse traps, one transaction per question) for a sample and extrapolates;
+the bulk path imports the whole NDJSON bank through `import_questions`.
+Both run against a temporary SQLite database, without HTTP overhead.
+
+Uses SPACY_MODEL when it is installed, else a blank English pipeline.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_bulk_import
+"""
+import io
+import json
+import os
+import tempfile
+import time
+
+import spacy
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+if not spacy.util.is_package(os.environ.get("SPACY_MODEL", "en_core_web_sm")):
+    os.environ["SPACY_MODEL"] = "blank:en"
+
+from main import QuestionModel, create_question  # noqa: E402
+from models import SessionLocal  # noqa: E402
+from question_import import import_questions, iter_records  # noqa: E402
+
+BANK_SIZE = 100_000
+SINGLE_SAMPLE = 2_000
+
+
+def question(prefix: str, i: int):
+    a, b = i % 90 + 2, i % 9 + 2
+    return {
+        "id": f"{prefix}-{i}",
+        "text": f"A box holds {a} rows of {b} marbles. How many marbles are there?",
+        "topic": ("math", "cs", "physics")[i % 3],
+        "explanation": "Multiply rows by marbles per row.",
+        "options": [
+            {"id": "a", "text": str(a * b), "isCorrect": True},
+            {"id": "b", "text": str(a * b * 10), "isTrap": True},
+            {"id": "c", "text": str(a + b), "isTrap": True},
+            {"id": "d", "text": str(a * b - 1)},
+        ],
+    }
+
+
+def main():
+    db = SessionLocal()
+    start = time.perf_counter()
+    for i in range(SINGLE_SAMPLE):
+        create_question(QuestionModel.model_validate(question("single", i)), db)
+    single = time.perf_counter() - start
+
+    bank = "\n".join(json.dumps(question("bulk", i)) for i in range(BANK_SIZE)).encode()
+    start = time.perf_counter()
+    report = import_questions(iter_records(io.BytesIO(bank), "ndjson"), db, QuestionModel)
+    bulk = time.perf_counter() - start
+    db.close()
+    assert report.imported == BANK_SIZE and report.failed == 0, report.as_dict()
+
+    print(f"{'path':<10}{'questions':>11}{'seconds':>10}{'questions/s':>13}")
+    print(f"{'single':<10}{SINGLE_SAMPLE:>11}{single:>10.2f}{SINGLE_SAMPLE / single:>13.0f}")
+    print(f"{'bulk':<10}{BANK_SIZE:>11}{bulk:>10.2f}{BANK_SIZE / bulk:>13.0f}")
+    print(f"single path at {BANK_SIZE} questions: ~{single * BANK_SIZE / SINGLE_SAMPLE:.0f}s (extrapolated)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark: chapter/question write throughput during textbook ingestion.
+
+Writes the same synthetic book into a fresh SQLite file twice: once the
+way ingestion used to (one ORM `db.add` per row, a commit per chapter) and
+once through `ChapterWriter` (Core executemany inserts, batched commits),
+and reports rows/s for each.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_ingest_writes
+"""
+import os
+import tempfile
+import time
+import uuid
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, Chapter, ExtractedQuestion
+from textbook_processor import ChapterWriter
+
+CHAPTERS = 200
+QUESTIONS_PER_CHAPTER = 40
+
+
+def synthetic_book(textbook_id):
+    for n in range(1, CHAPTERS + 1):
+        chapter_id = str(uuid.uuid4())
+        chapter_row = {
+            "id": chapter_id,
+            "textbook_id": textbook_id,
+            "chapter_number": n,
+            "title": f"Chapter {n}",
+            "content_summary": "Some chapter text.\n" * 200
+        }
+        question_rows = [
+            {
+                "id": str(uuid.uuid4()),
+                "chapter_id": chapter_id,
+                "question_type": "Short",
+                "text": f"{q}. What is the SI unit of force?",
+                "answer": "",
+                "difficulty": "Medium"
+            }
+            for q in range(QUESTIONS_PER_CHAPTER)
+        ]
+        yield chapter_row, question_rows
+
+
+def fresh_session(path):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(bind=engine)()
+
+
+def write_per_row(db):
+    rows = 0
+    for chapter_row, question_rows in synthetic_book("legacy"):
+        for q in question_rows:
+            db.add(ExtractedQuestion(**q))
+        db.add(Chapter(**chapter_row))
+        db.commit()
+        rows += 1 + len(question_rows)
+    return rows
+
+
+def write_batched(db, batch_size, commit_every):
+    writer = ChapterWriter(db, batch_size=batch_size, commit_every=commit_every)
+    for n, (chapter_row, question_rows) in enumerate(synthetic_book("batched")):
+        writer.add_chapter(chapter_row, question_rows, (n, 0))
+    writer.commit()
+    return writer.rows_written
+
+
+def run(label, fn):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine, db = fresh_session(os.path.join(tmp, "bench.db"))
+        try:
+            start = time.perf_counter()
+            rows = fn(db)
+            elapsed = time.perf_counter() - start
+        finally:
+            db.close()
+            engine.dispose()
+    print(f"{label:<34}{rows:>8}{elapsed:>10.2f}{rows / elapsed:>12.0f}")
+
+
+def main():
+    print(f"{'writer':<34}{'rows':>8}{'seconds':>10}{'rows/s':>12}")
+    run("per-row ORM, commit per chapter", write_per_row)
+    run("batched, commit per chapter", lambda db: write_batched(db, 500, 1))
+    run("batched, commit per 10 chapters", lambda db: write_batched(db, 500, 10))
+    run("batched, one transaction", lambda db: write_batched(db, 500, 0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark: leaderboard queries against the users table vs the in-memory
+Leaderboard.
+
+Seeds a temporary SQLite database with a million users (random XP), then
+times top-10 and "rank of user X" as SQL (`ORDER BY xp`, `COUNT(*) WHERE
+xp > ?`) and from a Leaderboard rebuilt from the table, plus the cost of
+the rebuild and of the per-answer XP update.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_leaderboard [--users 1000000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import func, insert, select
+
+from leaderboard import Leaderboard
+from models import Base, User, make_engine
+
+CHUNK = 100_000
+QUERIES = 20
+UPDATES = 100_000
+
+
+def per_op(fn, n):
+    start = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    return (time.perf_counter() - start) / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=1_000_000)
+    args = parser.parse_args()
+    rng = random.Random(1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        xp = {f"user-{n}": rng.randrange(0, 50_000, 10) for n in range(args.users)}
+        user_ids = list(xp)
+        with engine.begin() as conn:
+            for start in range(0, args.users, CHUNK):
+                conn.execute(insert(User.__table__), [
+                    {"id": user_id, "name": "Student", "xp": xp[user_id], "level": 1}
+                    for user_id in user_ids[start:start + CHUNK]
+                ])
+
+        probes = [rng.choice(user_ids) for _ in range(QUERIES)]
+        with engine.connect() as conn:
+            sql_top = per_op(lambda i: conn.execute(select(User.id, User.xp).order_by(User.xp.desc()).limit(10)).all(),
+                             QUERIES)
+            sql_rank = per_op(lambda i: conn.execute(
+                select(func.count()).where(User.xp > select(User.xp).where(User.id == probes[i]).scalar_subquery())
+            ).scalar(), QUERIES)
+
+        board = Leaderboard()
+        start = time.perf_counter()
+        with engine.connect() as conn:
+            board.rebuild(conn.execute(select(User.id, User.xp)).all())
+        rebuild = time.perf_counter() - start
+        engine.dispose()
+
+    mem_top = per_op(lambda i: board.top(10), 10_000)
+    mem_rank = per_op(lambda i: board.rank(probes[i % QUERIES]), 10_000)
+    answering = [rng.choice(user_ids) for _ in range(UPDATES)]
+
+    def answer(i):
+        user_id = answering[i]
+        xp[user_id] += 10
+        board.update(user_id, xp[user_id])
+    update = per_op(answer, UPDATES)
+
+    ordered = sorted(xp.items(), key=lambda item: (-item[1], item[0]))
+    assert board.top(10) == ordered[:10]
+    assert board.rank(ordered[12345 % len(ordered)][0]) == 12345 % len(ordered) + 1
+
+    print(f"{args.users} users; rebuild from table {rebuild:.2f}s\n")
+    print(f"{'operation':<22}{'SQL us':>12}{'in-memory us':>15}")
+    print(f"{'top 10':<22}{sql_top * 1e6:>12.0f}{mem_top * 1e6:>15.1f}")
+    print(f"{'rank of user':<22}{sql_rank * 1e6:>12.0f}{mem_rank * 1e6:>15.1f}")
+    print(f"{'XP update':<22}{'-':>12}{update * 1e6:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark: cost of the instrumentation in metrics.py.
+
+Times a bare loop against `span()`, `@timed` and a raw histogram
+observation, then runs `SELECT 1` on an in-memory SQLite engine with and
+without the query hooks, and a trivial endpoint with and without
+`MetricsMiddleware`.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_metrics [--iterations 200000]
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine, text
+
+from metrics import MetricsMiddleware, instrument_engine, request_latency, span, timed
+
+
+def per_call(fn, iterations):
+    start = time.perf_counter()
+    fn(iterations)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def bare(n):
+    for _ in range(n):
+        pass
+
+
+def spans(n):
+    for _ in range(n):
+        with span("bench"):
+            pass
+
+
+@timed("bench")
+def noop():
+    pass
+
+
+def decorated(n):
+    for _ in range(n):
+        noop()
+
+
+def observes(n):
+    for _ in range(n):
+        request_latency.observe(0.003, "GET", "/bench", "200")
+
+
+def queries(instrumented):
+    engine = create_engine("sqlite://")
+    if instrumented:
+        instrument_engine(engine)
+
+    def run(n):
+        with engine.connect() as conn:
+            for _ in range(n):
+                conn.execute(text("SELECT 1"))
+    return run
+
+
+def requests(instrumented):
+    app = FastAPI()
+    app.get("/ping")(lambda: {"ok": True})
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+
+    async def drive(n):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for _ in range(n):
+                await client.get("/ping")
+    return lambda n: asyncio.run(drive(n))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=200_000)
+    args = parser.parse_args()
+    n = args.iterations
+
+    rows = [
+        ("empty loop", per_call(bare, n)),
+        ("with span()", per_call(spans, n)),
+        ("@timed call", per_call(decorated, n)),
+        ("histogram observe", per_call(observes, n)),
+        ("SELECT 1", per_call(queries(False), n // 10)),
+        ("SELECT 1, hooked", per_call(queries(True), n // 10)),
+        ("GET /ping", per_call(requests(False), n // 100)),
+        ("GET /ping, middleware", per_call(requests(True), n // 100)),
+    ]
+    print(f"{'operation':<24}{'us/call':>10}")
+    for label, micros in rows:
+        print(f"{label:<24}{micros:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
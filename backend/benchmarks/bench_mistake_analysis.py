@@ -0,0 +1,67 @@
+"""
+Benchmark: trap-feedback analysis per option vs batched.
+
+The per-option column is what create_question used to do: run the full
+pipeline on the question text once per trap option. The batched column is
+`AIService.analyze_mistakes` on a fresh service (cold cache); the last
+column repeats the batch on the same service (everything memoized).
+
+Uses SPACY_MODEL (default en_core_web_sm), falling back to a blank English
+pipeline when the model isn't installed.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_mistake_analysis
+"""
+import gc
+import time
+
+from ai_service import AIService, SPACY_MODEL, _explain_mistake
+
+SIZES = [100, 1_000, 5_000]
+TRAPS_PER_QUESTION = 3
+
+
+def triples(n: int):
+    out = []
+    for i in range(n):
+        text = f"A train travels {i % 97 + 3} km in {i % 7 + 2} hours. What is its speed in km/h?"
+        correct = str(i % 50 + 1)
+        for k in range(TRAPS_PER_QUESTION):
+            out.append((text, str((i % 50 + 1) * 10 ** (k - 1)), correct))
+    return out
+
+
+def main():
+    service = AIService()
+    if not service.warm_up():
+        service = AIService("blank:en")
+        service.warm_up()
+    model = SPACY_MODEL if service.model_name == SPACY_MODEL else "blank:en"
+    print(f"pipeline: {model} {service.nlp.pipe_names}")
+    print(f"{'questions':>10}{'options':>9}{'per-option ms':>15}{'batched ms':>12}{'cached ms':>11}")
+
+    for n in SIZES:
+        work = triples(n)
+
+        start = time.perf_counter()
+        for text, wrong, correct in work:
+            _explain_mistake(service.nlp(text), wrong, correct)
+        single = time.perf_counter() - start
+
+        batch_service = AIService(service.model_name)
+        batch_service._nlp, batch_service._nlp_loaded = service.nlp, True
+        gc.collect()
+        start = time.perf_counter()
+        batch_service.analyze_mistakes(work)
+        batched = time.perf_counter() - start
+
+        gc.collect()
+        start = time.perf_counter()
+        batch_service.analyze_mistakes(work)
+        cached = time.perf_counter() - start
+        print(f"{n:>10}{len(work):>9}{single * 1000:>15.1f}{batched * 1000:>12.1f}{cached * 1000:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark: hot-path queries with and without the migration-managed indexes.
+
+Seeds a temporary SQLite database (a million student responses by
+default), times each query with the migration's indexes dropped, then
+again once `run_migrations` has created them.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_query_indexes [--responses 1000000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import uuid
+
+from sqlalchemy import func, insert, select, text
+
+from migrations import MIGRATIONS, run_migrations
+from models import Base, Chapter, ExtractedQuestion, Question, StudentResponse, make_engine
+
+USERS = 20_000
+QUESTIONS = 20_000
+TOPICS = 50
+TEXTBOOKS = 500
+CHAPTERS_PER_BOOK = 20
+QUESTIONS_PER_CHAPTER = 10
+CHUNK = 50_000
+
+
+def seed(conn, responses):
+    rng = random.Random(1)
+    question_ids = [str(uuid.uuid4()) for _ in range(QUESTIONS)]
+    conn.execute(insert(Question.__table__), [
+        {"id": qid, "topic": f"topic-{n % TOPICS}", "text": "What is 2 + 3 x 4?", "explanation": "",
+         "options": [], "correct_option": "14", "wrong_options": ["20"], "trap_type": "Linearity Bias"}
+        for n, qid in enumerate(question_ids)
+    ])
+
+    chapter_rows = [
+        {"id": str(uuid.uuid4()), "textbook_id": f"book-{b}", "chapter_number": c, "title": f"Chapter {c}",
+         "content_summary": ""}
+        for b in range(TEXTBOOKS) for c in range(CHAPTERS_PER_BOOK)
+    ]
+    conn.execute(insert(Chapter.__table__), chapter_rows)
+    conn.execute(insert(ExtractedQuestion.__table__), [
+        {"id": str(uuid.uuid4()), "chapter_id": row["id"], "question_type": "Short", "text": "Why?",
+         "answer": "", "difficulty": "Medium"}
+        for row in chapter_rows for _ in range(QUESTIONS_PER_CHAPTER)
+    ])
+
+    for start in range(0, responses, CHUNK):
+        conn.execute(insert(StudentResponse.__table__), [
+            {"id": str(uuid.uuid4()), "user_id": f"user-{rng.randrange(USERS)}",
+             "question_id": rng.choice(question_ids), "selected_option": "o1",
+             "trap_detected": rng.random() < 0.3,
+             "timestamp": f"2026-{rng.randint(1, 9):02d}-{rng.randint(1, 28):02d}T10:00:00"}
+            for _ in range(min(CHUNK, responses - start))
+        ])
+    return question_ids, chapter_rows
+
+
+def queries(question_ids, chapter_rows):
+    return [
+        ("questions by topic",
+         select(Question.id).where(Question.topic == "topic-7")),
+        ("chapters by textbook",
+         select(Chapter.id).where(Chapter.textbook_id == "book-123")),
+        ("questions by chapter",
+         select(ExtractedQuestion.id).where(ExtractedQuestion.chapter_id == chapter_rows[777]["id"])),
+        ("user's latest answers",
+         select(StudentResponse.id).where(StudentResponse.user_id == "user-42")
+         .order_by(StudentResponse.timestamp.desc()).limit(20)),
+        ("user's answers in March",
+         select(func.count()).where(StudentResponse.user_id == "user-42",
+                                    StudentResponse.timestamp.between("2026-03-01", "2026-03-31"))),
+        ("question trap hits",
+         select(func.count()).where(StudentResponse.question_id == question_ids[5],
+                                    StudentResponse.trap_detected.is_(True))),
+    ]
+
+
+def time_query(conn, query, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(query).all()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--responses", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    index_names = [
+        index.name for table in Base.metadata.sorted_tables for index in table.indexes
+        if index.name in {"ix_questions_topic_id", "ix_chapters_textbook_id_id", "ix_extracted_questions_chapter_id_id",
+                          "ix_student_responses_timestamp", "ix_student_responses_user_id_timestamp",
+                          "ix_student_responses_question_id_timestamp"}
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            for name in index_names:
+                conn.execute(text(f"DROP INDEX {name}"))
+            start = time.perf_counter()
+            question_ids, chapter_rows = seed(conn, args.responses)
+            print(f"Seeded {args.responses} responses in {time.perf_counter() - start:.1f}s")
+
+        cases = queries(question_ids, chapter_rows)
+        with engine.connect() as conn:
+            before = [time_query(conn, query, repeat=2) for _, query in cases]
+
+        start = time.perf_counter()
+        run_migrations(engine, Base.metadata)
+        print(f"Applied {', '.join(v for v, _ in MIGRATIONS)} in {time.perf_counter() - start:.1f}s\n")
+
+        with engine.connect() as conn:
+            conn.execute(text("ANALYZE"))
+            after = [time_query(conn, query) for _, query in cases]
+        engine.dispose()
+
+    print(f"{'query':<26}{'no index ms':>13}{'indexed ms':>12}{'speedup':>10}")
+    for (label, _), b, a in zip(cases, before, after):
+        print(f"{label:<26}{b * 1000:>13.2f}{a * 1000:>12.3f}{b / a:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
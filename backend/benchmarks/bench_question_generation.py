@@ -0,0 +1,35 @@
+"""
+Benchmark: generating practice sets one question at a time vs in batches.
+
+Times `AIService.generate_question` called N times (what N requests to
+/generate-question cost in generator work alone, before any HTTP
+overhead) against a single `AIService.generate_batch(topic, N)`.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_question_generation
+"""
+import time
+
+from ai_service import ai_service
+
+SIZES = [100, 1_000, 10_000]
+
+
+def main():
+    print(f"{'topic':<8}{'questions':>11}{'one-by-one ms':>16}{'batch ms':>11}")
+    for topic in ("math", "cs"):
+        for n in SIZES:
+            start = time.perf_counter()
+            for _ in range(n):
+                ai_service.generate_question(topic)
+            single = time.perf_counter() - start
+
+            start = time.perf_counter()
+            ai_service.generate_batch(topic, n, seed=n)
+            batch = time.perf_counter() - start
+            print(f"{topic:<8}{n:>11}{single * 1000:>16.1f}{batch * 1000:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Micro-benchmark: question extraction over synthetic textbook text.
+
+Compares the original regex-based extractor with the precompiled
+single-pass scanner in `question_rules`, on books of growing size, to show
+that the scanner's time per page stays flat (linear overall).
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_question_scan
+"""
+import random
+import re
+import time
+
+from question_rules import DEFAULT_PROFILE
+
+LINES_PER_PAGE = 40
+SIZES = [100, 250, 500, 1000]
+# The legacy pattern is quadratic when there is no "?", so only small books
+# are timed for it in that case
+LEGACY_WORST_CASE_SIZES = [5, 10, 20]
+
+
+def legacy_extract(text):
+    """
+    The extractor as it was before the scanner (kept for comparison).
+    """
+    exercise_match = re.search(r"(Exercise|Questions|Assessment)\s*:?", text, re.IGNORECASE)
+    if not exercise_match:
+        return []
+    exercise_text = text[exercise_match.start():]
+    results = []
+    for q_text in re.findall(r"(\d+[\.\)]\s+.*?\?)", exercise_text, re.DOTALL):
+        q_type = "Short"
+        if "explain" in q_text.lower() or "describe" in q_text.lower():
+            q_type = "Long"
+        elif re.search(r"\([a-d]\)", q_text):
+            q_type = "MCQ"
+        results.append((q_type, re.sub(r"^\d+[\.\)]\s+", "", q_text).strip()))
+    return results
+
+
+def synthetic_text(pages, with_questions=True, seed=7):
+    """
+    A chapter body of `pages` pages whose exercise block covers the whole
+    text. Without questions it is numbered steps with no "?" at all, the
+    worst case for the lazy DOTALL pattern.
+    """
+    rng = random.Random(seed)
+    lines = ["Exercise:"]
+    for n in range(1, pages * LINES_PER_PAGE):
+        kind = rng.random()
+        if not with_questions:
+            lines.append(f"{n}. Step {n} of the derivation follows from the previous one.")
+        elif kind < 0.2:
+            lines.append(f"{n}. Explain why the value of g changes with altitude?")
+        elif kind < 0.4:
+            lines.append(f"{n}. Which is a vector (a) mass (b) speed (c) velocity (d) time?")
+        elif kind < 0.6:
+            lines.append(f"{n}. What is the SI unit of force?")
+        else:
+            lines.append("The body continues in its state of rest or uniform motion.")
+    return "\n".join(lines)
+
+
+def best_of(fn, text, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def scanner_extract(text):
+    return list(DEFAULT_PROFILE.scan_questions(text))
+
+
+def main():
+    text = synthetic_text(50)
+    assert scanner_extract(text) == legacy_extract(text), "scanner disagrees with legacy extractor"
+
+    print(f"{'case':<14}{'pages':>7}{'legacy ms':>12}{'scanner ms':>12}{'scanner us/page':>17}")
+    for with_questions, label in ((True, "questions"), (False, "no '?'")):
+        sizes = SIZES if with_questions else LEGACY_WORST_CASE_SIZES + SIZES
+        for pages in sizes:
+            text = synthetic_text(pages, with_questions)
+            if with_questions or pages in LEGACY_WORST_CASE_SIZES:
+                legacy = f"{best_of(legacy_extract, text, 1) * 1000:.1f}"
+            else:
+                legacy = "skipped"
+            scanner = best_of(scanner_extract, text)
+            print(f"{label:<14}{pages:>7}{legacy:>12}{scanner * 1000:>12.1f}{scanner / pages * 1e6:>17.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark: /questions payload size and server time per representation.
+
+Seeds a temporary SQLite database with one topic of questions (four
+options each, with trap feedback) and fetches the whole topic through the
+app in process, once per Accept / Accept-Encoding combination:
+
+- bytes on the wire;
+- a cold request (cache dropped first: query, encode and compress);
+- a warm request (the pre-encoded, compressed payload from the cache).
+
+The first row is the old encoding (json.dumps, uncompressed), timed
+directly, for reference.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_response_encoding [--questions 2000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+import uuid
+
+TMP = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP.name, 'bench.db')}"
+
+import httpx  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from models import Base, Question, engine  # noqa: E402
+from pagination import iter_keyset  # noqa: E402
+from question_cache import question_cache  # noqa: E402
+import response_codec  # noqa: E402
+
+REPEAT = 10
+FIELDS = ["id", "text", "topic", "explanation", "options"]
+
+
+def seed(questions):
+    rng = random.Random(3)
+    rows = []
+    for _ in range(questions):
+        a, b = rng.randrange(2, 50), rng.randrange(2, 50)
+        rows.append({
+            "id": str(uuid.uuid4()), "topic": "math", "text": f"What is {a} + {b} x 2?",
+            "explanation": "Concept: Order of Operations. Multiplication happens before addition.",
+            "options": [
+                {"id": "a", "text": str(a + b * 2), "isCorrect": True, "isTrap": False, "feedback": None},
+                {"id": "b", "text": str((a + b) * 2), "isCorrect": False, "isTrap": True,
+                 "feedback": "Remember PEMDAS! Multiplication happens before Addition."},
+                {"id": "c", "text": str(a * b), "isCorrect": False, "isTrap": False, "feedback": None},
+                {"id": "d", "text": str(a + b), "isCorrect": False, "isTrap": False, "feedback": None},
+            ],
+            "correct_option": str(a + b * 2), "wrong_options": [], "trap_type": "Order of Operations",
+        })
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Question.__table__), rows)
+
+
+async def legacy_body():
+    # What /questions used to send: json.dumps per row, uncompressed
+    chunks = [b"["]
+    async for row in iter_keyset(Question, FIELDS, [Question.topic == "math"]):
+        chunks.append((json.dumps(row) if len(chunks) == 1 else "," + json.dumps(row)).encode())
+    chunks.append(b"]")
+    return b"".join(chunks)
+
+
+async def timed(fn, repeat=REPEAT):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = await fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+async def run():
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        legacy, legacy_s = await timed(legacy_body)
+        print(f"{'representation':<22}{'bytes':>10}{'vs old':>8}{'cold ms':>10}{'warm ms':>10}")
+        print(f"{'old json.dumps':<22}{len(legacy):>10}{1:>7.2f}x{legacy_s * 1000:>10.1f}{'-':>10}")
+
+        for accept in (response_codec.JSON_MEDIA_TYPE, response_codec.MSGPACK_MEDIA_TYPE):
+            if accept not in response_codec.media_types():
+                continue
+            for coding in ["identity"] + response_codec.codings():
+                headers = {"Accept": accept, "Accept-Encoding": coding}
+
+                def fetch():
+                    return client.get("/questions", params={"topic": "math"}, headers=headers)
+
+                async def cold():
+                    question_cache.invalidate()
+                    return await fetch()
+
+                response, cold_s = await timed(cold)
+                _, warm_s = await timed(fetch)
+                size = response.num_bytes_downloaded
+                label = f"{accept.split('/')[1]} + {coding}"
+                print(f"{label:<22}{size:>10}{size / len(legacy):>7.2f}x{cold_s * 1000:>10.1f}{warm_s * 1000:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--questions", type=int, default=2000)
+    args = parser.parse_args()
+    seed(args.questions)
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
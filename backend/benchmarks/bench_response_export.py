@@ -0,0 +1,73 @@
+"""
+Benchmark: pulling student responses through the ORM vs the columnar export.
+
+Seeds a temporary SQLite database like bench_query_indexes, then loads
+every response with its question's topic/trap type as ORM objects, and
+writes the same rows as a date-partitioned Parquet dataset with
+`write_parquet_dataset`. Each path is timed, then run again under
+tracemalloc for its peak Python memory.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_response_export [--responses 300000]
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+TMP = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP.name, 'bench.db')}"
+
+from sqlalchemy.orm import Session  # noqa: E402
+
+from benchmarks.bench_query_indexes import seed  # noqa: E402
+from models import Base, Question, StudentResponse, engine  # noqa: E402
+from response_export import write_parquet_dataset  # noqa: E402
+
+
+def orm_pull():
+    with Session(engine) as db:
+        rows = db.query(StudentResponse, Question.topic, Question.trap_type).outerjoin(
+            Question, Question.id == StudentResponse.question_id
+        ).all()
+        return len(rows)
+
+
+def measure(fn):
+    # Timed and memory-traced separately: tracing slows the run a lot
+    start = time.perf_counter()
+    rows = fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return rows, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--responses", type=int, default=300_000)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        seed(conn, args.responses)
+
+    out_dir = os.path.join(TMP.name, "export")
+    results = [
+        ("ORM objects", measure(orm_pull)),
+        ("Parquet export", measure(lambda: write_parquet_dataset(out_dir, "date"))),
+    ]
+    size = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(out_dir) for f in files)
+
+    print(f"{'path':<16}{'rows':>9}{'seconds':>10}{'peak MB':>10}")
+    for label, (rows, elapsed, peak) in results:
+        print(f"{label:<16}{rows:>9}{elapsed:>10.2f}{peak / 1e6:>10.1f}")
+    print(f"\nParquet on disk: {size / 1e6:.1f} MB in {len(os.listdir(out_dir))} date partitions")
+
+
+if __name__ == "__main__":
+    main()
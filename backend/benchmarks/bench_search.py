@@ -0,0 +1,127 @@
+"""
+Benchmark: textbook search with LIKE scans vs the full-text index.
+
+Seeds a temporary SQLite database with textbooks whose chapters and
+questions are made of words drawn from a Zipf-like vocabulary (a few very
+common words, a long tail of rare ones), indexing them the way
+`ChapterWriter` does. Then times queries of rare, medium and common words
+both as `LIKE '%word%'` scans over chapters and questions and as ranked
+FTS5 searches returning the top 20 with snippets.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_search [--textbooks 2000]
+"""
+import argparse
+import itertools
+import os
+import random
+import tempfile
+import time
+import uuid
+
+TMP = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP.name, 'bench.db')}"
+
+from sqlalchemy import insert, or_, select  # noqa: E402
+
+from models import Base, Chapter, ExtractedQuestion, Textbook, engine  # noqa: E402
+from search import create_search_index, documents, insert_documents, search_statement  # noqa: E402
+
+CHAPTERS_PER_BOOK = 12
+QUESTIONS_PER_CHAPTER = 8
+VOCABULARY = 20_000
+SUMMARY_WORDS = 400
+REPEAT = 20
+
+
+def make_vocabulary(rng):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < VOCABULARY:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(4, 10))))
+    words = sorted(words)
+    rng.shuffle(words)
+    # Zipf: the n-th word is ~1/n as frequent as the first
+    cum_weights = list(itertools.accumulate(1 / (n + 1) for n in range(VOCABULARY)))
+    return words, cum_weights
+
+
+def seed(conn, textbooks):
+    rng = random.Random(5)
+    words, cum_weights = make_vocabulary(rng)
+    book_ids = []
+    for b in range(textbooks):
+        book_id = str(uuid.uuid4())
+        book_ids.append(book_id)
+        conn.execute(insert(Textbook.__table__), {"id": book_id, "title": f"Book {b}", "subject": "Science",
+                                                  "grade": "8", "board": "CBSE", "filename": f"book-{b}.pdf"})
+        chapters, questions = [], []
+        for c in range(1, CHAPTERS_PER_BOOK + 1):
+            chapter_id = str(uuid.uuid4())
+            chapters.append({"id": chapter_id, "textbook_id": book_id, "chapter_number": c,
+                             "title": f"Chapter {c} " + " ".join(rng.choices(words, cum_weights=cum_weights, k=3)),
+                             "content_summary": " ".join(rng.choices(words, cum_weights=cum_weights, k=SUMMARY_WORDS))})
+            questions += [
+                {"id": str(uuid.uuid4()), "chapter_id": chapter_id, "question_type": "Short",
+                 "text": "Explain " + " ".join(rng.choices(words, cum_weights=cum_weights, k=12)) + "?",
+                 "answer": "", "difficulty": "Medium"}
+                for _ in range(QUESTIONS_PER_CHAPTER)
+            ]
+        conn.execute(insert(Chapter.__table__), chapters)
+        conn.execute(insert(ExtractedQuestion.__table__), questions)
+        insert_documents(conn, documents(chapters, questions))
+    # Common (rank 3), medium (rank 300) and rare (rank 15000) words, and
+    # the common one within the oldest book
+    return [("common", words[3], None), ("medium", words[300], None), ("rare", words[15000], None),
+            ("common, 1 book", words[3], book_ids[0])]
+
+
+def like_search(conn, word, book_id):
+    pattern = f"%{word}%"
+    in_book = [Chapter.textbook_id == book_id] if book_id else []
+    chapters = conn.execute(select(Chapter.id).where(
+        or_(Chapter.title.like(pattern), Chapter.content_summary.like(pattern)), *in_book
+    )).all()
+    questions = conn.execute(select(ExtractedQuestion.id).join(Chapter, Chapter.id == ExtractedQuestion.chapter_id)
+                             .where(ExtractedQuestion.text.like(pattern), *in_book)).all()
+    return len(chapters) + len(questions)
+
+
+def fts_search(conn, word, book_id):
+    statement, params = search_statement("sqlite", word, textbook_id=book_id, limit=20)
+    return len(conn.execute(statement, params).all())
+
+
+def time_query(fn, conn, word, book_id):
+    fn(conn, word, book_id) # Warm the page cache
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        hits = fn(conn, word, book_id)
+    return hits, (time.perf_counter() - start) / REPEAT * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--textbooks", type=int, default=2000)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        create_search_index(conn)
+        terms = seed(conn, args.textbooks)
+    chapters = args.textbooks * CHAPTERS_PER_BOOK
+    print(f"Seeded and indexed {args.textbooks} textbooks ({chapters} chapters, "
+          f"{chapters * QUESTIONS_PER_CHAPTER} questions) in {time.perf_counter() - start:.1f}s\n")
+
+    print(f"{'query':<16}{'LIKE hits':>10}{'LIKE ms':>10}{'FTS top':>9}{'FTS ms':>9}{'speedup':>9}")
+    with engine.connect() as conn:
+        for label, word, book_id in terms:
+            like_hits, like_ms = time_query(like_search, conn, word, book_id)
+            fts_hits, fts_ms = time_query(fts_search, conn, word, book_id)
+            print(f"{label:<16}{like_hits:>10}{like_ms:>10.1f}{fts_hits:>9}{fts_ms:>9.2f}{like_ms / fts_ms:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Benchmark: backend cold start with lazy vs eager spaCy loading.
+
+Each run is a fresh interpreter timing `import main` (everything a uvicorn
+worker does before it can serve), against a throwaway SQLite database.
+`lazy` is the default; `import` is NLP_WARM_UP=import, which loads the
+model up front the way every worker used to. The first `analyze_mistake`
+call is timed too, since with lazy loading that is where the cost moves.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_startup
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RUNS = 5
+
+PROBE = """
+import time
+start = time.perf_counter()
+import main
+imported = time.perf_counter() - start
+start = time.perf_counter()
+main.ai_service.analyze_mistake("What is 2 + 3 x 4?", "20", "14")
+print(imported, time.perf_counter() - start, main.ai_service.nlp is not None)
+"""
+
+
+def run(mode: str, workdir: str):
+    env = dict(os.environ, NLP_WARM_UP=mode, DATABASE_URL=f"sqlite:///{workdir}/bench.db")
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env["PYTHONPATH"] = backend + os.pathsep + env.get("PYTHONPATH", "")
+    out = subprocess.run([sys.executable, "-c", PROBE], env=env, cwd=workdir,
+                         capture_output=True, text=True, check=True).stdout.split()
+    return float(out[0]), float(out[1]), out[2] == "True"
+
+
+def main():
+    print(f"{'NLP_WARM_UP':<13}{'import main ms':>16}{'first analysis ms':>19}{'model':>8}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode in ("lazy", "import"):
+            results = [run(mode, workdir) for _ in range(RUNS)]
+            imported = statistics.median(r[0] for r in results)
+            first = statistics.median(r[1] for r in results)
+            model = "yes" if results[0][2] else "no"
+            print(f"{mode:<13}{imported * 1000:>16.1f}{first * 1000:>19.1f}{model:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Tiny PDF writer for benchmarks: text-only pages in Helvetica, enough for
+pdfplumber to extract line by line. No external dependencies.
+"""
+import random
+from typing import List, Optional
+
+
+def _escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages: List[List[str]]) -> bytes:
+    """
+    A PDF with one page per entry of `pages`, each a list of text lines.
+    """
+    objects: List[bytes] = [b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>", b""]
+    font_id, pages_id = 1, 2
+    kids = []
+    for lines in pages:
+        stream = ("BT /F1 10 Tf 14 TL 40 800 Td " + " ".join(f"({_escape(line)}) '" for line in lines) + " ET").encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+                       % (pages_id, font_id, len(objects)))
+        kids.append(len(objects))
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), len(kids)
+    )
+    objects.append(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, len(objects), xref)
+    return bytes(out)
+
+
+def textbook_pages(chapters: int = 5, pages_per_chapter: int = 4, seed: Optional[int] = None) -> List[List[str]]:
+    """
+    Pages of a made-up textbook: chapter headings, filler text and an
+    exercise block of numbered questions at the end of each chapter.
+    `seed` varies the wording, so different seeds give different files.
+    """
+    rng = random.Random(seed)
+    pages = [["Preface", f"Edition {rng.randrange(1, 1000)}"]]
+    for c in range(1, chapters + 1):
+        for p in range(pages_per_chapter):
+            lines = [f"Chapter {c} Topic {rng.randrange(1000)}"] if p == 0 else []
+            lines += [f"Body text {rng.randrange(10 ** 6)} for chapter {c}, line {i}." for i in range(30)]
+            if p == pages_per_chapter - 1:
+                lines += ["Exercise:"] + [
+                    f"{q}. " + rng.choice(["What is the value of x?", "Explain why the sky is blue?",
+                                           "Which is larger (a) 2 (b) 3?"])
+                    for q in range(1, 9)
+                ]
+            pages.append(lines)
+    return pages
@@ -0,0 +1,305 @@
+import logging
+import multiprocessing
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import or_, and_, exists, update
+from sqlalchemy.orm import aliased
+from sqlalchemy.orm import Session
+import metrics
+from models import SessionLocal, IngestionJob, engine
+from textbook_processor import textbook_processor
+from textbook_store import textbook_store
+
+logger = logging.getLogger(__name__)
+
+# Worker pool settings (override via environment)
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "2"))
+INGEST_POLL_INTERVAL = float(os.environ.get("INGEST_POLL_INTERVAL", "1.0"))
+# A "running" job whose lease hasn't been renewed for this long is assumed
+# dead (crash / restart) and is picked up again from its checkpoint. Workers
+# renew their lease every third of this, independently of page progress.
+INGEST_LEASE_SECONDS = int(os.environ.get("INGEST_LEASE_SECONDS", "60"))
+# Longest wait between retries after a worker hits a database error
+INGEST_MAX_BACKOFF_SECONDS = float(os.environ.get("INGEST_MAX_BACKOFF_SECONDS", "30"))
+
+jobs_table = IngestionJob.__table__
+
+
+class LeaseLost(Exception):
+    """
+    The job was claimed by another worker after this worker's lease ran out.
+    """
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+
+def _claim_next_job(db: Session, lease_seconds: int) -> Optional[IngestionJob]:
+    """
+    Atomically moves the oldest runnable job to "running" under a fresh
+    `lease_owner` token and returns it.
+    """
+    stale_before = (datetime.utcnow() - timedelta(seconds=lease_seconds)).isoformat()
+    source = aliased(IngestionJob)
+    source_finished = exists().where(source.textbook_id == IngestionJob.clone_from,
+                                     source.status.in_(("done", "failed")))
+    runnable = or_(
+        IngestionJob.status == "queued",
+        and_(IngestionJob.status == "waiting", source_finished),
+        and_(IngestionJob.status == "running", IngestionJob.updated_at < stale_before),
+    )
+
+    candidates = db.query(IngestionJob.id).filter(runnable).order_by(IngestionJob.created_at).limit(5).all()
+    for (job_id,) in candidates:
+        # Conditional UPDATE: only one worker can win the row
+        claimed = db.query(IngestionJob).filter(IngestionJob.id == job_id, runnable).update(
+            {"status": "running", "lease_owner": str(uuid.uuid4()), "updated_at": _now()},
+            synchronize_session=False
+        )
+        db.commit()
+        if claimed:
+            return db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+    return None
+
+
+def _update_leased(db: Session, job_id: str, owner: str, **values):
+    """
+    Updates the job only while `owner` still holds its lease; raises
+    LeaseLost (leaving the transaction to be rolled back) otherwise.
+    """
+    result = db.execute(
+        update(jobs_table)
+        .where(jobs_table.c.id == job_id, jobs_table.c.lease_owner == owner, jobs_table.c.status == "running")
+        .values(updated_at=_now(), **values)
+    )
+    if result.rowcount != 1:
+        raise LeaseLost(job_id)
+
+
+class LeaseHeartbeat:
+    """
+    Renews a claimed job's lease from a background thread, on its own
+    connection, so a worker busy on one slow page (or a whole extraction
+    shard) doesn't look dead.
+    """
+    def __init__(self, job_id: str, owner: str, interval: float):
+        self.job_id = job_id
+        self.owner = owner
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"lease-{job_id}", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            db = SessionLocal()
+            try:
+                _update_leased(db, self.job_id, self.owner)
+                db.commit()
+            except LeaseLost:
+                # The batch commits check the lease too and will stop the job
+                db.rollback()
+                return
+            except Exception:
+                db.rollback()
+                logger.exception("Renewing the lease on ingestion job %s failed", self.job_id)
+            finally:
+                db.close()
+
+
+def _parse_done(textbook_id: str, db: Session) -> bool:
+    return db.query(IngestionJob.id).filter(
+        IngestionJob.textbook_id == textbook_id, IngestionJob.status == "done"
+    ).first() is not None
+
+
+def _run_job(job: IngestionJob, db: Session, lease_seconds: int = INGEST_LEASE_SECONDS):
+    """
+    Parses the job's PDF, checkpointing alongside every batch commit.
+
+    Every write about the job is conditional on its `lease_owner`, in the
+    same transaction as the data it describes: once another worker has taken
+    the job over, this one's next batch is rolled back and it stops. A job
+    that waited on a parse of identical bytes copies that parse instead,
+    unless it failed.
+    """
+    job_id, owner = job.id, job.lease_owner
+
+    def on_page(pages_done: int, total_pages: int):
+        _update_leased(db, job_id, owner, pages_done=pages_done, total_pages=total_pages)
+        db.commit()
+
+    def on_commit(page: int, line: int):
+        # Not committed here: it rides along with the batch's own commit,
+        # so the checkpoint can never get ahead of (or behind) the data.
+        _update_leased(db, job_id, owner, resume_page=page, resume_line=line)
+
+    try:
+        with LeaseHeartbeat(job_id, owner, max(lease_seconds / 3, 0.1)):
+            try:
+                if job.clone_from and _parse_done(job.clone_from, db):
+                    # Identical bytes were parsed meanwhile: the copy commits
+                    # together with the status below
+                    textbook_store.copy_parse(job.clone_from, job.textbook_id, db)
+                else:
+                    textbook_processor.process_pdf(
+                        job.file_path, job.textbook_id, db,
+                        start_page=job.resume_page or 0, start_line=job.resume_line or 0,
+                        on_page=on_page, on_commit=on_commit
+                    )
+                status, error = "done", None
+            except LeaseLost:
+                raise
+            except Exception as e:
+                db.rollback()
+                status, error = "failed", str(e)
+            _update_leased(db, job_id, owner, status=status, error=error)
+            db.commit()
+    except LeaseLost:
+        db.rollback()
+        logger.warning("Lost the lease on ingestion job %s to another worker; stopping", job_id)
+
+
+def _worker_loop(stop_event, poll_interval: float, lease_seconds: int, num_workers: int = INGEST_WORKERS):
+    # Connections inherited from the parent must not be reused in the child
+    engine.dispose(close=False)
+    metrics.reset()
+    # Each of the pool's jobs gets its share of the CPUs for page extraction
+    textbook_processor.share_cpus(num_workers)
+
+    failures = 0 # Consecutive
+    while not stop_event.is_set():
+        job = None
+        db = SessionLocal()
+        try:
+            job = _claim_next_job(db, lease_seconds)
+            if job:
+                _run_job(job, db, lease_seconds)
+            failures = 0
+        except Exception:
+            # e.g. "database is locked" while claiming or writing the final
+            # status; a job left running is reclaimed once its lease expires
+            failures += 1
+            logger.exception("Ingestion worker iteration failed (%d in a row); retrying", failures)
+        finally:
+            db.close()
+        if failures:
+            stop_event.wait(min(poll_interval * 2 ** failures, INGEST_MAX_BACKOFF_SECONDS))
+        elif job:
+            # Picked up by /metrics in the API process
+            metrics.dump_process_metrics()
+        else:
+            stop_event.wait(poll_interval)
+
+
+class IngestionQueue:
+    """
+    Persistent textbook ingestion queue backed by the `ingestion_jobs` table.
+
+    Uploads are enqueued and return immediately; a pool of worker processes
+    claims jobs and runs `TextbookProcessor.process_pdf`. Jobs left behind by
+    a crashed or restarted worker are resumed from their last checkpoint,
+    and a supervisor thread replaces workers that exit unexpectedly.
+    """
+    def __init__(self, num_workers: int = INGEST_WORKERS,
+                 poll_interval: float = INGEST_POLL_INTERVAL,
+                 lease_seconds: int = INGEST_LEASE_SECONDS):
+        self.num_workers = num_workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self._workers: List[multiprocessing.Process] = []
+        self._stop_event = None
+        self._ctx = None
+        self._supervisor: Optional[threading.Thread] = None
+        self.restarts = 0
+
+    def enqueue(self, textbook_id: str, file_path: str, db: Session,
+                clone_from: Optional[str] = None) -> IngestionJob:
+        """
+        Queues a parse of `file_path` for the textbook. With `clone_from`,
+        the job waits until that book's parse of the same bytes finishes.
+        """
+        now = _now()
+        job = IngestionJob(
+            id=str(uuid.uuid4()),
+            textbook_id=textbook_id,
+            file_path=file_path,
+            status="waiting" if clone_from else "queued",
+            clone_from=clone_from,
+            total_pages=0,
+            pages_done=0,
+            resume_page=0,
+            resume_line=0,
+            created_at=now,
+            updated_at=now
+        )
+        db.add(job)
+        db.commit()
+        return job
+
+    def get_job(self, job_id: str, db: Session) -> Optional[IngestionJob]:
+        return db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+
+    def job_for_book(self, textbook_id: str, db: Session) -> Optional[IngestionJob]:
+        return db.query(IngestionJob).filter(IngestionJob.textbook_id == textbook_id).first()
+
+    def start(self):
+        if self._workers:
+            return
+        # Prefer fork so workers don't re-import the API module (and its models)
+        methods = multiprocessing.get_all_start_methods()
+        self._ctx = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        self._stop_event = self._ctx.Event()
+        self._workers = [self._spawn(i) for i in range(self.num_workers)]
+        self._supervisor = threading.Thread(target=self._supervise, name="ingest-supervisor", daemon=True)
+        self._supervisor.start()
+
+    def _spawn(self, i: int) -> multiprocessing.Process:
+        worker = self._ctx.Process(
+            target=_worker_loop,
+            args=(self._stop_event, self.poll_interval, self.lease_seconds, self.num_workers),
+            name=f"ingest-worker-{i}"
+        )
+        worker.start()
+        return worker
+
+    def _supervise(self):
+        while not self._stop_event.wait(self.poll_interval):
+            for i, worker in enumerate(self._workers):
+                if not worker.is_alive() and not self._stop_event.is_set():
+                    logger.error("Ingestion worker %s exited with code %s; restarting it", worker.name, worker.exitcode)
+                    worker.join()
+                    self._workers[i] = self._spawn(i)
+                    self.restarts += 1
+
+    def stop(self, timeout: float = 10.0):
+        """
+        Signals workers to exit after their current job. Workers still busy
+        after `timeout` are terminated; their jobs resume on next start.
+        """
+        if self._stop_event:
+            self._stop_event.set()
+        if self._supervisor:
+            # Joined first, so it can't replace a worker that is shutting down
+            self._supervisor.join()
+            self._supervisor = None
+        for worker in self._workers:
+            worker.join(timeout)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+        self._workers = []
+        self._stop_event = None
+
+ingestion_queue = IngestionQueue()
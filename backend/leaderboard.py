@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import os
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import select
+from models import User, engine
+
+logger = logging.getLogger(__name__)
+
+# Users per sorted bucket; buckets split at twice this
+LEADERBOARD_BUCKET_SIZE = int(os.environ.get("LEADERBOARD_BUCKET_SIZE", "1000"))
+# Re-read the users table this often, to pick up XP earned through other
+# API processes (0 = only at startup)
+LEADERBOARD_REFRESH_SECONDS = float(os.environ.get("LEADERBOARD_REFRESH_SECONDS", "300"))
+
+# (-xp, user_id): ascending order is best first, ties broken by id
+Key = Tuple[int, str]
+
+
+class RankedIndex:
+    """
+    Sorted multiset of keys with O(log n) insert, remove and rank.
+
+    Keys live in sorted buckets of roughly `bucket_size`; `_maxes` holds the
+    last key of each bucket for bisecting to the right one, and a Fenwick
+    tree over bucket lengths turns (bucket, offset) into an overall rank.
+    Only a split or an emptied bucket rebuilds the tree, O(buckets).
+    """
+    def __init__(self, keys: Iterable[Key] = (), bucket_size: int = LEADERBOARD_BUCKET_SIZE):
+        self.bucket_size = bucket_size
+        keys = sorted(keys)
+        self._buckets: List[List[Key]] = [keys[i:i + bucket_size] for i in range(0, len(keys), bucket_size)]
+        self._len = len(keys)
+        self._reindex()
+
+    def __len__(self) -> int:
+        return self._len
+
+    def add(self, key: Key):
+        if not self._buckets:
+            self._buckets.append([key])
+            self._len = 1
+            self._reindex()
+            return
+        i = min(bisect_left(self._maxes, key), len(self._buckets) - 1)
+        bucket = self._buckets[i]
+        insort(bucket, key)
+        self._len += 1
+        if len(bucket) > 2 * self.bucket_size:
+            self._buckets[i:i + 1] = [bucket[:self.bucket_size], bucket[self.bucket_size:]]
+            self._reindex()
+        else:
+            self._maxes[i] = bucket[-1]
+            self._bump(i, 1)
+
+    def remove(self, key: Key):
+        i = bisect_left(self._maxes, key)
+        bucket = self._buckets[i]
+        del bucket[bisect_left(bucket, key)]
+        self._len -= 1
+        if not bucket:
+            del self._buckets[i]
+            self._reindex()
+        else:
+            self._maxes[i] = bucket[-1]
+            self._bump(i, -1)
+
+    def rank(self, key: Key) -> int:
+        """
+        0-based position of `key` (which must be present).
+        """
+        i = bisect_left(self._maxes, key)
+        return self._prefix(i) + bisect_left(self._buckets[i], key)
+
+    def first(self, k: int) -> List[Key]:
+        out: List[Key] = []
+        for bucket in self._buckets:
+            if len(out) >= k:
+                break
+            out.extend(bucket[:k - len(out)])
+        return out
+
+    def _reindex(self):
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        # Fenwick tree (1-based) over bucket lengths
+        n = len(self._buckets)
+        tree = [0] * (n + 1)
+        for i, bucket in enumerate(self._buckets, 1):
+            tree[i] += len(bucket)
+            parent = i + (i & -i)
+            if parent <= n:
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _bump(self, i: int, delta: int):
+        i += 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, i: int) -> int:
+        # Total length of buckets [0, i)
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+
+class Leaderboard:
+    """
+    XP ranking served from memory.
+
+    Built from the `users` table when the API starts (in the background)
+    and kept current by `update()` from /submit-answer. XP never goes
+    down, so merging with a fresh read of the table is just a max, which
+    is how XP earned through other API processes is picked up every
+    `refresh_seconds`.
+    """
+    def __init__(self, bucket_size: int = LEADERBOARD_BUCKET_SIZE,
+                 refresh_seconds: float = LEADERBOARD_REFRESH_SECONDS):
+        self.bucket_size = bucket_size
+        self.refresh_seconds = refresh_seconds
+        self.ready = False
+
+        self._lock = threading.Lock()
+        self._xp: Dict[str, int] = {}
+        self._index = RankedIndex(bucket_size=bucket_size)
+        # XP reported since the last rebuild started; the table may not have
+        # it yet (write-behind), so it's replayed over the next rebuild
+        self._recent: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def update(self, user_id: str, xp: int):
+        with self._lock:
+            self._recent[user_id] = max(xp, self._recent.get(user_id, xp))
+            self._set(user_id, xp)
+
+    def top(self, k: int) -> List[Tuple[str, int]]:
+        with self._lock:
+            return [(user_id, -neg_xp) for neg_xp, user_id in self._index.first(k)]
+
+    def rank(self, user_id: str) -> Optional[int]:
+        """
+        1-based position of the user, or None if they aren't ranked.
+        """
+        with self._lock:
+            xp = self._xp.get(user_id)
+            return None if xp is None else self._index.rank((-xp, user_id)) + 1
+
+    def rebuild(self, rows: Optional[Iterable[Tuple[str, int]]] = None):
+        """
+        Reloads (user_id, xp) from `rows`, or the users table by default.
+        Updates arriving meanwhile keep being served and are merged in.
+        """
+        with self._lock:
+            carried, self._recent = self._recent, {}
+        try:
+            if rows is None:
+                with engine.connect() as conn:
+                    rows = conn.execute(select(User.id, User.xp)).all()
+            xp = {user_id: user_xp or 0 for user_id, user_xp in rows}
+            index = RankedIndex(((-v, k) for k, v in xp.items()), self.bucket_size)
+        except Exception:
+            with self._lock:
+                for user_id, user_xp in carried.items():
+                    self._recent[user_id] = max(user_xp, self._recent.get(user_id, user_xp))
+            raise
+
+        with self._lock:
+            self._xp, self._index = xp, index
+            for user_id, user_xp in carried.items():
+                self._set(user_id, user_xp)
+            for user_id, user_xp in self._recent.items():
+                self._set(user_id, user_xp)
+            self.ready = True
+
+    def _set(self, user_id: str, xp: int):
+        current = self._xp.get(user_id)
+        if current is not None:
+            if xp <= current:
+                return
+            self._index.remove((-current, user_id))
+        self._xp[user_id] = xp
+        self._index.add((-xp, user_id))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.rebuild)
+            except Exception:
+                logger.exception("Rebuilding the leaderboard failed; will retry")
+            else:
+                if self.refresh_seconds <= 0:
+                    return
+            await asyncio.sleep(self.refresh_seconds if self.refresh_seconds > 0 else 5)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+leaderboard = Leaderboard()
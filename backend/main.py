@@ -1,15 +1,69 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Header, UploadFile, File, Form
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
+from contextlib import asynccontextmanager
+import asyncio
+import gc
+import os
 import uuid
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from models import SessionLocal, Question as DBQuestion, User, init_db
-import models
+from models import SessionLocal, AsyncSessionLocal, engine, async_engine, Question as DBQuestion, User, init_db
 from ai_service import ai_service
+from ingestion_queue import ingestion_queue
+from answer_buffer import AnswerBufferFull, answer_buffer, level_for_xp
+from answer_stats import get_question_stats, get_user_stats
+from leaderboard import leaderboard
+from metrics import (MetricsMiddleware, close_metrics_dir, instrument_engine, open_metrics_dir, profiler,
+                     render_prometheus)
+from search import SEARCH_KINDS, search
+from response_export import ARROW_STREAM_MEDIA_TYPE, arrow_stream, pyarrow_available
+from pagination import check_limit, iter_keyset, keyset_response, parse_fields
+from question_cache import question_cache
+import response_codec
+from question_import import import_format, import_questions, iter_records
 from datetime import datetime
 
-app = FastAPI(title="AI Learn Traps API")
+# When to load the spaCy model:
+#   lazy    - on the first request that needs it (default, fastest startup)
+#   startup - in the background as each worker starts serving
+#   import  - right here, at import time. Use with `gunicorn --preload` so the
+#             model is loaded once in the master and forked workers share its
+#             pages copy-on-write instead of each loading their own copy.
+NLP_WARM_UP = os.environ.get("NLP_WARM_UP", "lazy")
+
+if NLP_WARM_UP == "import":
+    ai_service.warm_up()
+    # Keep the GC from touching (and so un-sharing) the preloaded objects
+    gc.freeze()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if NLP_WARM_UP == "startup":
+        asyncio.get_running_loop().run_in_executor(None, ai_service.warm_up)
+    profiler.start()
+    # Where the ingestion workers leave their metrics for /metrics
+    open_metrics_dir()
+    # Textbook ingestion workers run outside the request path
+    ingestion_queue.start()
+    answer_buffer.start()
+    leaderboard.start()
+    yield
+    await leaderboard.stop()
+    await answer_buffer.stop()
+    ingestion_queue.stop()
+    close_metrics_dir()
+    await async_engine.dispose()
+    profiler.stop()
+
+app = FastAPI(title="AI Learn Traps API", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
 
 # Initialize DB
 init_db()
@@ -42,29 +96,68 @@ def get_db():
     finally:
         db.close()
 
+# Async dependency for the hot read/write endpoints: no threadpool slot per request
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to AI Learn Traps API"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/profile", response_class=PlainTextResponse)
+def get_profile():
+    # Folded stacks: feed to flamegraph.pl or drop into speedscope.app
+    if not profiler.enabled:
+        raise HTTPException(status_code=404, detail="Profiler is off; set PROFILE_SAMPLE_HZ to enable it")
+    return PlainTextResponse(profiler.folded())
+
+QUESTION_FIELDS = list(QuestionModel.model_fields)
+
 @app.get("/questions", response_model=List[QuestionModel])
-def get_questions(topic: Optional[str] = None, db: Session = Depends(get_db)):
-    query = db.query(DBQuestion)
-    if topic:
-        query = query.filter(DBQuestion.topic == topic)
-    return query.all()
+async def get_questions(topic: Optional[str] = None, limit: Optional[int] = None, after: Optional[str] = None,
+                        fields: Optional[str] = None, accept: Optional[str] = Header(None),
+                        accept_encoding: Optional[str] = Header(None)):
+    # JSON or MessagePack, gzip/brotli compressed if the client accepts it;
+    # each representation is cached already encoded and compressed
+    selected = parse_fields(fields, QUESTION_FIELDS)
+    topic = topic or None
+    media_type = response_codec.negotiate_media_type(accept)
+    coding = response_codec.negotiate_coding(accept_encoding)
+    headers = response_codec.headers(coding)
+    cache_key = (topic, tuple(selected), after, limit, media_type, coding)
+    payload = question_cache.get(cache_key)
+    if payload is not None:
+        return Response(payload, media_type=media_type, headers=headers)
+    
+    # Stored options already have the Option shape, so rows stream out as-is
+    filters = [DBQuestion.topic == topic] if topic else []
+    rows = iter_keyset(DBQuestion, selected, filters, after, check_limit(limit))
+    body = response_codec.encode_rows(rows, media_type, coding)
+    return StreamingResponse(question_cache.fill(cache_key, topic, body), media_type=media_type, headers=headers)
+
+@app.get("/questions/cache-stats")
+def get_question_cache_stats():
+    return question_cache.stats()
 
 @app.post("/questions")
 def create_question(q: QuestionModel, db: Session = Depends(get_db)):
     if not q.id:
         q.id = str(uuid.uuid4())
     
-    # Auto-generate trap feedback if missing using AI
-    for opt in q.options:
-        if opt.isTrap and not opt.feedback:
-            opt.feedback = ai_service.analyze_mistake(q.text, opt.text, [o.text for o in q.options if o.isCorrect][0])
-
     # Calculate fields for new schema
     correct_opt = next((o.text for o in q.options if o.isCorrect), "")
+
+    # Auto-generate trap feedback if missing using AI (one batched pass)
+    traps = [opt for opt in q.options if opt.isTrap and not opt.feedback]
+    if traps:
+        analyses = ai_service.analyze_mistakes((q.text, opt.text, correct_opt) for opt in traps)
+        for opt, feedback in zip(traps, analyses):
+            opt.feedback = feedback
     wrong_opts = [o.text for o in q.options if not o.isCorrect]
 
     db_q = DBQuestion(
@@ -79,8 +172,23 @@ def create_question(q: QuestionModel, db: Session = Depends(get_db)):
     )
     db.add(db_q)
     db.commit()
+    question_cache.invalidate(q.topic)
     return {"status": "created", "id": q.id}
 
+@app.post("/questions/bulk")
+def import_question_bank(file: UploadFile = File(...), format: Optional[str] = None,
+                         db: Session = Depends(get_db)):
+    """
+    Imports a question bank: NDJSON (one QuestionModel per line) or CSV
+    (id,text,topic,explanation,options with options as JSON). Valid rows
+    are stored in chunked transactions; the rest are reported by line.
+    """
+    fmt = import_format(file.filename, format)
+    if not fmt:
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+    report = import_questions(iter_records(file.file, fmt), db, QuestionModel)
+    return report.as_dict()
+
 class AnswerInput(BaseModel):
     user_id: str
     question_id: str
@@ -89,50 +197,92 @@ class AnswerInput(BaseModel):
     is_trap: bool
 
 @app.post("/submit-answer")
-def submit_answer(data: AnswerInput, db: Session = Depends(get_db)):
-    # 1. Update/Create User
-    user = db.query(User).filter(User.id == data.user_id).first()
-    if not user:
-        user = User(id=data.user_id, name="Student", xp=0, level=1)
-        db.add(user)
-    
-    # 2. Record Response
-    response = models.StudentResponse(
-        id=str(uuid.uuid4()),
-        user_id=data.user_id,
-        question_id=data.question_id,
-        selected_option=data.selected_option_id,
-        trap_detected=data.is_trap,
-        timestamp=datetime.utcnow().isoformat()
-    )
-    db.add(response)
+async def submit_answer(data: AnswerInput, db: AsyncSession = Depends(get_async_db)):
+    # 1. Record Response (written behind, in batches)
+    response = {
+        "id": str(uuid.uuid4()),
+        "user_id": data.user_id,
+        "question_id": data.question_id,
+        "selected_option": data.selected_option_id,
+        "trap_detected": data.is_trap,
+        "timestamp": datetime.utcnow().isoformat()
+    }
     
-    # 3. Update Stats (Simple Gamification)
-    if data.is_correct:
-        user.xp += 10
-        # Simple Level Formula: Level = (XP / 100) + 1
-        user.level = int((user.xp / 100) + 1)
-        
-    db.commit()
-    return {"status": "recorded", "current_xp": user.xp, "level": user.level}
+    # 2. Update Stats (Simple Gamification); unknown users are created on flush
+    xp_gain = 10 if data.is_correct else 0
+    try:
+        xp, level = await answer_buffer.record(db, data.user_id, response, xp_gain, data.is_correct)
+    except AnswerBufferFull:
+        # The database is falling behind (or down); the client retries the answer
+        raise HTTPException(status_code=503, detail="Too many answers waiting to be saved",
+                            headers={"Retry-After": "1"})
+    leaderboard.update(data.user_id, xp)
+    return {"status": "recorded", "current_xp": xp, "level": level}
 
 @app.get("/user-stats/{user_id}")
-def get_stats(user_id: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        return {"xp": 0, "level": 1, "traps_avoided": 0}
+async def get_stats(user_id: str, db: AsyncSession = Depends(get_async_db)):
+    user = (await db.execute(select(User).where(User.id == user_id))).scalars().first()
+    # Answers still in the write-behind buffer aren't in the users table yet
+    buffered_xp = answer_buffer.current_xp(user_id)
         
-    # Count traps avoided (Questions answered correctly where a trap existed?) 
-    # Or simple definition: Questions answered correctly.
-    # Let's define "Traps Avoided" as correct answers on questions that HAD a trap option.
-    # For simplicity, just return total correct.
+    # "Traps Avoided" = correct answers on questions that HAD a trap option.
+    # Counters come from the materialized stats tables (they trail the
+    # write-behind buffer by at most one flush); an unknown user gets the
+    # same keys, all zero.
+    stats = await get_user_stats(db, user_id)
     
+    xp = buffered_xp if buffered_xp is not None else user.xp if user else 0
     return {
-        "xp": user.xp, 
-        "level": user.level,
-        "name": user.name
+        "xp": xp, 
+        "level": level_for_xp(xp),
+        "name": user.name if user else "Student",
+        **stats
     }
 
+MAX_LEADERBOARD_LIMIT = int(os.environ.get("MAX_LEADERBOARD_LIMIT", "100"))
+
+def _require_leaderboard():
+    if not leaderboard.ready:
+        raise HTTPException(status_code=503, detail="Leaderboard is still loading")
+
+@app.get("/leaderboard")
+async def get_leaderboard(limit: int = 10, db: AsyncSession = Depends(get_async_db)):
+    if not 1 <= limit <= MAX_LEADERBOARD_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_LEADERBOARD_LIMIT}")
+    _require_leaderboard()
+    top = leaderboard.top(limit)
+    names = dict((await db.execute(select(User.id, User.name).where(User.id.in_([u for u, _ in top])))).all())
+    return [
+        {"rank": rank, "user_id": user_id, "name": names.get(user_id) or "Student", "xp": xp, "level": level_for_xp(xp)}
+        for rank, (user_id, xp) in enumerate(top, 1)
+    ]
+
+@app.get("/leaderboard/{user_id}")
+async def get_leaderboard_rank(user_id: str):
+    _require_leaderboard()
+    rank = leaderboard.rank(user_id)
+    if rank is None:
+        raise HTTPException(status_code=404, detail="User not ranked")
+    return {"user_id": user_id, "rank": rank, "total": len(leaderboard)}
+
+@app.get("/question-stats/{question_id}")
+async def get_question_stats_endpoint(question_id: str, db: AsyncSession = Depends(get_async_db)):
+    stats = await get_question_stats(db, question_id)
+    if stats is None:
+        return {"answered": 0, "correct": 0, "trap_hits": 0, "trap_hit_rate": 0.0}
+    return stats
+
+@app.get("/exports/student-responses")
+def export_student_responses(since: Optional[str] = None, until: Optional[str] = None):
+    """
+    Streams responses, with their question's topic and trap type, as an
+    Arrow IPC stream (read it with `pyarrow.ipc.open_stream`). `since` /
+    `until` bound the timestamp.
+    """
+    if not pyarrow_available():
+        raise HTTPException(status_code=501, detail="Exports need pyarrow installed")
+    return StreamingResponse(arrow_stream(since, until), media_type=ARROW_STREAM_MEDIA_TYPE)
+
 @app.get("/generate-question/{topic}")
 def generate_question_endpoint(topic: str):
     try:
@@ -141,13 +291,27 @@ def generate_question_endpoint(topic: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+MAX_GENERATED_BATCH = int(os.environ.get("MAX_GENERATED_BATCH", "10000"))
+
+@app.get("/generate-questions/{topic}")
+def generate_questions_endpoint(topic: str, count: int = 10, seed: Optional[int] = None,
+                                accept: Optional[str] = Header(None), accept_encoding: Optional[str] = Header(None)):
+    # Same `seed` -> same quiz, so a class can share a reproducible practice set
+    if not 1 <= count <= MAX_GENERATED_BATCH:
+        raise HTTPException(status_code=400, detail=f"count must be between 1 and {MAX_GENERATED_BATCH}")
+    try:
+        questions = ai_service.generate_batch(topic, count, seed)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    # Plain dicts: skip the per-item jsonable_encoder walk
+    media_type = response_codec.negotiate_media_type(accept)
+    body, coding = response_codec.encode_list(questions, media_type, response_codec.negotiate_coding(accept_encoding))
+    return Response(body, media_type=media_type, headers=response_codec.headers(coding))
+
 
 # Textbook Parsing Endpoints
-from fastapi import UploadFile, File, Form
-import shutil
-import os
-from textbook_processor import textbook_processor
 from models import Textbook, Chapter, ExtractedQuestion
+from textbook_store import textbook_store
 
 @app.post("/upload-textbook")
 def upload_textbook(
@@ -157,12 +321,16 @@ def upload_textbook(
     board: str = Form(...),
     db: Session = Depends(get_db)
 ):
-    upload_dir = "uploaded_books"
-    os.makedirs(upload_dir, exist_ok=True)
+    content_hash, file_location, size = textbook_store.save_upload(file.file)
     
-    file_location = f"{upload_dir}/{file.filename}"
-    with open(file_location, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # Same bytes, same catalogue entry: the existing book has (or will have) everything
+    existing = textbook_store.find_same_upload(file_location, subject, grade, board, db)
+    if existing:
+        job = ingestion_queue.job_for_book(existing.id, db)
+        if job and job.status != "done":
+            return {"status": "queued", "message": "Book already uploaded and queued for parsing",
+                    "book_id": existing.id, "job_id": job.id}
+        return {"status": "success", "message": "Book already uploaded", "book_id": existing.id}
         
     # Create DB Entry
     book_id = str(uuid.uuid4())
@@ -176,26 +344,84 @@ def upload_textbook(
         uploaded_at=datetime.utcnow().isoformat()
     )
     db.add(new_book)
+    
+    # Identical bytes were parsed before: copy the rows instead of re-parsing
+    parse = textbook_store.find_parse(content_hash, db)
+    if parse and parse.status == "done":
+        textbook_store.clone_parse(parse.textbook_id, book_id, db)
+        return {"status": "success", "message": "Book uploaded; reused earlier parse of identical file", "book_id": book_id}
+    
     db.commit()
+    parsed_for = textbook_store.record(content_hash, file_location, size, book_id, db)
     
-    # Trigger Processing (Ideally Background Task)
-    try:
-        textbook_processor.process_pdf(file_location, book_id, db)
-        return {"status": "success", "message": "Book uploaded and parsed successfully", "book_id": book_id}
-    except Exception as e:
-        return {"status": "partial_success", "message": f"Book uploaded but parsing failed: {str(e)}", "book_id": book_id}
+    # Parsing happens in the background ingestion workers. Bytes still being
+    # parsed for another book are parsed once: this job waits and copies.
+    if parsed_for != book_id:
+        job = ingestion_queue.enqueue(book_id, file_location, db, clone_from=parsed_for)
+        return {"status": "queued", "message": "Book uploaded; waiting for the parse of an identical file",
+                "book_id": book_id, "job_id": job.id}
+    job = ingestion_queue.enqueue(book_id, file_location, db)
+    return {"status": "queued", "message": "Book uploaded and queued for parsing", "book_id": book_id, "job_id": job.id}
+
+@app.get("/ingestion-jobs/{job_id}")
+def get_ingestion_job(job_id: str, db: Session = Depends(get_db)):
+    job = ingestion_queue.get_job(job_id, db)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "job_id": job.id,
+        "book_id": job.textbook_id,
+        "status": job.status,
+        "pages_done": job.pages_done,
+        "total_pages": job.total_pages,
+        "error": job.error
+    }
 
+# Listings stream in id order; see pagination.keyset_response for limit/after/fields
 @app.get("/textbooks")
-def get_textbooks(db: Session = Depends(get_db)):
-    return db.query(Textbook).all()
+async def get_textbooks(limit: Optional[int] = None, after: Optional[str] = None, fields: Optional[str] = None):
+    return keyset_response(Textbook, parse_fields(fields, Textbook.__table__.columns.keys()), (), after, limit)
 
 @app.get("/textbooks/{book_id}/chapters")
-def get_chapters(book_id: str, db: Session = Depends(get_db)):
-    return db.query(Chapter).filter(Chapter.textbook_id == book_id).all()
+async def get_chapters(book_id: str, limit: Optional[int] = None, after: Optional[str] = None, fields: Optional[str] = None):
+    # e.g. fields=id,chapter_number,title skips the bulky content_summary
+    return keyset_response(Chapter, parse_fields(fields, Chapter.__table__.columns.keys()),
+                           [Chapter.textbook_id == book_id], after, limit)
 
 @app.get("/chapters/{chapter_id}/questions")
-def get_extracted_questions(chapter_id: str, db: Session = Depends(get_db)):
-    return db.query(ExtractedQuestion).filter(ExtractedQuestion.chapter_id == chapter_id).all()
+async def get_extracted_questions(chapter_id: str, limit: Optional[int] = None, after: Optional[str] = None,
+                                  fields: Optional[str] = None):
+    return keyset_response(ExtractedQuestion, parse_fields(fields, ExtractedQuestion.__table__.columns.keys()),
+                           [ExtractedQuestion.chapter_id == chapter_id], after, limit)
+
+MAX_SEARCH_LIMIT = int(os.environ.get("MAX_SEARCH_LIMIT", "100"))
+MAX_SEARCH_OFFSET = int(os.environ.get("MAX_SEARCH_OFFSET", "1000"))
+
+@app.get("/search")
+async def search_textbooks(q: str, kind: Optional[str] = None, textbook_id: Optional[str] = None,
+                           limit: int = 20, offset: int = 0, db: AsyncSession = Depends(get_async_db)):
+    """
+    Ranked full-text search over extracted chapters and questions. Words
+    must all match, `word*` matches a prefix and "quoted phrases" match
+    exactly; titles and snippets mark matches with <mark>...</mark>.
+    """
+    if not 1 <= limit <= MAX_SEARCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_SEARCH_LIMIT}")
+    if not 0 <= offset <= MAX_SEARCH_OFFSET:
+        raise HTTPException(status_code=400, detail=f"offset must be between 0 and {MAX_SEARCH_OFFSET}")
+    if kind is not None and kind not in SEARCH_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {', '.join(SEARCH_KINDS)}")
+    try:
+        results, truncated = await search(db, q, kind, textbook_id, limit, offset)
+    except (OperationalError, ProgrammingError):
+        raise HTTPException(status_code=503, detail="Search index unavailable")
+    return {
+        "query": q,
+        "results": results,
+        "next_offset": offset + limit if len(results) == limit else None,
+        # Only with SEARCH_MAX_CANDIDATES set: older matches weren't ranked
+        "truncated": truncated,
+    }
 
 if __name__ == "__main__":
     import uvicorn
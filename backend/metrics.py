@@ -0,0 +1,413 @@
+"""
+Lightweight instrumentation, exposed in Prometheus text format at /metrics.
+
+- `MetricsMiddleware` records per-route request latency and how many SQL
+  queries each request ran (a request with dozens of queries is usually
+  an N+1).
+- `instrument_engine` times every SQL statement via SQLAlchemy events.
+- `span(name)` / `@timed(name)` time hot-path stages (PDF extraction,
+  NLP, commits...).
+- `SamplingProfiler` (opt-in, PROFILE_SAMPLE_HZ) samples every thread's
+  stack and produces folded stacks for flamegraph.pl / speedscope.
+
+Ingestion workers are separate processes: they dump their metrics to
+METRICS_DIR (see `dump_process_metrics`) and /metrics merges them in.
+Without METRICS_DIR, `open_metrics_dir` creates a temporary directory at
+startup and `close_metrics_dir` removes it on shutdown.
+"""
+import contextvars
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _Tally
+from functools import wraps
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Requests running more queries than this are logged as likely N+1s
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("METRICS_N_PLUS_ONE_THRESHOLD", "50"))
+# Where processes other than the API (ingestion workers) leave their metrics;
+# unset = a temporary directory that lives as long as the API process
+METRICS_DIR = os.environ.get("METRICS_DIR", "")
+# Sampling profiler: samples per second, 0 = off
+PROFILE_SAMPLE_HZ = float(os.environ.get("PROFILE_SAMPLE_HZ", "0"))
+PROFILE_OUTPUT = os.environ.get("PROFILE_OUTPUT", "")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # label values -> per-bucket counts (last one is +Inf), then sum
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *label_values: str):
+        i = bisect_left(self.buckets, value) # First bucket with value <= bound
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            series = [[list(k), list(v)] for k, v in self._series.items()]
+        return {"type": "histogram", "help": self.help, "labels": list(self.labels),
+                "buckets": list(self.buckets), "series": series}
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, *label_values: str):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            series = [[list(k), v] for k, v in self._series.items()]
+        return {"type": "counter", "help": self.help, "labels": list(self.labels), "series": series}
+
+
+request_latency = Histogram("http_request_duration_seconds", "Request latency by route.",
+                            ("method", "route", "status"))
+request_queries = Histogram("http_request_db_queries", "SQL queries run per request.",
+                            ("method", "route"), COUNT_BUCKETS)
+query_latency = Histogram("db_query_duration_seconds", "SQL statement latency by kind.", ("operation",))
+span_latency = Histogram("span_duration_seconds", "Time spent in instrumented stages.", ("span",))
+span_errors = Counter("span_errors_total", "Instrumented stages that raised.", ("span",))
+
+REGISTRY = [request_latency, request_queries, query_latency, span_latency, span_errors]
+
+# Per-request query counter; a mutable holder so threadpool copies of the
+# context (sync endpoints) still count into the request's total
+_request_queries: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar("request_queries", default=None)
+
+
+# --- Spans ---
+
+class span:
+    """
+    Times a block: `with span("pdf.process"): ...`. A plain class rather
+    than @contextmanager, which costs a couple of microseconds more.
+    """
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        span_latency.observe(time.perf_counter() - self.start, self.name)
+        if exc_type is not None:
+            span_errors.inc(1, self.name)
+        return False
+
+
+def timed(name: str):
+    """
+    Decorator form of `span`.
+    """
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def timed_iter(iterable: Iterable, name: str) -> Iterator:
+    """
+    Yields from `iterable`, timing how long producing each item takes.
+    """
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        span_latency.observe(time.perf_counter() - start, name)
+        yield item
+
+
+# --- SQLAlchemy ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_metrics_start", None)
+    if start is None:
+        return
+    operation = statement.split(None, 1)[0].upper() if statement else "OTHER"
+    query_latency.observe(time.perf_counter() - start, operation)
+    counter = _request_queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def instrument_engine(engine):
+    """
+    Times every statement on `engine` (a sync Engine, or an AsyncEngine's
+    `.sync_engine`).
+    """
+    from sqlalchemy import event
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# --- ASGI middleware ---
+
+class MetricsMiddleware:
+    """
+    Records latency and query count per request, labelled with the route
+    template (e.g. /user-stats/{user_id}) so the label set stays bounded.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        queries = [0]
+        token = _request_queries.set(queries)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_queries.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            request_latency.observe(elapsed, scope["method"], path, str(status[0]))
+            request_queries.observe(queries[0], scope["method"], path)
+            if queries[0] > N_PLUS_ONE_THRESHOLD:
+                logger.warning("%s %s ran %d SQL queries (possible N+1)", scope["method"], path, queries[0])
+
+
+# --- Exposition ---
+
+def snapshot() -> Dict[str, Any]:
+    return {metric.name: metric.snapshot() for metric in REGISTRY}
+
+
+def reset():
+    """
+    Clears every metric. Forked children call this so they don't report
+    their parent's counts a second time.
+    """
+    for metric in REGISTRY:
+        metric.clear()
+
+
+# The directory in use, and whether open_metrics_dir created it
+_metrics_dir: Optional[str] = METRICS_DIR or None
+_owns_metrics_dir = False
+
+
+def open_metrics_dir() -> str:
+    """
+    Returns the directory processes share metrics through, creating a
+    temporary one if METRICS_DIR isn't set. Call before starting workers.
+    """
+    global _metrics_dir, _owns_metrics_dir
+    if _metrics_dir is None:
+        _metrics_dir = tempfile.mkdtemp(prefix="traps-metrics-")
+        _owns_metrics_dir = True
+        # Spawned (not forked) children find it through the environment
+        os.environ["METRICS_DIR"] = _metrics_dir
+    return _metrics_dir
+
+
+def close_metrics_dir():
+    """
+    Removes the directory if open_metrics_dir created it. Call after the
+    workers have exited.
+    """
+    global _metrics_dir, _owns_metrics_dir
+    if _owns_metrics_dir:
+        shutil.rmtree(_metrics_dir, ignore_errors=True)
+        if os.environ.get("METRICS_DIR") == _metrics_dir:
+            del os.environ["METRICS_DIR"]
+        _metrics_dir = None
+        _owns_metrics_dir = False
+
+
+def dump_process_metrics(directory: Optional[str] = None):
+    """
+    Writes this process's metrics where /metrics picks them up. Called by
+    ingestion workers after each job; a no-op if no directory is open.
+    """
+    directory = directory or _metrics_dir
+    if directory is None:
+        return
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(snapshot(), f)
+    os.replace(tmp, path)
+
+
+def _merge(into: Dict[str, Any], other: Dict[str, Any]):
+    for name, metric in other.items():
+        target = into.setdefault(name, {**metric, "series": []})
+        index = {tuple(labels): values for labels, values in target["series"]}
+        for labels, values in metric["series"]:
+            key = tuple(labels)
+            if key not in index:
+                index[key] = values
+            elif metric["type"] == "histogram":
+                index[key] = [a + b for a, b in zip(index[key], values)]
+            else:
+                index[key] = index[key] + values
+        target["series"] = [[list(k), v] for k, v in index.items()]
+
+
+def collect(directory: Optional[str] = None) -> Dict[str, Any]:
+    """
+    This process's metrics merged with those dumped by other processes.
+    """
+    merged = snapshot()
+    directory = directory or _metrics_dir
+    if directory is None:
+        return merged
+    own = f"{os.getpid()}.json"
+    try:
+        names = [n for n in os.listdir(directory) if n.endswith(".json") and n != own]
+    except FileNotFoundError:
+        names = []
+    for name in names:
+        try:
+            with open(os.path.join(directory, name)) as f:
+                _merge(merged, json.load(f))
+        except (OSError, ValueError):
+            continue # Being replaced right now; next scrape gets it
+    return merged
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], le: Optional[str] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def render_prometheus(metrics: Optional[Dict[str, Any]] = None) -> str:
+    metrics = collect() if metrics is None else metrics
+    lines = []
+    for name, metric in metrics.items():
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for labels, values in metric["series"]:
+            if metric["type"] == "counter":
+                lines.append(f"{name}{_labels(metric['labels'], labels)} {values}")
+                continue
+            cumulative = 0
+            for bound, count in zip(list(metric["buckets"]) + ["+Inf"], values[:-1]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(metric['labels'], labels, str(bound))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(metric['labels'], labels)} {values[-1]}")
+            lines.append(f"{name}_count{_labels(metric['labels'], labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Sampling profiler ---
+
+class SamplingProfiler:
+    """
+    Samples the stacks of all threads `hz` times a second and aggregates
+    them as folded stacks ("outer;inner;leaf count" lines), the input
+    format of flamegraph.pl and speedscope.
+    """
+    def __init__(self, hz: float = PROFILE_SAMPLE_HZ):
+        self.hz = hz
+        self.samples = 0
+        self._stacks: _Tally = _Tally()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.hz > 0
+
+    def start(self):
+        if self.enabled and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        if self.enabled and PROFILE_OUTPUT:
+            with open(PROFILE_OUTPUT, "w") as f:
+                f.write(self.folded())
+
+    def folded(self) -> str:
+        stacks = self._stacks.copy()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+    def _run(self):
+        interval = 1.0 / self.hz
+        me = threading.get_ident()
+        while not self._stop.wait(interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self._stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+profiler = SamplingProfiler()
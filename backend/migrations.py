@@ -0,0 +1,168 @@
+"""
+Minimal schema migrations.
+
+`Base.metadata.create_all` only creates missing tables, so changes to
+existing tables (new indexes, ...) are applied here. Each migration runs
+once per database, in order, inside its own transaction, and is recorded
+in the `schema_migrations` table.
+
+Run manually with `python migrations.py`; `init_db()` also runs them.
+"""
+from datetime import datetime
+from typing import Callable, List, Tuple
+from sqlalchemy import Column, Index, MetaData, String, Table, insert, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+
+Migration = Callable[[Connection, MetaData], None]
+
+_migrations_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _migrations_metadata,
+    Column("version", String, primary_key=True),
+    Column("applied_at", String),
+)
+
+
+def create_indexes(*specs: Tuple[str, str, Tuple[str, ...]]) -> Migration:
+    """
+    Migration creating indexes given as (name, table, columns).
+
+    Specs are spelled out here rather than looked up on the models, so old
+    migrations keep working after the models move on.
+    """
+    def migrate(conn: Connection, metadata: MetaData):
+        for name, table_name, columns in specs:
+            table = metadata.tables[table_name]
+            Index(name, *(table.c[column] for column in columns)).create(conn, checkfirst=True)
+    return migrate
+
+
+def add_columns(table_name: str, *specs: Tuple[str, str]) -> Migration:
+    """
+    Migration adding nullable columns given as (name, SQL type), unless
+    `create_all` already created them with the table.
+    """
+    def migrate(conn: Connection, metadata: MetaData):
+        existing = {column["name"] for column in inspect(conn).get_columns(table_name)}
+        for name, sql_type in specs:
+            if name not in existing:
+                conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {name} {sql_type}"))
+    return migrate
+
+
+def drop_indexes(*names: str) -> Migration:
+    def migrate(conn: Connection, metadata: MetaData):
+        for name in names:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    return migrate
+
+
+def backfill_answer_stats(conn: Connection, metadata: MetaData):
+    """
+    Fills the answer statistics tables from the existing responses.
+    Correctness isn't stored per response, so it is taken from the
+    selected option's isCorrect flag.
+    """
+    from answer_stats import aggregate
+
+    questions = metadata.tables["questions"]
+    responses = metadata.tables["student_responses"]
+    traits, correct_options = {}, {}
+    for qid, topic, options in conn.execute(select(questions.c.id, questions.c.topic, questions.c.options)):
+        options = options or []
+        traits[qid] = (topic, any(o.get("isTrap") for o in options))
+        correct_options[qid] = {o.get("id") for o in options if o.get("isCorrect")}
+
+    rows = conn.execution_options(stream_results=True, yield_per=10000).execute(select(
+        responses.c.user_id, responses.c.question_id, responses.c.selected_option, responses.c.trap_detected
+    ))
+    answers = (
+        (user_id, qid, selected in correct_options.get(qid, ()), bool(trapped))
+        for user_id, qid, selected, trapped in rows if user_id is not None
+    )
+    for table_name, counters in zip(("user_stats", "user_topic_stats", "question_stats"), aggregate(answers, traits)):
+        if counters:
+            conn.execute(insert(metadata.tables[table_name]), counters)
+
+
+def build_search_index(conn: Connection, metadata: MetaData):
+    """
+    Creates the full-text search index and adds the chapters and
+    questions already stored.
+    """
+    from search import create_search_index, documents, insert_documents
+
+    if not create_search_index(conn):
+        return
+    chapters = metadata.tables["chapters"]
+    questions = metadata.tables["extracted_questions"]
+    streaming = conn.execution_options(stream_results=True, yield_per=5000)
+    books = {}
+    for rows in streaming.execute(select(chapters)).mappings().partitions():
+        books.update((row["id"], row["textbook_id"]) for row in rows)
+        insert_documents(conn, documents(rows, ()))
+    for rows in streaming.execute(select(questions)).mappings().partitions():
+        insert_documents(conn, documents((), rows, books))
+
+
+MIGRATIONS: List[Tuple[str, Migration]] = [
+    ("0001_hot_path_indexes", create_indexes(
+        ("ix_questions_topic", "questions", ("topic",)),
+        ("ix_chapters_textbook_id", "chapters", ("textbook_id",)),
+        ("ix_extracted_questions_chapter_id", "extracted_questions", ("chapter_id",)),
+        ("ix_textbooks_filename", "textbooks", ("filename",)),
+        ("ix_student_responses_timestamp", "student_responses", ("timestamp",)),
+        ("ix_student_responses_user_id_timestamp", "student_responses", ("user_id", "timestamp")),
+        ("ix_student_responses_question_id_timestamp", "student_responses", ("question_id", "timestamp")),
+        ("ix_ingestion_jobs_textbook_id", "ingestion_jobs", ("textbook_id",)),
+        ("ix_ingestion_jobs_status_created_at", "ingestion_jobs", ("status", "created_at")),
+    )),
+    # Keyset pagination filters on one column and walks ids in order
+    ("0002_keyset_pagination_indexes", create_indexes(
+        ("ix_questions_topic_id", "questions", ("topic", "id")),
+        ("ix_chapters_textbook_id_id", "chapters", ("textbook_id", "id")),
+        ("ix_extracted_questions_chapter_id_id", "extracted_questions", ("chapter_id", "id")),
+    )),
+    ("0003_drop_superseded_indexes", drop_indexes(
+        "ix_questions_topic",
+        "ix_chapters_textbook_id",
+        "ix_extracted_questions_chapter_id",
+    )),
+    ("0004_backfill_answer_stats", backfill_answer_stats),
+    ("0005_search_index", build_search_index),
+    ("0006_ingestion_job_lease_owner", add_columns("ingestion_jobs", ("lease_owner", "VARCHAR"))),
+    ("0007_ingestion_job_clone_from", add_columns("ingestion_jobs", ("clone_from", "VARCHAR"))),
+]
+
+
+def run_migrations(engine: Engine, metadata: MetaData) -> List[str]:
+    """
+    Applies pending migrations and returns the versions applied.
+    """
+    _migrations_metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        applied = set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+    newly_applied = []
+    for version, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        try:
+            with engine.begin() as conn:
+                migrate(conn, metadata)
+                conn.execute(insert(schema_migrations).values(
+                    version=version, applied_at=datetime.utcnow().isoformat()
+                ))
+        except IntegrityError:
+            # Another process applied it concurrently
+            continue
+        newly_applied.append(version)
+    return newly_applied
+
+
+if __name__ == "__main__":
+    from models import Base, engine
+    Base.metadata.create_all(bind=engine)
+    applied = run_migrations(engine, Base.metadata)
+    print("Applied: " + ", ".join(applied) if applied else "Database is up to date")
@@ -0,0 +1,75 @@
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from models import AsyncSessionLocal
+from response_codec import JSON_MEDIA_TYPE, encode_rows
+
+# Rows fetched per keyset query while streaming a response
+STREAM_CHUNK_SIZE = int(os.environ.get("STREAM_CHUNK_SIZE", "500"))
+MAX_PAGE_SIZE = int(os.environ.get("MAX_PAGE_SIZE", "10000"))
+
+
+def parse_fields(fields: Optional[str], allowed: Sequence[str]) -> List[str]:
+    """
+    Parses a `fields=a,b,c` projection; all `allowed` fields when absent.
+    """
+    if not fields:
+        return list(allowed)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return requested
+
+
+def check_limit(limit: Optional[int]) -> Optional[int]:
+    if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return limit
+
+
+async def iter_keyset(model, fields: Sequence[str], filters: Sequence = (),
+                      after: Optional[str] = None, limit: Optional[int] = None,
+                      chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yields rows of `model` (only `fields`) in id order, `after` the given
+    id, fetching `chunk_size` rows per query so memory stays flat.
+
+    Opens its own session: it runs while the response is being streamed,
+    after request dependencies may already have been torn down.
+    """
+    key = model.id
+    columns = [getattr(model, f) for f in fields]
+    if "id" not in fields:
+        columns.append(key)
+
+    remaining = limit
+    async with AsyncSessionLocal() as db:
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            query = select(*columns).where(*filters).order_by(key).limit(size)
+            if after is not None:
+                query = query.where(key > after)
+            rows = (await db.execute(query)).mappings().all()
+            for row in rows:
+                yield {f: row[f] for f in fields}
+            if len(rows) < size:
+                return
+            after = rows[-1]["id"]
+            if remaining is not None:
+                remaining -= len(rows)
+
+
+def keyset_response(model, fields: Sequence[str], filters: Sequence = (),
+                    after: Optional[str] = None, limit: Optional[int] = None) -> StreamingResponse:
+    """
+    Streams a JSON array of rows, ordered by id.
+
+    Paging contract: pass `limit` to cap the page and the `id` of the last
+    item received as `after` to get the next one; a page shorter than
+    `limit` is the last. Without `limit` everything is streamed.
+    """
+    rows = iter_keyset(model, fields, filters, after, check_limit(limit))
+    return StreamingResponse(encode_rows(rows, JSON_MEDIA_TYPE), media_type=JSON_MEDIA_TYPE)
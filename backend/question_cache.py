@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Hashable, Optional, Set, Tuple
+
+# Memory cap for cached payloads, and the largest single payload worth caching
+QUESTION_CACHE_MAX_BYTES = int(os.environ.get("QUESTION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+QUESTION_CACHE_MAX_ENTRY_BYTES = int(os.environ.get("QUESTION_CACHE_MAX_ENTRY_BYTES", str(8 * 1024 * 1024)))
+# Upper bound on staleness when another API process changes the questions table
+QUESTION_CACHE_TTL_SECONDS = float(os.environ.get("QUESTION_CACHE_TTL_SECONDS", "300"))
+
+
+class QuestionCache:
+    """
+    Read-through cache of encoded /questions responses.
+
+    Entries are the exact response bytes, keyed by request parameters and
+    indexed by topic so a write to one topic only drops that topic's
+    entries (plus the unfiltered listings). Eviction is LRU under a byte
+    cap, with a TTL so entries can't outlive writes made by other processes
+    for long.
+    """
+    def __init__(self, max_bytes: int = QUESTION_CACHE_MAX_BYTES,
+                 max_entry_bytes: int = QUESTION_CACHE_MAX_ENTRY_BYTES,
+                 ttl_seconds: float = QUESTION_CACHE_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self.ttl_seconds = ttl_seconds
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size_bytes = 0
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[bytes, float, Optional[str]]]" = OrderedDict()
+        self._by_topic: Dict[Optional[str], Set[Hashable]] = {}
+        # Bumped on invalidation, so a fill that raced with a write is dropped
+        self._generation: Dict[Optional[str], int] = {}
+        self._epoch = 0
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    async def fill(self, key: Hashable, topic: Optional[str], body: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """
+        Passes `body` through unchanged and caches it once fully sent. Bodies
+        over the entry limit are streamed without being kept.
+        """
+        generation = self._generations(topic)
+        chunks = []
+        size = 0
+        async for chunk in body:
+            if chunks is not None:
+                size += len(chunk)
+                if size > self.max_entry_bytes:
+                    chunks = None
+                else:
+                    chunks.append(chunk)
+            yield chunk
+        if chunks is not None:
+            self._put(key, topic, b"".join(chunks), generation)
+
+    def invalidate(self, topic: Optional[str] = None):
+        """
+        Drops cached responses that could include questions of `topic`
+        (everything when `topic` is None).
+        """
+        with self._lock:
+            if topic is None:
+                self._epoch += 1
+                self._entries.clear()
+                self._by_topic.clear()
+                self.size_bytes = 0
+                return
+            # Unfiltered listings contain every topic
+            for t in (topic, None):
+                self._generation[t] = self._generation.get(t, 0) + 1
+                for key in list(self._by_topic.get(t, ())):
+                    self._remove(key)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "size_bytes": self.size_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _generations(self, topic: Optional[str]) -> Tuple[int, int]:
+        with self._lock:
+            return self._generations_unlocked(topic)
+
+    def _put(self, key: Hashable, topic: Optional[str], payload: bytes, generation: Tuple[int, int]):
+        with self._lock:
+            if self._generations_unlocked(topic) != generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (payload, time.monotonic() + self.ttl_seconds, topic)
+            self._by_topic.setdefault(topic, set()).add(key)
+            self.size_bytes += len(payload)
+            while self.size_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _generations_unlocked(self, topic: Optional[str]) -> Tuple[int, int]:
+        # Every topic write bumps the None generation, so unfiltered fills
+        # see them all; a topic's fill only cares about its own writes
+        return self._generation.get(topic, 0), self._epoch
+
+    def _remove(self, key: Hashable):
+        payload, _, topic = self._entries.pop(key)
+        self.size_bytes -= len(payload)
+        keys = self._by_topic.get(topic)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_topic[topic]
+
+question_cache = QuestionCache()
@@ -0,0 +1,184 @@
+import codecs
+import csv
+import json
+import os
+import uuid
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Type
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import Question
+from ai_service import ai_service
+from question_cache import question_cache
+
+# Questions validated, analysed and inserted per transaction
+BULK_IMPORT_CHUNK_SIZE = int(os.environ.get("BULK_IMPORT_CHUNK_SIZE", "1000"))
+# Rejected rows listed in the report; the count is always exact
+BULK_IMPORT_MAX_ERRORS = int(os.environ.get("BULK_IMPORT_MAX_ERRORS", "1000"))
+
+IMPORT_FORMATS = ("ndjson", "csv")
+CSV_COLUMNS = ("id", "text", "topic", "explanation", "options")
+
+questions_table = Question.__table__
+
+# (line number, raw JSON / parsed row, or a ValueError saying why it's unreadable)
+Record = Tuple[int, Any]
+
+
+def import_format(filename: Optional[str], requested: Optional[str] = None) -> Optional[str]:
+    """
+    The upload's format: as requested, else from the file extension
+    (NDJSON unless it ends in .csv). None if `requested` is unknown.
+    """
+    if requested:
+        requested = requested.lower()
+        return requested if requested in IMPORT_FORMATS else None
+    return "csv" if (filename or "").lower().endswith(".csv") else "ndjson"
+
+
+def iter_records(fileobj: BinaryIO, fmt: str) -> Iterator[Record]:
+    """
+    Reads an upload one record at a time. NDJSON is one question object
+    per line (yielded as raw JSON); CSV has the CSV_COLUMNS header with
+    `options` as a JSON array (yielded as dicts).
+    """
+    if fmt == "csv":
+        # A CSV record can span lines, so bad bytes can't be pinned to a row
+        lines = (raw.decode("utf-8", "replace") for raw in fileobj)
+        reader = csv.DictReader(_strip_bom(lines, "\ufeff"))
+        for row in reader:
+            try:
+                row["options"] = json.loads(row.get("options") or "[]")
+                yield reader.line_num, row
+            except ValueError as e:
+                yield reader.line_num, ValueError(f"options: invalid JSON ({e})")
+        return
+
+    # Lines are handed to pydantic undecoded: it parses and validates JSON in one go
+    for line_num, raw in enumerate(_strip_bom(fileobj, codecs.BOM_UTF8), 1):
+        if raw.strip():
+            yield line_num, raw
+
+
+def _strip_bom(lines: Iterable, bom):
+    first = True
+    for line in lines:
+        if first and line.startswith(bom):
+            line = line[len(bom):]
+        first = False
+        yield line
+
+
+def _validation_messages(e: ValidationError) -> List[str]:
+    return [f"{'.'.join(map(str, err['loc'])) or 'row'}: {err['msg']}" for err in e.errors()]
+
+
+class ImportReport:
+    def __init__(self, max_errors: int = BULK_IMPORT_MAX_ERRORS):
+        self.max_errors = max_errors
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    def reject(self, line: int, messages: List[str]):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "errors": messages})
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "status": "completed",
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": sorted(self.errors, key=lambda e: e["line"]),
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+def _question_row(q: BaseModel) -> Dict[str, Any]:
+    # Same shape create_question stores
+    row = q.model_dump()
+    options = row["options"]
+    row["topic_id"] = None
+    row["correct_option"] = next((o["text"] for o in options if o["isCorrect"]), "")
+    row["wrong_options"] = [o["text"] for o in options if not o["isCorrect"]]
+    row["trap_type"] = "Manual"
+    return row
+
+
+def _write_chunk(db: Session, chunk: List[Tuple[int, BaseModel]], report: ImportReport):
+    # Ids already stored (or repeated within the chunk) are rejected per row
+    ids = [q.id for _, q in chunk if q.id]
+    taken = set(db.execute(select(Question.id).where(Question.id.in_(ids))).scalars()) if ids else set()
+    accepted = []
+    for line, q in chunk:
+        if q.id in taken:
+            report.reject(line, [f"id: question {q.id} already exists"])
+            continue
+        if not q.id:
+            q.id = str(uuid.uuid4())
+        taken.add(q.id)
+        accepted.append((line, q))
+    if not accepted:
+        return
+
+    # Trap feedback for the whole chunk in one batched pass
+    traps = [
+        (q, opt, next((o.text for o in q.options if o.isCorrect), ""))
+        for _, q in accepted for opt in q.options if opt.isTrap and not opt.feedback
+    ]
+    if traps:
+        analyses = ai_service.analyze_mistakes((q.text, opt.text, correct) for q, opt, correct in traps)
+        for (_, opt, _), feedback in zip(traps, analyses):
+            opt.feedback = feedback
+
+    try:
+        db.execute(insert(questions_table), [_question_row(q) for _, q in accepted])
+        db.commit()
+    except IntegrityError:
+        # Lost a race with a concurrent writer: retry row by row
+        db.rollback()
+        inserted = []
+        for line, q in accepted:
+            try:
+                db.execute(insert(questions_table), [_question_row(q)])
+                db.commit()
+                inserted.append((line, q))
+            except IntegrityError as e:
+                db.rollback()
+                report.reject(line, [f"rejected by database: {e.orig}"])
+        accepted = inserted
+
+    report.imported += len(accepted)
+    for topic in {q.topic for _, q in accepted}:
+        question_cache.invalidate(topic)
+
+
+def import_questions(records: Iterable[Record], db: Session, schema: Type[BaseModel],
+                     chunk_size: int = BULK_IMPORT_CHUNK_SIZE) -> ImportReport:
+    """
+    Validates `records` against `schema` as they are read and inserts the
+    valid ones `chunk_size` at a time, one transaction per chunk. Invalid
+    rows are skipped and listed in the report.
+    """
+    report = ImportReport()
+    chunk: List[Tuple[int, BaseModel]] = []
+    for line, record in records:
+        if isinstance(record, ValueError):
+            report.reject(line, [str(record)])
+            continue
+        try:
+            if isinstance(record, bytes):
+                chunk.append((line, schema.model_validate_json(record)))
+            else:
+                chunk.append((line, schema.model_validate(record)))
+        except ValidationError as e:
+            report.reject(line, _validation_messages(e))
+            continue
+        if len(chunk) >= chunk_size:
+            _write_chunk(db, chunk, report)
+            chunk = []
+    if chunk:
+        _write_chunk(db, chunk, report)
+    return report
@@ -0,0 +1,89 @@
+import re
+from typing import Dict, Iterator, Optional, Tuple
+
+
+class RuleProfile:
+    """
+    Precompiled patterns used to segment a textbook and pull out questions.
+
+    Boards lay out their books differently (chapter headings, exercise
+    titles), so each board can register its own profile; everything else
+    falls back to the default one.
+    """
+    def __init__(self, name: str,
+                 chapter_words=("Chapter", "Unit"),
+                 exercise_words=("Exercise", "Questions", "Assessment"),
+                 long_words=("explain", "describe"),
+                 max_header_length: int = 50):
+        self.name = name
+        self.max_header_length = max_header_length
+
+        self.chapter_header = re.compile(
+            r"(?:%s)\s+(\d+)" % "|".join(map(re.escape, chapter_words)), re.IGNORECASE
+        )
+        self.exercise_start = re.compile(
+            r"(?:%s)\s*:?" % "|".join(map(re.escape, exercise_words)), re.IGNORECASE
+        )
+        # "1. " / "2) " -- a question runs from here to the next "?"
+        self.question_start = re.compile(r"\d+[\.\)]\s+")
+        # Type markers, checked only within the span of each question
+        self.long_marker = re.compile(r"(?:%s)" % "|".join(map(re.escape, long_words)), re.IGNORECASE)
+        self.mcq_marker = re.compile(r"\([a-d]\)") # Has options (a) (b)...
+
+    def match_chapter(self, line: str) -> Optional[int]:
+        """
+        Returns the chapter number if `line` is a chapter header.
+        """
+        if len(line) >= self.max_header_length:
+            return None
+        m = self.chapter_header.match(line)
+        return int(m.group(1)) if m else None
+
+    def classify(self, text: str, start: int, end: int) -> str:
+        if self.long_marker.search(text, start, end):
+            return "Long"
+        if self.mcq_marker.search(text, start, end):
+            return "MCQ"
+        return "Short"
+
+    def scan_questions(self, text: str) -> Iterator[Tuple[str, str]]:
+        """
+        Yields (question_type, text) for each numbered question in the
+        chapter's exercise block.
+
+        Equivalent to `re.findall(r"(\\d+[\\.\\)]\\s+.*?\\?)", ..., re.DOTALL)`
+        but linear: each question start is matched once and the closing "?"
+        found with a forward `str.find`, so long blocks without a "?" can't
+        trigger backtracking.
+        """
+        exercise_match = self.exercise_start.search(text)
+        if not exercise_match:
+            return
+
+        next_start = self.question_start.search
+        pos = exercise_match.start()
+        while True:
+            start = next_start(text, pos)
+            if not start:
+                return
+            end = text.find("?", start.end())
+            if end == -1:
+                return
+            end += 1
+            yield self.classify(text, start.start(), end), text[start.end():end].strip()
+            pos = end
+
+
+DEFAULT_PROFILE = RuleProfile("default")
+
+RULE_PROFILES: Dict[str, RuleProfile] = {
+    "default": DEFAULT_PROFILE,
+}
+
+
+def register_rule_profile(board: str, profile: RuleProfile):
+    RULE_PROFILES[board.lower()] = profile
+
+
+def get_rule_profile(board: Optional[str]) -> RuleProfile:
+    return RULE_PROFILES.get((board or "").lower(), DEFAULT_PROFILE)
@@ -0,0 +1,197 @@
+"""
+Content negotiation for list responses.
+
+Clients pick the body format with `Accept` (JSON, or MessagePack as
+`application/msgpack`) and compression with `Accept-Encoding` (`br` if the
+brotli package is installed, else `gzip`). JSON is written with orjson when
+available. Every format has the same shape, so a client only swaps its
+decoder.
+
+msgpack, orjson and brotli are all optional: without them the matching
+formats simply aren't offered.
+"""
+import json
+import os
+import zlib
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+# Also accepted in Accept for MessagePack
+MSGPACK_ALIASES = ("application/x-msgpack", "application/vnd.msgpack")
+
+# Bodies smaller than this aren't worth compressing (known-size bodies only)
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", "5"))
+
+VARY = "Accept, Accept-Encoding"
+
+
+def dumps_json(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def media_types() -> List[str]:
+    """
+    Body formats on offer, in order of preference.
+    """
+    return [JSON_MEDIA_TYPE] + ([MSGPACK_MEDIA_TYPE] if msgpack is not None else [])
+
+
+def codings() -> List[str]:
+    """
+    Compressions on offer, in order of preference.
+    """
+    return (["br"] if brotli is not None else []) + ["gzip"]
+
+
+def _parse_header(header: Optional[str]) -> Dict[str, float]:
+    """
+    `a/b;q=0.5, c/d` -> {"a/b": 0.5, "c/d": 1.0}
+    """
+    ranges = {}
+    for item in (header or "").split(","):
+        name, *params = [part.strip() for part in item.split(";")]
+        if not name:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        ranges[name.lower()] = q
+    return ranges
+
+
+def negotiate_media_type(accept: Optional[str]) -> str:
+    """
+    The best offered body format for an Accept header. Falls back to JSON
+    rather than failing with 406, so older clients keep working.
+    """
+    ranges = _parse_header(accept)
+    best, best_rank = JSON_MEDIA_TYPE, None
+    for order, media_type in enumerate(media_types()):
+        names = (media_type,) + (MSGPACK_ALIASES if media_type == MSGPACK_MEDIA_TYPE else ())
+        exact = [ranges[name] for name in names if name in ranges]
+        if exact:
+            q, specificity = max(exact), 2
+        elif media_type.split("/")[0] + "/*" in ranges:
+            q, specificity = ranges[media_type.split("/")[0] + "/*"], 1
+        elif "*/*" in ranges:
+            q, specificity = ranges["*/*"], 0
+        else:
+            continue
+        # Highest q wins; ties go to an explicit mention, then to our order
+        rank = (q, specificity, -order)
+        if q > 0 and (best_rank is None or rank > best_rank):
+            best, best_rank = media_type, rank
+    return best
+
+
+def negotiate_coding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    The best offered compression for an Accept-Encoding header, or None
+    for identity.
+    """
+    ranges = _parse_header(accept_encoding)
+    best, best_rank = None, None
+    for order, coding in enumerate(codings()):
+        q = ranges.get(coding, ranges.get("*", 0.0))
+        rank = (q, -order)
+        if q > 0 and (best_rank is None or rank > best_rank):
+            best, best_rank = coding, rank
+    return best
+
+
+def headers(coding: Optional[str]) -> Dict[str, str]:
+    return {"Vary": VARY, **({"Content-Encoding": coding} if coding else {})}
+
+
+def encode(obj: Any, media_type: str) -> bytes:
+    if media_type == MSGPACK_MEDIA_TYPE:
+        return msgpack.packb(obj)
+    return dumps_json(obj)
+
+
+def _compressor(coding: str):
+    if coding == "br":
+        return brotli.Compressor(quality=BROTLI_QUALITY)
+    # wbits=31: gzip container rather than raw zlib
+    return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+
+def compress(payload: bytes, coding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """
+    Compresses `payload` with `coding` if it is big enough to be worth it.
+    Returns the body and the coding actually used.
+    """
+    if not coding or len(payload) < COMPRESS_MIN_BYTES:
+        return payload, None
+    if coding == "br":
+        return brotli.compress(payload, quality=BROTLI_QUALITY), coding
+    compressor = _compressor(coding)
+    return compressor.compress(payload) + compressor.flush(), coding
+
+
+async def encode_rows(rows: AsyncIterator[Dict[str, Any]], media_type: str,
+                      coding: Optional[str] = None) -> AsyncIterator[bytes]:
+    """
+    Encodes a stream of rows as one array in `media_type`, compressed with
+    `coding`. JSON is streamed as rows arrive; a MessagePack array starts
+    with its length, so it is sent once the rows are in (already encoded,
+    which is compact).
+    """
+    chunks = _json_array(rows) if media_type == JSON_MEDIA_TYPE else _msgpack_array(rows)
+    if not coding:
+        async for chunk in chunks:
+            yield chunk
+        return
+    compressor = _compressor(coding)
+    async for chunk in chunks:
+        data = compressor.compress(chunk) if coding != "br" else compressor.process(chunk)
+        if data:
+            yield data
+    yield compressor.flush() if coding != "br" else compressor.finish()
+
+
+async def _json_array(rows: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    yield b"["
+    first = True
+    async for row in rows:
+        yield dumps_json(row) if first else b"," + dumps_json(row)
+        first = False
+    yield b"]"
+
+
+async def _msgpack_array(rows: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    packer = msgpack.Packer()
+    parts: List[bytes] = []
+    async for row in rows:
+        parts.append(packer.pack(row))
+    yield packer.pack_array_header(len(parts)) + b"".join(parts)
+
+
+def encode_list(items: Iterable[Any], media_type: str, coding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """
+    A whole list as a compressed body; returns (body, coding used).
+    """
+    return compress(encode(list(items), media_type), coding)
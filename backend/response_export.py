@@ -0,0 +1,149 @@
+"""
+Columnar export of `student_responses` for analytics.
+
+Rows are read with a streaming cursor, joined with their question's topic
+and trap type, and turned into Arrow record batches of `EXPORT_BATCH_ROWS`
+rows, so memory stays flat however big the table is. The API streams the
+batches as an Arrow IPC stream; the command below writes a Parquet dataset
+partitioned by date or topic:
+
+    python response_export.py exports/responses --partition-by date [--since 2026-01-01]
+
+pyarrow is imported on first use, so the API doesn't pay for it at startup.
+"""
+import argparse
+import importlib.util
+import io
+import os
+from typing import Iterator, Optional
+from sqlalchemy import select
+from sqlalchemy.engine import Connection
+from models import Question, StudentResponse, engine
+
+EXPORT_BATCH_ROWS = int(os.environ.get("EXPORT_BATCH_ROWS", "50000"))
+PARTITION_COLUMNS = ("date", "topic")
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+_columns = (
+    StudentResponse.id, StudentResponse.user_id, StudentResponse.question_id, StudentResponse.selected_option,
+    StudentResponse.trap_detected, StudentResponse.timestamp, Question.topic, Question.trap_type,
+)
+
+
+def pyarrow_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def export_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("id", pa.string()),
+        ("user_id", pa.string()),
+        ("question_id", pa.string()),
+        ("selected_option", pa.string()),
+        ("trap_detected", pa.bool_()),
+        ("timestamp", pa.timestamp("us")),
+        ("topic", pa.string()),
+        ("trap_type", pa.string()),
+        ("date", pa.date32()),
+    ])
+
+
+def _query(since: Optional[str], until: Optional[str]):
+    query = select(*_columns).outerjoin(Question, Question.id == StudentResponse.question_id)
+    # ISO timestamps compare correctly as strings (and use the timestamp index)
+    if since:
+        query = query.where(StudentResponse.timestamp >= since)
+    if until:
+        query = query.where(StudentResponse.timestamp < until)
+    return query
+
+
+def iter_record_batches(conn: Connection, since: Optional[str] = None, until: Optional[str] = None,
+                        batch_rows: int = EXPORT_BATCH_ROWS) -> Iterator["pyarrow.RecordBatch"]:
+    """
+    Yields the (optionally time-bounded) responses as Arrow record batches.
+    """
+    import pyarrow as pa
+
+    schema = export_schema()
+    result = conn.execution_options(stream_results=True, yield_per=batch_rows).execute(_query(since, until))
+    for rows in result.partitions():
+        ids, users, questions, selected, trapped, timestamps, topics, trap_types = zip(*rows)
+        ts = pa.array(timestamps, pa.string()).cast(pa.timestamp("us"))
+        yield pa.RecordBatch.from_arrays([
+            pa.array(ids, pa.string()),
+            pa.array(users, pa.string()),
+            pa.array(questions, pa.string()),
+            pa.array(selected, pa.string()),
+            pa.array(trapped, pa.bool_()),
+            ts,
+            pa.array(topics, pa.string()),
+            pa.array(trap_types, pa.string()),
+            ts.cast(pa.date32()),
+        ], schema=schema)
+
+
+def arrow_stream(since: Optional[str] = None, until: Optional[str] = None,
+                 batch_rows: int = EXPORT_BATCH_ROWS) -> Iterator[bytes]:
+    """
+    The export as an Arrow IPC stream, one chunk per record batch.
+    """
+    import pyarrow as pa
+
+    sink = io.BytesIO()
+    with engine.connect() as conn:
+        writer = pa.ipc.new_stream(sink, export_schema())
+        for batch in iter_record_batches(conn, since, until, batch_rows):
+            writer.write_batch(batch)
+            yield _drain(sink)
+        writer.close()
+        yield _drain(sink)
+
+
+def _drain(sink: io.BytesIO) -> bytes:
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
+
+
+def write_parquet_dataset(out_dir: str, partition_by: str = "date", since: Optional[str] = None,
+                          until: Optional[str] = None, batch_rows: int = EXPORT_BATCH_ROWS) -> int:
+    """
+    Writes a hive-partitioned Parquet dataset (`out_dir/date=2026-03-01/...`)
+    and returns the number of rows exported.
+    """
+    import pyarrow.dataset as ds
+
+    if partition_by not in PARTITION_COLUMNS:
+        raise ValueError(f"partition_by must be one of {', '.join(PARTITION_COLUMNS)}")
+    exported = 0
+
+    def counted(batches):
+        nonlocal exported
+        for batch in batches:
+            exported += batch.num_rows
+            yield batch
+
+    with engine.connect() as conn:
+        ds.write_dataset(
+            counted(iter_record_batches(conn, since, until, batch_rows)),
+            out_dir, schema=export_schema(), format="parquet",
+            partitioning=[partition_by], partitioning_flavor="hive",
+            existing_data_behavior="overwrite_or_ignore",
+        )
+    return exported
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export student responses as partitioned Parquet.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--partition-by", choices=PARTITION_COLUMNS, default="date")
+    parser.add_argument("--since", help="ISO date/time, inclusive")
+    parser.add_argument("--until", help="ISO date/time, exclusive")
+    parser.add_argument("--batch-rows", type=int, default=EXPORT_BATCH_ROWS)
+    args = parser.parse_args()
+    rows = write_parquet_dataset(args.out_dir, args.partition_by, args.since, args.until, args.batch_rows)
+    print(f"Exported {rows} responses to {args.out_dir}")
@@ -0,0 +1,305 @@
+"""
+Full-text search over extracted chapters and questions.
+
+The index is one table, `search_index`, holding a document per chapter
+(title + summary) and per extracted question. On SQLite it is an FTS5
+virtual table ranked with bm25; on PostgreSQL a plain table with a
+weighted tsvector column and a GIN index. `ChapterWriter` (and book
+cloning) add documents in the same transaction as the rows themselves, so
+the index never lags behind what has been ingested; migration
+0005_search_index builds it for existing data.
+"""
+import html
+import logging
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import Column, MetaData, String, Table, inspect, insert, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TABLE = "search_index"
+SEARCH_KINDS = ("chapter", "question")
+# Rows per INSERT when indexing
+SEARCH_INDEX_BATCH_SIZE = int(os.environ.get("SEARCH_INDEX_BATCH_SIZE", "500"))
+# Tokens of context around the matches in a snippet
+SEARCH_SNIPPET_TOKENS = int(os.environ.get("SEARCH_SNIPPET_TOKENS", "24"))
+# Opt-in cap (SQLite): rank only this many of the newest matches, so a very
+# common word costs a bounded amount of bm25 scoring. Older matches are then
+# never returned, and responses say so with `truncated` (0 = rank all)
+SEARCH_MAX_CANDIDATES = int(os.environ.get("SEARCH_MAX_CANDIDATES", "0"))
+# Query terms beyond this are ignored
+SEARCH_MAX_TERMS = 16
+HIGHLIGHT_OPEN, HIGHLIGHT_CLOSE = "<mark>", "</mark>"
+# The database marks matches with these private-use characters; the text is
+# HTML-escaped before they become <mark> tags, so markup in an uploaded PDF
+# is never passed through as HTML
+_MATCH_OPEN, _MATCH_CLOSE = "\ue000", "\ue001"
+
+# Only used to build INSERTs: the table itself is created with dialect
+# specific DDL below, never by create_all
+_search_metadata = MetaData()
+search_table = Table(
+    SEARCH_TABLE, _search_metadata,
+    Column("kind", String),
+    Column("ref_id", String),
+    Column("textbook_id", String),
+    Column("chapter_id", String),
+    Column("title", String),
+    Column("body", String),
+)
+
+_DDL = {
+    # Porter stemming, so "reflection" finds "reflections"; prefix indexes
+    # make short prefix queries ("re*") cheap. kind and textbook_id
+    # are indexed so filters on them are part of the MATCH, but only title
+    # and body count towards the rank (title 10x).
+    "sqlite": [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+            kind, ref_id UNINDEXED, textbook_id, chapter_id UNINDEXED, title, body,
+            tokenize = 'porter unicode61 remove_diacritics 2', prefix = '2 3'
+        )""",
+        f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rank) VALUES ('rank', 'bm25(0, 0, 0, 0, 10.0, 1.0)')",
+    ],
+    "postgresql": [
+        f"""CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} (
+            kind VARCHAR NOT NULL, ref_id VARCHAR PRIMARY KEY, textbook_id VARCHAR, chapter_id VARCHAR,
+            title VARCHAR, body VARCHAR,
+            document tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(body, '')), 'B')
+            ) STORED
+        )""",
+        f"CREATE INDEX IF NOT EXISTS ix_{SEARCH_TABLE}_document ON {SEARCH_TABLE} USING GIN (document)",
+    ],
+}
+
+# Engine URL -> whether the index exists there
+_index_ready: Dict[str, bool] = {}
+
+
+def create_search_index(conn: Connection) -> bool:
+    """
+    Creates the index table. Returns False where full-text search isn't
+    available (other databases, SQLite built without FTS5).
+    """
+    statements = _DDL.get(conn.dialect.name)
+    if statements is None:
+        logger.warning("Full-text search isn't supported on %s; /search is disabled", conn.dialect.name)
+        return False
+    try:
+        for statement in statements:
+            conn.execute(text(statement))
+    except OperationalError:
+        logger.warning("SQLite was built without FTS5; /search is disabled")
+        return False
+    return True
+
+
+def _plain(value: Optional[str]) -> str:
+    # A marker character in the PDF text would otherwise read as a match
+    return (value or "").replace(_MATCH_OPEN, "").replace(_MATCH_CLOSE, "")
+
+
+def documents(chapters: Iterable[Dict[str, Any]], questions: Iterable[Dict[str, Any]],
+              books: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
+    """
+    Index documents for `chapters` / `extracted_questions` rows. A
+    question's book is looked up in `books` (chapter id -> textbook id),
+    or among `chapters`.
+    """
+    books = dict(books or {})
+    docs = []
+    for c in chapters:
+        books[c["id"]] = c["textbook_id"]
+        docs.append({"kind": "chapter", "ref_id": c["id"], "textbook_id": c["textbook_id"], "chapter_id": c["id"],
+                     "title": _plain(c["title"]), "body": _plain(c["content_summary"])})
+    for q in questions:
+        docs.append({"kind": "question", "ref_id": q["id"], "textbook_id": books.get(q["chapter_id"]),
+                     "chapter_id": q["chapter_id"], "title": "", "body": _plain(q["text"])})
+    return docs
+
+
+def insert_documents(db, docs: List[Dict[str, Any]], batch_size: int = SEARCH_INDEX_BATCH_SIZE):
+    for i in range(0, len(docs), batch_size):
+        db.execute(insert(search_table), docs[i:i + batch_size])
+
+
+def index_rows(db: Session, chapters: List[Dict[str, Any]], questions: List[Dict[str, Any]]):
+    """
+    Adds freshly inserted chapter and question rows to the index, inside
+    the caller's transaction.
+    """
+    bind = db.get_bind()
+    key = str(bind.url)
+    if key not in _index_ready:
+        _index_ready[key] = inspect(bind).has_table(SEARCH_TABLE)
+    if _index_ready[key]:
+        insert_documents(db, documents(chapters, questions))
+
+
+_TERM = re.compile(r'"([^"]*)"|(\w+)(\*?)')
+
+
+def parse_query(q: str) -> List[Tuple[str, bool]]:
+    """
+    Splits a user query into (term, is_prefix) pairs: words, `word*`
+    prefixes and "quoted phrases". Everything else (operators,
+    punctuation) is dropped.
+    """
+    terms = []
+    for phrase, word, star in _TERM.findall(q):
+        if phrase:
+            words = re.findall(r"\w+", phrase)
+            if words:
+                terms.append((" ".join(words), False))
+        else:
+            terms.append((word, bool(star)))
+    return terms[:SEARCH_MAX_TERMS]
+
+
+def fts5_match(terms: List[Tuple[str, bool]], kind: Optional[str] = None, textbook_id: Optional[str] = None) -> str:
+    """
+    An FTS5 MATCH expression requiring every term in the title or body.
+    """
+    phrases = " ".join(f'"{term}"*' if prefix else f'"{term}"' for term, prefix in terms)
+    expression = "{title body} : (" + phrases + ")"
+    if kind:
+        expression += f' AND kind : "{kind}"'
+    if textbook_id:
+        expression += ' AND textbook_id : "{}"'.format(textbook_id.replace('"', ""))
+    return expression
+
+
+def _filters(kind: Optional[str], textbook_id: Optional[str]) -> str:
+    sql = ""
+    if kind:
+        sql += " AND s.kind = :kind"
+    if textbook_id:
+        sql += " AND s.textbook_id = :textbook_id"
+    return sql
+
+
+def search_statement(dialect: str, q: str, kind: Optional[str] = None, textbook_id: Optional[str] = None,
+                     limit: int = 20, offset: int = 0):
+    """
+    The ranked search query for `dialect` and its parameters; None if
+    `q` has no searchable terms.
+    """
+    terms = parse_query(q)
+    if not terms:
+        return None
+    params = {"limit": limit, "offset": offset, "open": _MATCH_OPEN, "close": _MATCH_CLOSE}
+    if dialect == "sqlite":
+        params.update(match=fts5_match(terms, kind, textbook_id), tokens=SEARCH_SNIPPET_TOKENS)
+        # The candidate cap is a rowid bound (rowids grow with each insert),
+        # which FTS5 applies while walking the index. Rows come out in rank
+        # order, so snippets are only built for the page being returned.
+        candidates = ""
+        if SEARCH_MAX_CANDIDATES:
+            params["candidates"] = SEARCH_MAX_CANDIDATES - 1
+            candidates = f"""AND rowid >= coalesce((
+                SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match
+                ORDER BY rowid DESC LIMIT 1 OFFSET :candidates
+            ), 0)"""
+        hits = f"""
+            SELECT kind, ref_id, textbook_id, chapter_id,
+                   highlight({SEARCH_TABLE}, 4, :open, :close) AS title,
+                   snippet({SEARCH_TABLE}, 5, :open, :close, '…', :tokens) AS snippet,
+                   -rank AS score
+            FROM {SEARCH_TABLE}
+            WHERE {SEARCH_TABLE} MATCH :match {candidates}
+            ORDER BY rank LIMIT :limit OFFSET :offset
+        """
+    else:
+        # websearch_to_tsquery has no prefix syntax, so `word*` is a plain word
+        params.update(kind=kind, textbook_id=textbook_id,
+                      q=" ".join(f'"{term}"' if " " in term else term for term, _ in terms),
+                      headline=f"StartSel={_MATCH_OPEN}, StopSel={_MATCH_CLOSE}, MaxFragments=1, "
+                               f"MaxWords={SEARCH_SNIPPET_TOKENS}, MinWords={SEARCH_SNIPPET_TOKENS // 2}",
+                      title_headline=f"StartSel={_MATCH_OPEN}, StopSel={_MATCH_CLOSE}, HighlightAll=true")
+        # ts_headline is expensive; only run it on the page being returned
+        hits = f"""
+            SELECT kind, ref_id, textbook_id, chapter_id,
+                   ts_headline('english', coalesce(title, ''), query, :title_headline) AS title,
+                   ts_headline('english', coalesce(body, ''), query, :headline) AS snippet,
+                   score
+            FROM (
+                SELECT s.kind, s.ref_id, s.textbook_id, s.chapter_id, s.title, s.body, query,
+                       ts_rank_cd(s.document, query) AS score
+                FROM {SEARCH_TABLE} AS s, websearch_to_tsquery('english', :q) AS query
+                WHERE s.document @@ query{_filters(kind, textbook_id)}
+                ORDER BY score DESC LIMIT :limit OFFSET :offset
+            ) AS ranked
+        """
+    statement = text(f"""
+        SELECT hits.*, textbooks.title AS textbook_title, chapters.title AS chapter_title
+        FROM ({hits}) AS hits
+        LEFT JOIN textbooks ON textbooks.id = hits.textbook_id
+        LEFT JOIN chapters ON chapters.id = hits.chapter_id
+        ORDER BY hits.score DESC
+    """)
+    return statement, {k: v for k, v in params.items() if v is not None}
+
+
+def truncation_statement(dialect: str, q: str, kind: Optional[str] = None, textbook_id: Optional[str] = None):
+    """
+    A query telling whether `q` has more matches than SEARCH_MAX_CANDIDATES
+    (so some were never ranked); None where no cap applies.
+    """
+    terms = parse_query(q)
+    if dialect != "sqlite" or not SEARCH_MAX_CANDIDATES or not terms:
+        return None
+    statement = text(f"""
+        SELECT EXISTS (
+            SELECT 1 FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match
+            ORDER BY rowid DESC LIMIT 1 OFFSET :candidates
+        )
+    """)
+    return statement, {"match": fts5_match(terms, kind, textbook_id), "candidates": SEARCH_MAX_CANDIDATES}
+
+
+def highlight_html(marked: Optional[str]) -> Optional[str]:
+    """
+    HTML-escapes text from the index and turns its match markers into
+    <mark> tags.
+    """
+    if marked is None:
+        return None
+    return html.escape(marked).replace(_MATCH_OPEN, HIGHLIGHT_OPEN).replace(_MATCH_CLOSE, HIGHLIGHT_CLOSE)
+
+
+def _result(row) -> Dict[str, Any]:
+    return {
+        "kind": row["kind"],
+        "id": row["ref_id"],
+        "textbook_id": row["textbook_id"],
+        "textbook_title": row["textbook_title"],
+        "chapter_id": row["chapter_id"],
+        "chapter_title": row["chapter_title"],
+        "title": highlight_html(row["title"]) or None,
+        "snippet": highlight_html(row["snippet"]),
+        "score": float(row["score"]),
+    }
+
+
+async def search(db: AsyncSession, q: str, kind: Optional[str] = None, textbook_id: Optional[str] = None,
+                 limit: int = 20, offset: int = 0) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Best matches for `q` first, with <mark>-highlighted title and snippet.
+    Returns (results, truncated); `truncated` is True when the candidate cap
+    left some matches unranked.
+    """
+    dialect = db.bind.dialect.name
+    built = search_statement(dialect, q, kind, textbook_id, limit, offset)
+    if built is None:
+        return [], False
+    statement, params = built
+    results = [_result(row) for row in (await db.execute(statement, params)).mappings()]
+    truncation = truncation_statement(dialect, q, kind, textbook_id)
+    truncated = bool((await db.execute(*truncation)).scalar()) if truncation else False
+    return results, truncated
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# models builds its engines at import time: point them at a scratch database
+# before any test module imports it
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'test.db')}"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,53 @@
+import ai_service
+from ai_service import AIService
+
+
+class RecordingPipeline:
+    pipe_names = ["tagger", "parser"]
+
+    def __init__(self):
+        self.piped = []
+
+    def pipe(self, texts, batch_size, disable):
+        texts = list(texts)
+        self.piped.append(texts)
+        return iter(texts)
+
+
+def service_with(nlp):
+    service = AIService()
+    service._nlp, service._nlp_loaded = nlp, True
+    return service
+
+
+def test_pipeline_sees_the_question_as_written(monkeypatch):
+    monkeypatch.setattr(ai_service, "SPACY_COMPONENTS", ["tagger"])
+    nlp = RecordingPipeline()
+    service = service_with(nlp)
+    analyses = service.analyze_mistakes([("What  IS 2 + 3?", "50", "5"),
+                                         ("what is 2 + 3?", "50", "5"),
+                                         ("what is 2 + 3?", "4", "5")])
+    assert nlp.piped == [["What  IS 2 + 3?", "what is 2 + 3?"]]
+    assert analyses[0] == analyses[1] != analyses[2]
+    # Memoized under the normalized key
+    service.analyze_mistakes([("WHAT IS 2 + 3?", "4", "5")])
+    assert len(nlp.piped) == 1
+
+
+def test_no_pipeline_pass_without_components(monkeypatch):
+    monkeypatch.setattr(ai_service, "SPACY_COMPONENTS", [])
+    nlp = RecordingPipeline()
+    analyses = service_with(nlp).analyze_mistakes([("What is 2 + 3?", "50", "5")])
+    assert nlp.piped == []
+    assert analyses == ["Analyzed: Use of correct digits but wrong magnitude (Order of Magnitude Trap)."]
+
+
+def test_generated_questions_have_one_correct_option_and_one_trap():
+    service = AIService()
+    for topic in ("math", "cs", "history"):
+        question = service.generate_question(topic)
+        assert question["topic"] == ("math" if topic == "history" else topic)
+        assert [opt["isCorrect"] for opt in question["options"]].count(True) == 1
+        [trap] = [opt for opt in question["options"] if opt["isTrap"]]
+        assert trap["feedback"] in question["explanation"]
+    assert service.generate_batch("math", 5, seed=7) == service.generate_batch("math", 5, seed=7)
@@ -0,0 +1,205 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, event, func, insert, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from answer_buffer import AnswerBuffer, AnswerBufferFull
+from answer_stats import get_user_stats
+from models import Base, Question, StudentResponse, User, async_url
+
+
+def _enable_foreign_keys(dbapi_connection, connection_record):
+    # Enforced like on PostgreSQL, so bad answers are actually rejected
+    dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+
+@pytest.fixture
+def database(tmp_path):
+    url = f"sqlite:///{tmp_path / 'answers.db'}"
+    sync_engine = create_engine(url)
+    Base.metadata.create_all(bind=sync_engine)
+    with sync_engine.begin() as conn:
+        conn.execute(insert(Question.__table__), [
+            {"id": "q1", "topic": "Math", "options": [{"id": "a", "isCorrect": True}, {"id": "b", "isTrap": True}]},
+        ])
+    sync_engine.dispose()
+
+    async_engine = create_async_engine(async_url(url))
+    event.listen(async_engine.sync_engine, "connect", _enable_foreign_keys)
+    yield async_sessionmaker(async_engine, expire_on_commit=False)
+    asyncio.run(async_engine.dispose())
+
+
+def answer(user_id, question_id="q1", trapped=False):
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "question_id": question_id,
+        "selected_option": "b" if trapped else "a",
+        "trap_detected": trapped,
+        "timestamp": "2026-01-01T00:00:00",
+    }
+
+
+class FlakySessions:
+    """
+    Session factory whose sessions fail to open while `down` is set.
+    """
+    def __init__(self, factory):
+        self.factory = factory
+        self.down = False
+
+    def __call__(self):
+        if self.down:
+            raise OperationalError("connect", {}, Exception("database is down"))
+        return self.factory()
+
+
+def make_buffer(session_factory, tmp_path, **kwargs):
+    # A long interval: the tests decide when to flush
+    kwargs.setdefault("flush_interval_ms", 60_000)
+    return AnswerBuffer(session_factory=session_factory, dead_letter_file=str(tmp_path / "dead.ndjson"), **kwargs)
+
+
+async def record(buffer, session_factory, user_id, **kwargs):
+    # As /submit-answer does: 10 XP for a correct answer
+    correct = not kwargs.get("trapped")
+    async with session_factory() as db:
+        return await buffer.record(db, user_id, answer(user_id, **kwargs), 10 if correct else 0, correct)
+
+
+async def count(session_factory, model):
+    async with session_factory() as db:
+        return (await db.execute(select(func.count()).select_from(model))).scalar()
+
+
+def dead_letters(tmp_path):
+    path = tmp_path / "dead.ndjson"
+    return [json.loads(line) for line in path.read_text().splitlines()] if path.exists() else []
+
+
+def test_flush_writes_answers_and_coalesced_xp(database, tmp_path):
+    async def scenario():
+        buffer = make_buffer(database, tmp_path)
+        buffer.start()
+        assert await record(buffer, database, "u1") == (10, 1)
+        await record(buffer, database, "u1", trapped=True)
+        assert await record(buffer, database, "u1") == (20, 1)
+        assert buffer.current_xp("u1") == 20
+
+        assert await buffer.flush()
+        assert buffer.current_xp("u1") is None
+        assert await count(database, StudentResponse) == 3
+        async with database() as db:
+            user = (await db.execute(select(User).where(User.id == "u1"))).scalars().one()
+            stats = await get_user_stats(db, "u1")
+        assert (user.xp, user.level) == (20, 1)
+        assert (stats["answered"], stats["correct"], stats["traps_fallen"]) == (3, 2, 1)
+        assert await buffer.stop() == 0
+
+    asyncio.run(scenario())
+
+
+def test_rejected_answer_is_dead_lettered_without_blocking_the_rest(database, tmp_path):
+    async def scenario():
+        buffer = make_buffer(database, tmp_path)
+        buffer.start()
+        for i in range(21):
+            await record(buffer, database, f"u{i % 3}", question_id="generated" if i == 5 else "q1")
+        assert await buffer.flush()
+        assert len(buffer) == 0
+        assert await count(database, StudentResponse) == 20
+        assert await buffer.stop() == 1
+
+    asyncio.run(scenario())
+    [dead] = dead_letters(tmp_path)
+    assert dead["question_id"] == "generated" and dead["xp_gain"] == 10
+    assert "FOREIGN KEY" in dead["error"]
+
+
+def test_failed_flushes_keep_answers_until_the_database_is_back(database, tmp_path):
+    sessions = FlakySessions(database)
+
+    async def scenario():
+        buffer = make_buffer(sessions, tmp_path, max_retries=3)
+        buffer.start()
+        await record(buffer, database, "u1")
+        sessions.down = True
+        assert not await buffer.flush()
+        assert not await buffer.flush()
+        assert len(buffer) == 1 and buffer.current_xp("u1") == 10
+        sessions.down = False
+        assert await buffer.flush()
+        assert await count(database, StudentResponse) == 1
+        assert await buffer.stop() == 0
+
+    asyncio.run(scenario())
+    assert dead_letters(tmp_path) == []
+
+
+def test_answers_are_dead_lettered_after_max_retries(database, tmp_path):
+    sessions = FlakySessions(database)
+
+    async def scenario():
+        buffer = make_buffer(sessions, tmp_path, max_retries=2)
+        buffer.start()
+        await record(buffer, database, "u1")
+        await record(buffer, database, "u2")
+        sessions.down = True
+        for _ in range(3):
+            await buffer.flush()
+        assert len(buffer) == 0 and buffer.dead_lettered == 2
+        await buffer.stop()
+
+    asyncio.run(scenario())
+    assert {dead["user_id"] for dead in dead_letters(tmp_path)} == {"u1", "u2"}
+
+
+def test_stop_reports_answers_it_could_not_write(database, tmp_path):
+    sessions = FlakySessions(database)
+
+    async def scenario():
+        buffer = make_buffer(sessions, tmp_path)
+        buffer.start()
+        await record(buffer, database, "u1")
+        sessions.down = True
+        return await buffer.stop()
+
+    assert asyncio.run(scenario()) == 1
+    assert len(dead_letters(tmp_path)) == 1
+
+
+def test_record_refuses_answers_once_the_buffer_is_full(database, tmp_path):
+    async def scenario():
+        buffer = make_buffer(database, tmp_path, max_pending=2)
+        buffer.start()
+        await record(buffer, database, "u1")
+        await record(buffer, database, "u1")
+        with pytest.raises(AnswerBufferFull):
+            await record(buffer, database, "u1")
+        assert buffer.current_xp("u1") == 20
+        await buffer.flush()
+        await record(buffer, database, "u1")
+        await buffer.stop()
+
+    asyncio.run(scenario())
+
+
+def test_full_batch_triggers_a_flush(database, tmp_path):
+    async def scenario():
+        buffer = make_buffer(database, tmp_path, max_batch=3)
+        buffer.start()
+        for _ in range(3):
+            await record(buffer, database, "u1")
+        for _ in range(100):
+            if buffer.flushed_responses:
+                break
+            await asyncio.sleep(0.01)
+        assert buffer.flushed_responses == 3
+        await buffer.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,246 @@
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("pdfplumber")
+
+from sqlalchemy import delete, func, inspect, select, text, update  # noqa: E402
+
+import ingestion_queue  # noqa: E402
+from benchmarks.synthetic_pdf import make_pdf, textbook_pages  # noqa: E402
+from ingestion_queue import IngestionQueue, LeaseLost, _claim_next_job, _run_job, _update_leased  # noqa: E402
+from models import (Chapter, ExtractedQuestion, IngestionJob, SessionLocal, Textbook, TextbookFile,  # noqa: E402
+                    engine, init_db)
+from search import SEARCH_TABLE  # noqa: E402
+from textbook_processor import ChapterWriter, textbook_processor  # noqa: E402
+
+CHAPTERS = 25
+queue = ingestion_queue.ingestion_queue
+
+
+class WorkerKilled(BaseException):
+    """
+    Stands in for a worker process dying mid-job (not an Exception, so
+    `_run_job` doesn't record it as a failed parse).
+    """
+
+
+@pytest.fixture
+def db(monkeypatch):
+    init_db()
+    with engine.begin() as conn:
+        for model in (IngestionJob, ExtractedQuestion, Chapter, TextbookFile, Textbook):
+            conn.execute(delete(model))
+        if inspect(conn).has_table(SEARCH_TABLE):
+            conn.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+    # Serial extraction: no process pool inside the tests
+    monkeypatch.setattr(textbook_processor, "extract_workers", 1)
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    # Two pages per chapter: chapter n starts on page 2n - 1
+    path = tmp_path / "book.pdf"
+    path.write_bytes(make_pdf(textbook_pages(chapters=CHAPTERS, pages_per_chapter=2, seed=1)))
+    return str(path)
+
+
+def add_book(db, file_path):
+    book_id = str(uuid.uuid4())
+    db.add(Textbook(id=book_id, title="book.pdf", subject="Math", grade="5", board="CBSE", filename=file_path))
+    db.commit()
+    return book_id
+
+
+def expire_lease(db, job_id):
+    db.execute(update(IngestionJob).where(IngestionJob.id == job_id).values(
+        updated_at=(datetime.utcnow() - timedelta(minutes=5)).isoformat()
+    ))
+    db.commit()
+
+
+def chapter_numbers(db, book_id):
+    return sorted(db.execute(select(Chapter.chapter_number).where(Chapter.textbook_id == book_id)).scalars())
+
+
+def job_row(db, job_id):
+    db.expire_all()
+    return db.query(IngestionJob).filter(IngestionJob.id == job_id).one()
+
+
+def test_only_one_worker_claims_a_job(db, pdf):
+    job = queue.enqueue(add_book(db, pdf), pdf, db)
+    start = threading.Barrier(8)
+    claimed = []
+
+    def worker():
+        session = SessionLocal()
+        try:
+            start.wait()
+            claim = _claim_next_job(session, 60)
+            if claim:
+                claimed.append(claim.lease_owner)
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(claimed) == 1
+    assert job_row(db, job.id).lease_owner == claimed[0]
+    # A live lease isn't up for grabs
+    assert _claim_next_job(db, 60) is None
+
+
+def test_stale_lease_is_taken_over_and_the_old_owner_is_fenced_off(db, pdf):
+    book_id = add_book(db, pdf)
+    job = queue.enqueue(book_id, pdf, db)
+    # The old worker's own session: nothing else commits on it
+    old_session = SessionLocal()
+    old = _claim_next_job(old_session, 60)
+    old_owner = old.lease_owner
+
+    expire_lease(db, job.id)
+    other = SessionLocal()
+    try:
+        new = _claim_next_job(other, 60)
+        assert new.id == job.id and new.lease_owner != old_owner
+    finally:
+        other.close()
+
+    # The old worker's next batch is rolled back together with its checkpoint
+    session = SessionLocal()
+    try:
+        writer = ChapterWriter(session, on_commit=lambda page, line: _update_leased(
+            session, job.id, old_owner, resume_page=page, resume_line=line))
+        writer.add_chapter({"id": str(uuid.uuid4()), "textbook_id": book_id, "chapter_number": 1,
+                            "title": "Chapter 1", "content_summary": ""}, [], (1, 0))
+        with pytest.raises(LeaseLost):
+            writer.commit()
+        session.rollback()
+    finally:
+        session.close()
+    assert chapter_numbers(db, book_id) == []
+
+    # Running the job stops at its first write, leaving the status alone
+    try:
+        _run_job(old, old_session)
+    finally:
+        old_session.close()
+    assert chapter_numbers(db, book_id) == []
+    taken_over = job_row(db, job.id)
+    assert taken_over.status == "running" and taken_over.lease_owner != old_owner
+
+
+def test_killed_job_resumes_from_its_checkpoint_without_duplicates(db, pdf, monkeypatch):
+    book_id = add_book(db, pdf)
+    job = queue.enqueue(book_id, pdf, db)
+    iter_pages = textbook_processor.iter_pages
+
+    def dies_midway(file_path, start_page=0):
+        for page_no, page in enumerate(iter_pages(file_path, start_page), start_page):
+            if page_no == 35: # After the first batch of ten chapters was committed
+                raise WorkerKilled()
+            yield page
+
+    monkeypatch.setattr(textbook_processor, "iter_pages", dies_midway)
+    with pytest.raises(WorkerKilled):
+        _run_job(_claim_next_job(db, 60), db)
+    db.rollback()
+    checkpoint = job_row(db, job.id)
+    assert chapter_numbers(db, book_id) == list(range(1, 11))
+    assert checkpoint.status == "running"
+    assert (checkpoint.resume_page, checkpoint.resume_line) == (21, 0) # Chapter 11's header
+
+    monkeypatch.setattr(textbook_processor, "iter_pages", iter_pages)
+    expire_lease(db, job.id)
+    resumed = _claim_next_job(db, 60)
+    assert resumed.id == job.id
+    _run_job(resumed, db)
+    assert job_row(db, job.id).status == "done"
+    assert chapter_numbers(db, book_id) == list(range(1, CHAPTERS + 1))
+
+
+def test_waiting_job_copies_the_source_parse_once_it_is_done(db, pdf, monkeypatch):
+    source_id, target_id = add_book(db, pdf), add_book(db, pdf)
+    source_job = queue.enqueue(source_id, pdf, db)
+    waiting = queue.enqueue(target_id, pdf, db, clone_from=source_id)
+    assert waiting.status == "waiting"
+
+    claim = _claim_next_job(db, 60)
+    assert claim.id == source_job.id
+    # Nothing to copy yet: the waiting job isn't runnable
+    assert _claim_next_job(db, 60) is None
+    _run_job(claim, db)
+
+    parses = []
+    process_pdf = textbook_processor.process_pdf
+    monkeypatch.setattr(textbook_processor, "process_pdf",
+                        lambda *args, **kwargs: parses.append(args) or process_pdf(*args, **kwargs))
+    claim = _claim_next_job(db, 60)
+    assert claim.id == waiting.id
+    _run_job(claim, db)
+    assert parses == []
+    assert job_row(db, waiting.id).status == "done"
+    assert chapter_numbers(db, target_id) == chapter_numbers(db, source_id) == list(range(1, CHAPTERS + 1))
+    questions = db.execute(
+        select(func.count()).select_from(ExtractedQuestion)
+        .join(Chapter, Chapter.id == ExtractedQuestion.chapter_id).where(Chapter.textbook_id == target_id)
+    ).scalar()
+    assert questions == CHAPTERS * 8
+
+
+def test_waiting_job_parses_the_file_itself_when_the_source_failed(db, pdf, tmp_path):
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"not a pdf")
+    source_id, target_id = add_book(db, str(broken)), add_book(db, pdf)
+    source_job = queue.enqueue(source_id, str(broken), db)
+    waiting = queue.enqueue(target_id, pdf, db, clone_from=source_id)
+
+    _run_job(_claim_next_job(db, 60), db)
+    assert job_row(db, source_job.id).status == "failed"
+    claim = _claim_next_job(db, 60)
+    assert claim.id == waiting.id
+    _run_job(claim, db)
+    assert job_row(db, waiting.id).status == "done"
+    assert chapter_numbers(db, target_id) == list(range(1, CHAPTERS + 1))
+
+
+def test_worker_loop_survives_database_errors(db, monkeypatch):
+    stop = threading.Event()
+    calls = []
+
+    def flaky_claim(session, lease_seconds):
+        calls.append(lease_seconds)
+        if len(calls) == 3:
+            stop.set()
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(ingestion_queue, "_claim_next_job", flaky_claim)
+    monkeypatch.setattr(ingestion_queue, "INGEST_MAX_BACKOFF_SECONDS", 0.01)
+    ingestion_queue._worker_loop(stop, 0.001, 60, 1)
+    assert len(calls) == 3
+
+
+def test_dead_workers_are_restarted(db):
+    pool = IngestionQueue(num_workers=1, poll_interval=0.05)
+    pool.start()
+    try:
+        first = pool._workers[0]
+        first.kill()
+        first.join()
+        for _ in range(100):
+            if pool.restarts:
+                break
+            threading.Event().wait(0.05)
+        assert pool.restarts == 1
+        assert pool._workers[0] is not first and pool._workers[0].is_alive()
+    finally:
+        pool.stop()
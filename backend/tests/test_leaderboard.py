@@ -0,0 +1,87 @@
+import random
+from bisect import bisect_left, insort
+
+import pytest
+
+from leaderboard import Leaderboard, RankedIndex
+
+
+def test_ranked_index_matches_a_sorted_list():
+    rng = random.Random(7)
+    # Small buckets so splits and emptied buckets happen constantly
+    index = RankedIndex(bucket_size=4)
+    expected = []
+    for _ in range(5000):
+        if expected and rng.random() < 0.45:
+            key = rng.choice(expected)
+            expected.remove(key)
+            index.remove(key)
+        else:
+            key = (-rng.randrange(200), f"u{rng.randrange(100)}")
+            insort(expected, key)
+            index.add(key)
+        assert len(index) == len(expected)
+        if expected:
+            probe = rng.choice(expected)
+            assert index.rank(probe) == bisect_left(expected, probe)
+    assert index.first(len(expected) + 5) == expected
+
+
+def test_ranked_index_bulk_load():
+    keys = [(-xp, f"u{xp}") for xp in range(100)]
+    index = RankedIndex(reversed(keys), bucket_size=8)
+    assert index.first(3) == [(-99, "u99"), (-98, "u98"), (-97, "u97")]
+    assert index.rank((-0, "u0")) == 99
+    assert index.rank((-50, "u50")) == 49
+
+
+def test_ranked_index_empty_then_refilled():
+    index = RankedIndex(bucket_size=2)
+    index.add((-10, "a"))
+    index.remove((-10, "a"))
+    assert len(index) == 0 and index.first(5) == []
+    index.add((-5, "b"))
+    assert index.rank((-5, "b")) == 0
+
+
+def test_ties_are_broken_by_user_id():
+    board = Leaderboard(bucket_size=2)
+    board.rebuild([("carol", 50), ("alice", 50), ("bob", 70)])
+    assert board.top(3) == [("bob", 70), ("alice", 50), ("carol", 50)]
+    assert board.rank("carol") == 3
+
+
+def test_update_moves_a_user_and_never_lowers_xp():
+    board = Leaderboard(bucket_size=2)
+    board.rebuild([("a", 10), ("b", 20), ("c", 30)])
+    board.update("a", 40)
+    assert board.rank("a") == 1
+    board.update("a", 5) # Stale report
+    assert board.top(1) == [("a", 40)]
+    board.update("new", 1)
+    assert board.rank("new") == 4 and len(board) == 4
+    assert board.rank("nobody") is None
+
+
+def test_rebuild_keeps_updates_the_table_has_not_caught_up_with():
+    board = Leaderboard()
+    board.rebuild([("a", 10)])
+    board.update("a", 30) # Still in the write-behind buffer
+    board.rebuild([("a", 10), ("b", 20)])
+    assert board.top(2) == [("a", 30), ("b", 20)]
+    assert board.ready
+
+
+def test_failed_rebuild_keeps_recent_updates_for_the_next_one():
+    board = Leaderboard()
+    board.rebuild([])
+    board.update("a", 30)
+
+    def broken_rows():
+        raise RuntimeError("database unavailable")
+        yield
+
+    with pytest.raises(RuntimeError):
+        board.rebuild(broken_rows())
+    board.rebuild([("a", 0)])
+    assert board.top(1) == [("a", 30)]
@@ -0,0 +1,96 @@
+import asyncio
+
+import question_cache as question_cache_module
+from question_cache import QuestionCache
+
+
+async def chunks(*parts):
+    for part in parts:
+        yield part
+
+
+def send(cache, key, topic, *parts, before_end=None):
+    """
+    Streams a response through `cache.fill` like /questions does, running
+    `before_end` after the first chunk has gone out.
+    """
+    async def consume():
+        sent = []
+        async for chunk in cache.fill(key, topic, chunks(*parts)):
+            sent.append(chunk)
+            if before_end and len(sent) == 1:
+                before_end()
+        return b"".join(sent)
+    return asyncio.run(consume())
+
+
+def test_fill_passes_the_body_through_and_caches_it():
+    cache = QuestionCache()
+    assert cache.get("k") is None
+    assert send(cache, "k", "Math", b"[1,", b"2]") == b"[1,2]"
+    assert cache.get("k") == b"[1,2]"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_invalidating_a_topic_drops_it_and_the_unfiltered_listings():
+    cache = QuestionCache()
+    send(cache, "math", "Math", b"m")
+    send(cache, "physics", "Physics", b"p")
+    send(cache, "all", None, b"a")
+    cache.invalidate("Math")
+    assert cache.get("math") is None
+    assert cache.get("all") is None
+    assert cache.get("physics") == b"p"
+
+
+def test_invalidating_everything():
+    cache = QuestionCache()
+    send(cache, "math", "Math", b"m")
+    send(cache, "all", None, b"a")
+    cache.invalidate()
+    assert cache.get("math") is None and cache.get("all") is None
+    assert cache.stats()["size_bytes"] == 0
+
+
+def test_fill_racing_a_write_is_not_cached():
+    cache = QuestionCache()
+    # The rows were read before the write, so this body is already stale
+    send(cache, "math", "Math", b"old", b"er", before_end=lambda: cache.invalidate("Math"))
+    assert cache.get("math") is None
+    send(cache, "all", None, b"old", before_end=lambda: cache.invalidate("Physics"))
+    assert cache.get("all") is None
+    send(cache, "physics", "Physics", b"old", before_end=lambda: cache.invalidate())
+    assert cache.get("physics") is None
+    # A write to another topic doesn't concern this one
+    send(cache, "math", "Math", b"fresh", before_end=lambda: cache.invalidate("Physics"))
+    assert cache.get("math") == b"fresh"
+
+
+def test_oversized_bodies_are_streamed_but_not_kept():
+    cache = QuestionCache(max_entry_bytes=4)
+    assert send(cache, "big", "Math", b"abc", b"def") == b"abcdef"
+    assert cache.get("big") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entries_are_evicted_under_the_byte_cap():
+    cache = QuestionCache(max_bytes=10)
+    send(cache, "a", "Math", b"aaaa")
+    send(cache, "b", "Math", b"bbbb")
+    cache.get("a") # "b" is now the least recently used
+    send(cache, "c", "Math", b"cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"aaaa" and cache.get("c") == b"cccc"
+    assert cache.stats()["evictions"] == 1 and cache.size_bytes == 8
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(question_cache_module.time, "monotonic", lambda: now[0])
+    cache = QuestionCache(ttl_seconds=60)
+    send(cache, "k", "Math", b"x")
+    now[0] += 59
+    assert cache.get("k") == b"x"
+    now[0] += 2
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
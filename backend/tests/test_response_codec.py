@@ -0,0 +1,110 @@
+import asyncio
+import gzip
+import json
+
+import pytest
+
+import response_codec
+from response_codec import JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE
+
+
+@pytest.fixture
+def offers(monkeypatch):
+    """
+    Pins what's on offer: MessagePack, and gzip only (no brotli).
+    """
+    pytest.importorskip("msgpack")
+    monkeypatch.setattr(response_codec, "brotli", None)
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, JSON_MEDIA_TYPE),
+    ("", JSON_MEDIA_TYPE),
+    ("*/*", JSON_MEDIA_TYPE),
+    ("application/msgpack", MSGPACK_MEDIA_TYPE),
+    ("application/x-msgpack", MSGPACK_MEDIA_TYPE),
+    ("application/vnd.msgpack", MSGPACK_MEDIA_TYPE),
+    ("Application/MsgPack", MSGPACK_MEDIA_TYPE),
+    ("application/json;q=0.5, application/msgpack", MSGPACK_MEDIA_TYPE),
+    ("application/msgpack;q=0.4, application/json;q=0.9", JSON_MEDIA_TYPE),
+    # Equal q: an explicit mention beats a wildcard
+    ("application/*, application/msgpack", MSGPACK_MEDIA_TYPE),
+    ("*/*;q=0.8, application/msgpack;q=0.8", MSGPACK_MEDIA_TYPE),
+    ("application/msgpack;q=0", JSON_MEDIA_TYPE),
+    ("application/json;q=0, */*", MSGPACK_MEDIA_TYPE),
+    ("application/msgpack;q=oops, application/json;q=0.1", JSON_MEDIA_TYPE),
+    # Nothing acceptable: JSON rather than a 406
+    ("text/html", JSON_MEDIA_TYPE),
+    ("application/json;q=0", JSON_MEDIA_TYPE),
+])
+def test_negotiate_media_type(offers, accept, expected):
+    assert response_codec.negotiate_media_type(accept) == expected
+
+
+def test_msgpack_is_not_offered_without_the_package(monkeypatch):
+    monkeypatch.setattr(response_codec, "msgpack", None)
+    assert response_codec.negotiate_media_type("application/msgpack") == JSON_MEDIA_TYPE
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    (None, None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("GZIP", "gzip"),
+    ("deflate, gzip;q=0.5", "gzip"),
+    ("*", "gzip"),
+    ("gzip;q=0", None),
+    ("*, gzip;q=0", None),
+    # Not offered without the brotli package
+    ("br", None),
+    ("br, gzip;q=0.1", "gzip"),
+])
+def test_negotiate_coding(offers, accept_encoding, expected):
+    assert response_codec.negotiate_coding(accept_encoding) == expected
+
+
+def test_brotli_is_preferred_when_installed_and_q_ties(monkeypatch):
+    monkeypatch.setattr(response_codec, "brotli", object())
+    assert response_codec.negotiate_coding("gzip, br") == "br"
+    assert response_codec.negotiate_coding("gzip, br;q=0.5") == "gzip"
+
+
+def test_headers_vary_on_both_negotiated_headers():
+    assert response_codec.headers(None) == {"Vary": "Accept, Accept-Encoding"}
+    assert response_codec.headers("gzip")["Content-Encoding"] == "gzip"
+
+
+def test_small_bodies_are_sent_uncompressed():
+    body, coding = response_codec.encode_list([{"id": 1}], JSON_MEDIA_TYPE, "gzip")
+    assert coding is None and json.loads(body) == [{"id": 1}]
+
+
+def test_encode_list_compresses_large_bodies():
+    items = [{"id": i, "text": "What is 3 + 4 x 2?"} for i in range(200)]
+    body, coding = response_codec.encode_list(items, JSON_MEDIA_TYPE, "gzip")
+    assert coding == "gzip"
+    assert json.loads(gzip.decompress(body)) == items
+
+
+async def _rows(items):
+    for item in items:
+        yield item
+
+
+def _encode_rows(items, media_type, coding=None):
+    async def collect():
+        return b"".join([chunk async for chunk in response_codec.encode_rows(_rows(items), media_type, coding)])
+    return asyncio.run(collect())
+
+
+@pytest.mark.parametrize("items", [[], [{"id": "a"}], [{"id": str(i), "n": i} for i in range(50)]])
+def test_encode_rows_as_json(items):
+    assert json.loads(_encode_rows(items, JSON_MEDIA_TYPE)) == items
+    assert json.loads(gzip.decompress(_encode_rows(items, JSON_MEDIA_TYPE, "gzip"))) == items
+
+
+@pytest.mark.parametrize("items", [[], [{"id": "a", "options": [{"isTrap": True}]}]])
+def test_encode_rows_as_msgpack(items):
+    msgpack = pytest.importorskip("msgpack")
+    assert msgpack.unpackb(_encode_rows(items, MSGPACK_MEDIA_TYPE)) == items
+    assert msgpack.unpackb(gzip.decompress(_encode_rows(items, MSGPACK_MEDIA_TYPE, "gzip"))) == items
@@ -0,0 +1,47 @@
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import inspect, text
+
+from models import AsyncSessionLocal, SessionLocal, engine, init_db
+from search import SEARCH_TABLE, index_rows, search
+
+
+@pytest.fixture
+def indexed():
+    init_db()
+    if not inspect(engine).has_table(SEARCH_TABLE):
+        pytest.skip("SQLite was built without FTS5")
+    book_id = str(uuid.uuid4())
+    db = SessionLocal()
+    try:
+        db.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+        index_rows(db, [{"id": str(uuid.uuid4()), "textbook_id": book_id,
+                         "title": "Chapter 3 <b>Light</b> & Shade",
+                         "content_summary": "<script>alert(1)</script> Light travels in straight lines."}], [])
+        db.commit()
+    finally:
+        db.close()
+    return book_id
+
+
+def run_search(q):
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            return await search(db, q)
+    return asyncio.run(scenario())
+
+
+def test_matches_are_marked_and_pdf_markup_is_escaped(indexed):
+    results, truncated = run_search("light")
+    [result] = results
+    assert result["title"] == "Chapter 3 &lt;b&gt;<mark>Light</mark>&lt;/b&gt; &amp; Shade"
+    assert "&lt;script&gt;alert(1)&lt;/script&gt;" in result["snippet"]
+    assert "<mark>Light</mark> travels" in result["snippet"]
+    assert "<script>" not in result["snippet"]
+    assert not truncated
+
+
+def test_queries_without_terms_return_nothing(indexed):
+    assert run_search("&& ()") == ([], False)
@@ -1,116 +1,253 @@
 import pdfplumber
-import re
+import os
 import uuid
-from typing import List, Dict, Any
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Tuple
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
+from metrics import span, timed, timed_iter
 from models import Textbook, Chapter, ExtractedQuestion
+from search import index_rows
+from question_rules import RuleProfile, DEFAULT_PROFILE, get_rule_profile
 from datetime import datetime
 
+# Page extraction processes per ingestion job: 0 = the CPUs split evenly
+# across the ingestion jobs running at once (see share_cpus), 1 = serial
+PDF_EXTRACT_WORKERS = int(os.environ.get("PDF_EXTRACT_WORKERS", "0"))
+# Books shorter than this aren't worth the process start-up cost
+PARALLEL_MIN_PAGES = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", "32"))
+# Most pages per extraction shard. At most two shards per worker are in
+# flight, so this bounds how much extracted text waits for the segmenter.
+PDF_SHARD_PAGES = int(os.environ.get("PDF_SHARD_PAGES", "16"))
+# Rows per INSERT statement, and chapters per transaction (0 = whole book)
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", "500"))
+INGEST_COMMIT_CHAPTERS = int(os.environ.get("INGEST_COMMIT_CHAPTERS", "10"))
+
+
+def _extract_page_range(file_path: str, start: int, end: int) -> List[str]:
+    """
+    Extracts pages [start, end) in a pool worker, which opens the file itself.
+    """
+    with pdfplumber.open(file_path) as pdf:
+        return [pdf.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+class ChapterWriter:
+    """
+    Buffers chapter and question rows and writes them with Core executemany
+    inserts, in one transaction per `commit_every` chapters (0 = one
+    transaction for the whole book).
+
+    Nothing is sent to the database between commits, so progress updates
+    committed on the same session in the meantime can't commit half a batch.
+    """
+    def __init__(self, db: Session, batch_size: int = INGEST_BATCH_SIZE,
+                 commit_every: int = INGEST_COMMIT_CHAPTERS,
+                 on_commit: Optional[Callable[[int, int], None]] = None):
+        self.db = db
+        self.batch_size = max(1, batch_size)
+        self.commit_every = commit_every
+        self.on_commit = on_commit
+        self.rows_written = 0
+        self._chapters: List[Dict[str, Any]] = []
+        self._questions: List[Dict[str, Any]] = []
+        self._resume_pos: Optional[Tuple[int, int]] = None
+
+    def add_chapter(self, chapter_row: Dict[str, Any], question_rows: List[Dict[str, Any]],
+                    resume_pos: Tuple[int, int]):
+        self._chapters.append(chapter_row)
+        self._questions.extend(question_rows)
+        self._resume_pos = resume_pos
+        if self.commit_every and len(self._chapters) >= self.commit_every:
+            self.commit()
+
+    @timed("ingest.commit")
+    def commit(self):
+        if not self._chapters:
+            return
+        # Chapters first: questions reference them
+        for table, rows in ((Chapter.__table__, self._chapters), (ExtractedQuestion.__table__, self._questions)):
+            for i in range(0, len(rows), self.batch_size):
+                self.db.execute(insert(table), rows[i:i + self.batch_size])
+        index_rows(self.db, self._chapters, self._questions)
+        if self.on_commit:
+            self.on_commit(*self._resume_pos)
+        self.db.commit()
+        self.rows_written += len(self._chapters) + len(self._questions)
+        self._chapters = []
+        self._questions = []
+
+
 class TextbookProcessor:
-    def __init__(self):
-        pass
+    def __init__(self, extract_workers: int = PDF_EXTRACT_WORKERS):
+        self._pinned = bool(extract_workers)
+        self.extract_workers = extract_workers or os.cpu_count() or 1
 
-    def process_pdf(self, file_path: str, textbook_id: str, db: Session):
+    def share_cpus(self, concurrent_jobs: int):
         """
-        Extracts content from PDF and populates the database.
+        Sizes the extraction pool for `concurrent_jobs` ingestion jobs
+        running side by side, so together they use about one process per
+        CPU. A PDF_EXTRACT_WORKERS setting is left alone.
+        """
+        if not self._pinned:
+            self.extract_workers = max(1, (os.cpu_count() or 1) // max(1, concurrent_jobs))
+
+    def page_count(self, file_path: str) -> int:
+        with pdfplumber.open(file_path) as pdf:
+            return len(pdf.pages)
+
+    def iter_pages(self, file_path: str, start_page: int = 0) -> Iterator[str]:
+        """
+        Yields the text of each page from `start_page` on, in page order.
+
+        Large books are sharded into page ranges of at most PDF_SHARD_PAGES
+        across a process pool, with at most two shards per worker in flight,
+        so memory stays bounded however long the book is. Small books,
+        `extract_workers == 1`, or a pool that can't be started fall back to
+        serial extraction.
         """
-        extracted_text = ""
         with pdfplumber.open(file_path) as pdf:
-            for page in pdf.pages:
-                text = page.extract_text()
-                if text:
-                    extracted_text += text + "\n"
+            total_pages = len(pdf.pages)
+            if self.extract_workers <= 1 or total_pages - start_page < PARALLEL_MIN_PAGES:
+                for i in range(start_page, total_pages):
+                    page = pdf.pages[i]
+                    yield page.extract_text() or ""
+                    page.close() # Drop pdfplumber's per-page caches
+                return
+
+        # Two shards per worker evens out pages of uneven cost on short books;
+        # on long ones shards are capped so only a few are extracted ahead
+        shard_size = max(1, min(PDF_SHARD_PAGES, -(-(total_pages - start_page) // (self.extract_workers * 2))))
+        shards = [(start, min(start + shard_size, total_pages))
+                  for start in range(start_page, total_pages, shard_size)]
+        pool = ProcessPoolExecutor(max_workers=self.extract_workers)
+        in_flight = deque()
+        try:
+            # Workers are started lazily, so the first submit is what can fail
+            in_flight.append(pool.submit(_extract_page_range, file_path, *shards[0]))
+        except (OSError, AssertionError, RuntimeError):
+            # e.g. daemonic parent processes can't have children
+            pool.shutdown(wait=False)
+            for start, end in shards:
+                yield from _extract_page_range(file_path, start, end)
+            return
+
+        with pool:
+            for start, end in shards[1:]:
+                if len(in_flight) >= self.extract_workers * 2:
+                    yield from in_flight.popleft().result()
+                in_flight.append(pool.submit(_extract_page_range, file_path, start, end))
+            while in_flight:
+                yield from in_flight.popleft().result()
+
+    def _iter_lines(self, file_path: str, start_page: int, start_line: int,
+                    on_page: Optional[Callable[[int, int], None]]) -> Iterator[Tuple[int, int, str]]:
+        """
+        Streams non-empty stripped lines as (page, line, text).
+        """
+        total_pages = self.page_count(file_path) if on_page else 0
+        # Per page, so includes waiting on the extraction pool
+        pages = timed_iter(self.iter_pages(file_path, start_page), "pdf.extract_page")
+        for page_no, page_text in enumerate(pages, start_page):
+            for line_no, line in enumerate(page_text.split('\n')):
+                if page_no == start_page and line_no < start_line:
+                    continue
+                line = line.strip()
+                if line:
+                    yield page_no, line_no, line
+            if on_page:
+                on_page(page_no + 1, total_pages)
+
+    def _segment_chapters(self, lines: Iterable[Tuple[int, int, str]], profile: RuleProfile) -> Iterator[Tuple[str, int, List[str], Optional[Tuple[int, int]]]]:
+        """
+        Groups a line stream into chapters, yielding (title, number, body,
+        next_pos) as soon as each chapter ends. `next_pos` is where the
+        following chapter header sits, or None for the last chapter.
+        """
+        title = None
+        number = None
+        body = []
+        for page_no, line_no, line in lines:
+            # Detect Chapter Header
+            header_number = profile.match_chapter(line)
+            if header_number is not None:
+                if title is not None:
+                    yield title, number, body, (page_no, line_no)
+                title = line
+                number = header_number
+                body = []
+            elif title is not None: # Preamble before the first chapter is dropped
+                body.append(line)
+        if title is not None:
+            yield title, number, body, None
+
+    @timed("pdf.process")
+    def process_pdf(self, file_path: str, textbook_id: str, db: Session,
+                    start_page: int = 0, start_line: int = 0,
+                    on_page: Optional[Callable[[int, int], None]] = None,
+                    on_commit: Optional[Callable[[int, int], None]] = None,
+                    profile: Optional[RuleProfile] = None):
+        """
+        Extracts content from PDF and populates the database.
+
+        Pages are streamed through the chapter segmenter and chapters are
+        written in batches as soon as their end is seen, so memory is bounded
+        by a batch of chapters rather than the whole book. Headers and
+        questions are recognised with `profile`, by default the one
+        registered for the textbook's board. Returns the number of rows
+        written.
+
+        Scanning starts at line `start_line` of page `start_page`, so an
+        interrupted ingestion job can resume right after its last committed
+        batch. `on_page(pages_done, total_pages)` is called after each page
+        is scanned, and `on_commit(page, line)` just before each batch commit
+        with the position scanning should resume from.
+        """
+        if profile is None:
+            board = db.query(Textbook.board).filter(Textbook.id == textbook_id).scalar()
+            profile = get_rule_profile(board)
         
         # Simple heuristic to find Chapters and Questions
         # In a production system, this would be a complex NLP pipeline or LLM call.
+        lines = self._iter_lines(file_path, start_page, start_line, on_page)
+        writer = ChapterWriter(db, on_commit=on_commit)
         
-        # 1. Split by "Chapter"
-        chapter_pattern = r"(Chapter\s+\d+|Unit\s+\d+).*?(\n|$)"
-        chunks = re.split(chapter_pattern, extracted_text, flags=re.IGNORECASE)
-        
-        # Determine chapters
-        current_chapter = None
-        
-        # Skip preamble if any (chunks[0])
-        # The split returns [preamble, Chapter Marker, newline, Content, Chapter Marker, newline, Content...]
-        
-        # This regex split might be weird. Let's do a simpler line-by-line state machine.
-        
-        lines = extracted_text.split('\n')
-        current_chapter_obj = None
-        buffer_text = []
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-                
-            # Detect Chapter Header
-            if re.match(r"^(Chapter|Unit)\s+\d+", line, re.IGNORECASE) and len(line) < 50:
-                # Save previous
-                if current_chapter_obj:
-                    # Parse questions from buffer before saving
-                    self._extract_questions_from_text(current_chapter_obj.id, "\n".join(buffer_text), db)
-                    current_chapter_obj.content_summary = "\n".join(buffer_text[:500]) + "..." # Save truncated text
-                    db.add(current_chapter_obj)
-                    db.commit()
-                
-                # Start new
-                chap_num = int(re.search(r"\d+", line).group())
-                current_chapter_obj = Chapter(
-                    id=str(uuid.uuid4()),
-                    textbook_id=textbook_id,
-                    chapter_number=chap_num,
-                    title=line,
-                    content_summary=""
-                )
-                buffer_text = []
-            else:
-                buffer_text.append(line)
-        
-        # Save last chapter
-        if current_chapter_obj:
-             self._extract_questions_from_text(current_chapter_obj.id, "\n".join(buffer_text), db)
-             current_chapter_obj.content_summary = "\n".join(buffer_text[:500]) + "..."
-             db.add(current_chapter_obj)
-             db.commit()
-
-    def _extract_questions_from_text(self, chapter_id: str, text: str, db: Session):
+        for title, chap_num, body, next_pos in self._segment_chapters(lines, profile):
+            chapter_id = str(uuid.uuid4())
+            chapter_row = {
+                "id": chapter_id,
+                "textbook_id": textbook_id,
+                "chapter_number": chap_num,
+                "title": title,
+                "content_summary": "\n".join(body[:500]) + "..." # Save truncated text
+            }
+            with span("pdf.extract_questions"):
+                question_rows = self._extract_questions_from_text(chapter_id, "\n".join(body), profile)
+            writer.add_chapter(chapter_row, question_rows, next_pos or (self.page_count(file_path), 0))
+        writer.commit()
+        return writer.rows_written
+
+    def _extract_questions_from_text(self, chapter_id: str, text: str,
+                                     profile: RuleProfile = DEFAULT_PROFILE) -> List[Dict[str, Any]]:
         """
         Heuristically finds MCQ, Short, Long questions in the text.
+        Returns `extracted_questions` rows.
         """
-        # Look for "Q1.", "1.", "(a)", etc.
+        # Questions usually sit in an "Exercise"/"Questions" block at the end
+        # of the chapter as "1. ...?" / "2) ...?"; the profile's scanner
+        # classifies each one while it walks the block.
         # This is a very naive implementation for demonstration.
-        
-        # Regex for questions usually found at end of chapter
-        # Look for block starting with "Exercise" or "Questions"
-        exercise_match = re.search(r"(Exercise|Questions|Assessment)\s*:?", text, re.IGNORECASE)
-        if exercise_match:
-            exercise_text = text[exercise_match.start():]
-            
-            # Find probable questions
-            # Pattern: Number dot/paren text ?
-            q_pattern = r"(\d+[\.\)]\s+.*?\?)"
-            questions = re.findall(q_pattern, exercise_text, re.DOTALL)
-            
-            for q_text in questions:
-                # Determine type
-                q_type = "Short"
-                if "explain" in q_text.lower() or "describe" in q_text.lower():
-                    q_type = "Long"
-                elif re.search(r"\([a-d]\)", q_text): # Has options (a) (b)...
-                    q_type = "MCQ"
-                
-                clean_text = re.sub(r"^\d+[\.\)]\s+", "", q_text).strip()
-                
-                db_q = ExtractedQuestion(
-                    id=str(uuid.uuid4()),
-                    chapter_id=chapter_id,
-                    question_type=q_type,
-                    text=clean_text[:500], # Truncate if too long
-                    answer="", # Extraction of answer key is much harder without LLM
-                    difficulty="Medium"
-                )
-                db.add(db_q)
+        return [
+            {
+                "id": str(uuid.uuid4()),
+                "chapter_id": chapter_id,
+                "question_type": q_type,
+                "text": clean_text[:500], # Truncate if too long
+                "answer": "", # Extraction of answer key is much harder without LLM
+                "difficulty": "Medium"
+            }
+            for q_type, clean_text in profile.scan_questions(text)
+        ]
 
 textbook_processor = TextbookProcessor()
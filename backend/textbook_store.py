@@ -0,0 +1,155 @@
+import hashlib
+import os
+import tempfile
+import uuid
+from datetime import datetime
+from typing import BinaryIO, Optional, Tuple
+from sqlalchemy import exists, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import Textbook, TextbookFile, Chapter, ExtractedQuestion, IngestionJob
+from search import index_rows
+
+UPLOAD_DIR = "uploaded_books"
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class TextbookStore:
+    """
+    Content-addressed storage for uploaded PDFs.
+
+    Files are stored once under their SHA-256 digest, and a re-upload of
+    identical bytes reuses (or cheaply clones) the chapters and questions
+    of the earlier parse instead of running pdfplumber again. Bytes that are
+    still being parsed are parsed only once: re-uploads wait for that parse.
+    """
+    def __init__(self, upload_dir: str = UPLOAD_DIR):
+        self.upload_dir = upload_dir
+
+    def save_upload(self, fileobj: BinaryIO) -> Tuple[str, str, int]:
+        """
+        Copies an upload into the store, hashing it on the way through.
+        Returns (content_hash, file_path, size).
+        """
+        os.makedirs(self.upload_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.upload_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as buffer:
+                while True:
+                    chunk = fileobj.read(COPY_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    buffer.write(chunk)
+                    size += len(chunk)
+
+            content_hash = digest.hexdigest()
+            file_path = f"{self.upload_dir}/{content_hash}.pdf"
+            if os.path.exists(file_path):
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return content_hash, file_path, size
+
+    def find_parse(self, content_hash: str, db: Session) -> Optional[IngestionJob]:
+        """
+        Returns the ingestion job of the book these bytes are (being) parsed
+        for, unless that parse failed.
+        """
+        return db.query(IngestionJob).join(
+            TextbookFile, TextbookFile.textbook_id == IngestionJob.textbook_id
+        ).filter(TextbookFile.content_hash == content_hash, IngestionJob.status != "failed").first()
+
+    def find_same_upload(self, file_path: str, subject: str, grade: str, board: str, db: Session) -> Optional[Textbook]:
+        """
+        Returns a textbook with the same bytes and the same catalogue entry,
+        parsed or still being parsed (but not one whose parse failed).
+        """
+        failed = exists().where(IngestionJob.textbook_id == Textbook.id, IngestionJob.status == "failed")
+        return db.query(Textbook).filter(
+            Textbook.filename == file_path,
+            Textbook.subject == subject,
+            Textbook.grade == grade,
+            Textbook.board == board,
+            ~failed
+        ).first()
+
+    def record(self, content_hash: str, file_path: str, size: int, textbook_id: str, db: Session) -> str:
+        """
+        Registers `textbook_id` as the book to be parsed from these bytes,
+        unless another upload (e.g. a concurrent request) already did and
+        its parse hasn't failed. Returns the book whose parse counts.
+        """
+        stored = db.query(TextbookFile).filter(TextbookFile.content_hash == content_hash).first()
+        if stored:
+            failed = db.query(IngestionJob.id).filter(
+                IngestionJob.textbook_id == stored.textbook_id, IngestionJob.status == "failed"
+            ).first()
+            if not failed:
+                return stored.textbook_id
+            # The earlier parse failed: this upload gets to try again
+            stored.textbook_id = textbook_id
+            db.commit()
+            return textbook_id
+        db.add(TextbookFile(
+            content_hash=content_hash,
+            file_path=file_path,
+            size=size,
+            textbook_id=textbook_id,
+            created_at=datetime.utcnow().isoformat()
+        ))
+        try:
+            db.commit()
+        except IntegrityError:
+            # Registered concurrently
+            db.rollback()
+            return db.query(TextbookFile.textbook_id).filter(TextbookFile.content_hash == content_hash).scalar()
+        return textbook_id
+
+    def clone_parse(self, source_book_id: str, target_book_id: str, db: Session) -> int:
+        """
+        Copies chapters and extracted questions of one book onto another
+        and commits. Returns the number of chapters cloned.
+        """
+        cloned = self.copy_parse(source_book_id, target_book_id, db)
+        db.commit()
+        return cloned
+
+    def copy_parse(self, source_book_id: str, target_book_id: str, db: Session) -> int:
+        """
+        Copies chapters and extracted questions of one book onto another
+        with plain Core selects/inserts (no ORM hydration, no PDF parsing),
+        inside the caller's transaction. Returns the number of chapters copied.
+        """
+        db.flush() # The target textbook row must exist before its chapters
+        chapter_ids = {}
+        chapter_rows = []
+        for row in db.execute(select(Chapter.__table__).where(Chapter.textbook_id == source_book_id)).mappings():
+            new_row = dict(row, id=str(uuid.uuid4()), textbook_id=target_book_id)
+            chapter_ids[row["id"]] = new_row["id"]
+            chapter_rows.append(new_row)
+        if not chapter_rows:
+            return 0
+
+        question_rows = [
+            dict(row, id=str(uuid.uuid4()), chapter_id=chapter_ids[row["chapter_id"]])
+            for row in db.execute(
+                select(ExtractedQuestion.__table__)
+                .join(Chapter, Chapter.id == ExtractedQuestion.chapter_id)
+                .where(Chapter.textbook_id == source_book_id)
+            ).mappings()
+        ]
+
+        db.execute(insert(Chapter.__table__), chapter_rows)
+        if question_rows:
+            db.execute(insert(ExtractedQuestion.__table__), question_rows)
+        index_rows(db, chapter_rows, question_rows)
+        return len(chapter_rows)
+
+textbook_store = TextbookStore()